@@ -0,0 +1,13 @@
+"""Performance benchmarks for RestrictedPython.
+
+They are not part of the test suite, run them via tox::
+
+    $ tox -e benchmark
+
+or directly, e.g.::
+
+    $ python -m benchmarks.compile_throughput --json results.json
+    $ python -m benchmarks.runtime_overhead --json results.json
+    $ python -m benchmarks.parallel_scaling --json results.json
+    $ python -m benchmarks.globals_setup --json results.json
+"""
@@ -0,0 +1,151 @@
+"""Measure the parse, transform and compile times of restricted code.
+
+For each case of the corpus and each mode the source is parsed, checked and
+transformed by the policy and compiled to byte code. The phases are timed
+separately, `total` is the time of the matching `compile_restricted_*`
+function and contains the overhead between the phases.
+
+Usage::
+
+    $ python -m benchmarks.compile_throughput [--json FILE] [--filter TEXT]
+"""
+
+from benchmarks.corpus import CORPUS
+from benchmarks.timing import best_time
+from benchmarks.timing import environment
+from benchmarks.timing import write_json
+from RestrictedPython import compile_restricted_eval
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import compile_restricted_function
+from RestrictedPython import RestrictingNodeTransformer
+
+import argparse
+import ast
+
+
+def _parse_function(body):
+    """Parse `body` wrapped into a function like compile_restricted_function.
+    """
+    tree = ast.parse('def script(): pass', '<func wrapper>', 'exec')
+    tree.body[0].body = ast.parse(body, '<func code>', 'exec').body
+    return ast.fix_missing_locations(tree)
+
+
+def _parse(source, mode):
+    if mode == 'function':
+        return _parse_function(source)
+    return ast.parse(source, '<benchmark>', mode)
+
+
+def _compile_restricted(source, mode, policy):
+    if mode == 'function':
+        return compile_restricted_function(
+            '', source, 'script', policy=policy)
+    compile_func = {
+        'exec': compile_restricted_exec,
+        'eval': compile_restricted_eval,
+    }[mode]
+    return compile_func(source, '<benchmark>', policy=policy)
+
+
+def measure(source, mode, policy=RestrictingNodeTransformer, number=10,
+            repeat=5):
+    """Return the best time in seconds of each phase for one compilation.
+    """
+    result = _compile_restricted(source, mode, policy)
+    if result.errors:
+        raise SyntaxError(result.errors[0])
+
+    parse = best_time(_parse, [(source, mode)] * number, repeat)
+    nodes = sum(1 for node in ast.walk(_parse(source, mode)))
+
+    # The policy changes the tree in place, so each call needs a fresh one.
+    transform = None
+    for i in range(repeat):
+        trees = [_parse(source, mode) for j in range(number)]
+        elapsed = best_time(
+            lambda tree: policy([], [], {}).visit(tree),
+            [(tree, ) for tree in trees], 1)
+        if transform is None or elapsed < transform:
+            transform = elapsed
+
+    compile_mode = 'exec' if mode == 'function' else mode
+    compile_ = best_time(
+        compile, [(tree, '<benchmark>', compile_mode) for tree in trees],
+        repeat)
+
+    total = best_time(
+        _compile_restricted, [(source, mode, policy)] * number, repeat)
+
+    return {
+        'lines': source.count('\n') + 1,
+        'nodes': nodes,
+        'parse': parse,
+        'transform': transform,
+        'compile': compile_,
+        'total': total,
+    }
+
+
+def run(corpus=CORPUS, name_filter=None, number=10, repeat=5,
+        policy=RestrictingNodeTransformer):
+    """Measure the cases of `corpus` and return the results as dict."""
+    results = []
+    for name in sorted(corpus):
+        if name_filter and name_filter not in name:
+            continue
+        source, modes = corpus[name]
+        for mode in modes:
+            timings = measure(source, mode, policy, number, repeat)
+            timings.update(case=name, mode=mode)
+            results.append(timings)
+    data = environment('compile_throughput')
+    data.update(
+        policy=policy.__name__, number=number, repeat=repeat, results=results)
+    return data
+
+
+def format_results(data):
+    lines = ['{0:<28} {1:<8} {2:>6} {3:>10} {4:>10} {5:>10} {6:>10}'.format(
+        'case', 'mode', 'nodes', 'parse ms', 'transf ms', 'compile ms',
+        'total ms')]
+    for result in data['results']:
+        lines.append(
+            '{case:<28} {mode:<8} {nodes:>6} {parse:>10.3f} '
+            '{transform:>10.3f} {compile:>10.3f} {total:>10.3f}'.format(
+                case=result['case'],
+                mode=result['mode'],
+                nodes=result['nodes'],
+                parse=result['parse'] * 1000,
+                transform=result['transform'] * 1000,
+                compile=result['compile'] * 1000,
+                total=result['total'] * 1000))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help='write the results as JSON to FILE, "-" for stdout')
+    parser.add_argument(
+        '--filter', metavar='TEXT', help='only run cases containing TEXT')
+    parser.add_argument(
+        '--number', type=int, default=10,
+        help='compilations per measurement (default: %(default)s)')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='measurements per phase, the best is reported '
+             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    data = run(name_filter=args.filter, number=args.number,
+               repeat=args.repeat)
+    if args.json != '-':
+        print(format_results(data))
+    if args.json:
+        write_json(data, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Sources for the compile benchmarks.
+
+`CORPUS` maps a case name to `(source, modes)`. The modes are the ones of
+`compile_restricted` the source can be compiled in, 'function' means the
+source is the body of `compile_restricted_function` like a Python Script.
+The 'single' mode is not benchmarked as the policy rejects interactive
+statements.
+"""
+
+SCRIPT_MODES = ('function', )
+EXPRESSION_MODES = ('eval', 'exec')
+
+
+# Zope-style Python Scripts as found in typical applications.
+
+LISTING_SCRIPT = """\
+request = container.REQUEST
+response = request.response
+results = []
+for item in context.objectValues(['Folder', 'Document']):
+    if not item.getProperty('visible', True):
+        continue
+    results.append({
+        'id': item.getId(),
+        'title': item.title_or_id(),
+        'url': item.absolute_url(),
+        'modified': item.bobobase_modification_time(),
+    })
+results.sort(key=lambda entry: entry['modified'], reverse=True)
+batch_size = int(request.get('b_size', 20))
+start = int(request.get('b_start', 0))
+response.setHeader('Content-Type', 'text/html')
+return results[start:start + batch_size]
+"""
+
+FORM_SCRIPT = """\
+form = context.REQUEST.form
+errors = {}
+for field in ('name', 'email', 'subject', 'message'):
+    value = form.get(field, '').strip()
+    if not value:
+        errors[field] = 'Please fill in %s.' % field
+if '@' not in form.get('email', ''):
+    errors['email'] = 'Invalid email address.'
+if errors:
+    return context.contact_form(errors=errors, **form)
+try:
+    context.MailHost.send(
+        form['message'],
+        mto=context.email_from_address,
+        mfrom=form['email'],
+        subject='[Contact] ' + form['subject'])
+except Exception as exc:
+    context.plone_log('Sending mail failed: %s' % exc)
+    return context.contact_form(errors={'mail': str(exc)}, **form)
+return context.REQUEST.RESPONSE.redirect(context.absolute_url() + '/thanks')
+"""
+
+REPORT_SCRIPT = """\
+total = 0
+counts = {}
+for order in context.orders():
+    customer, amount = order.customer, order.amount
+    total += amount
+    counts[customer] = counts.get(customer, 0) + 1
+    if amount > 1000:
+        print('Large order: %s (%.2f)' % (order.id, amount))
+top = sorted(counts.items(), key=lambda item: -item[1])[:10]
+for position, (customer, count) in enumerate(top):
+    print('%2d. %s: %d orders' % (position + 1, customer, count))
+print('Total: %.2f' % total)
+return printed
+"""
+
+TRAVERSAL_SCRIPT = """\
+path = traverse_subpath or ['index']
+obj = context
+for name in path:
+    obj = obj.restrictedTraverse(name, None)
+    if obj is None:
+        raise KeyError(name)
+parents = [p.getId() for p in obj.aq_chain
+           if getattr(p, 'isPrincipiaFolderish', 0)]
+return {
+    'path': '/'.join(path),
+    'parents': parents,
+    'title': obj.title,
+    'meta_type': getattr(obj, 'meta_type', None),
+}
+"""
+
+TALES_EXPRESSIONS = [
+    "context.title or context.getId()",
+    "request.get('b_start', 0) + 20",
+    "[item.getId() for item in context.objectValues() if item.visible]",
+    "len(results) > 0 and results[0]['title'] or 'No results'",
+    "'%s (%d)' % (user.getUserName(), len(user.getRoles()))",
+]
+
+
+# Generated sources.
+
+def generated_module(functions=100):
+    """Return a module with many functions like a larger library."""
+    parts = ['import math', '', 'CONSTANTS = {%s}' % ', '.join(
+        "'c%d': %d" % (i, i) for i in range(50))]
+    for i in range(functions):
+        parts.append('''
+def function_{0}(items, factor={0}):
+    """Docstring of function {0}."""
+    result = []
+    for index, item in enumerate(items):
+        if index % 2:
+            result.append(item.value * factor)
+        else:
+            result.append(math.sqrt(abs(item[index])))
+    total = sum(result)
+    total += CONSTANTS.get('c{1}', 0)
+    return [x for x in result if x > total / len(result)]
+'''.format(i, i % 50))
+    return '\n'.join(parts)
+
+
+def nested_parentheses(depth=50):
+    return '(' * depth + 'a' + ')' * depth
+
+
+def long_attribute_chain(length=200):
+    return 'context' + '.child' * length
+
+
+def long_boolean_chain(length=500):
+    return ' and '.join('a%d > %d' % (i, i) for i in range(length))
+
+
+def nested_functions(depth=20):
+    lines = []
+    for level in range(depth):
+        lines.append('    ' * level + 'def f%d(a%d):' % (level, level))
+    lines.append('    ' * depth + 'return a0')
+    return '\n'.join(lines)
+
+
+def nested_comprehensions(depth=10):
+    source = 'x%d' % depth
+    for level in range(depth, 0, -1):
+        source = '[%s for x%d in x%d]' % (source, level, level - 1)
+    return source
+
+
+def large_dict_literal(entries=2000):
+    return '{%s}' % ', '.join("'key%d': value[%d]" % (i, i)
+                              for i in range(entries))
+
+
+CORPUS = {
+    'script_listing': (LISTING_SCRIPT, SCRIPT_MODES),
+    'script_form': (FORM_SCRIPT, SCRIPT_MODES),
+    'script_report': (REPORT_SCRIPT, SCRIPT_MODES),
+    'script_traversal': (TRAVERSAL_SCRIPT, SCRIPT_MODES),
+    'generated_module_100': (generated_module(100), ('exec', )),
+    'nested_parentheses_50': (nested_parentheses(50), EXPRESSION_MODES),
+    'attribute_chain_200': (long_attribute_chain(200), EXPRESSION_MODES),
+    'boolean_chain_500': (long_boolean_chain(500), EXPRESSION_MODES),
+    'nested_functions_20': (nested_functions(20), ('exec', )),
+    'nested_comprehensions_10': (
+        nested_comprehensions(10), EXPRESSION_MODES),
+    'dict_literal_2000': (large_dict_literal(2000), EXPRESSION_MODES),
+}
+
+for _number, _expression in enumerate(TALES_EXPRESSIONS):
+    CORPUS['tales_expression_%d' % _number] = (
+        _expression, EXPRESSION_MODES)
+del _number, _expression
@@ -0,0 +1,131 @@
+"""Measure how creating the globals of each execution affects its time.
+
+Hosts run restricted code in new globals each time. The strategies compared
+are copying the builtins for each execution (``copy``), a `GlobalsFactory`
+sharing one copy (``factory``) and using `safe_builtins` itself (``shared``).
+The speedup is the ``copy`` time divided by the ``factory`` time.
+
+Usage::
+
+    $ python -m benchmarks.globals_setup [--json FILE] [--filter TEXT]
+"""
+
+from __future__ import print_function
+from benchmarks.timing import best_time
+from benchmarks.timing import environment
+from benchmarks.timing import write_json
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import safe_builtins
+from RestrictedPython.Guards import GlobalsFactory
+
+import argparse
+
+
+# Maps names to `(source, names)`, `names` are passed to each execution.
+WORKLOADS = {
+    'call': ('x = len(a)', {'a': 'abc'}),
+    'loop': ("""
+total = 0
+for i in range(20):
+    total = total + len(a) + abs(i)
+""", {'a': 'abc'}),
+}
+
+
+# The guards needed by the workloads.
+GUARDS = {'_getiter_': iter}
+
+
+def copy_globals(**names):
+    """Return new globals with a new copy of the builtins."""
+    scope = dict(GUARDS, __builtins__=dict(safe_builtins))
+    scope.update(names)
+    return scope
+
+
+def shared_globals(**names):
+    """Return new globals using `safe_builtins` itself."""
+    scope = dict(GUARDS, __builtins__=safe_builtins)
+    scope.update(names)
+    return scope
+
+
+STRATEGIES = {
+    'copy': copy_globals,
+    'factory': GlobalsFactory(**GUARDS),
+    'shared': shared_globals,
+}
+
+
+def measure(source, names, number=20000, repeat=5):
+    """Return the best time of one execution for each strategy."""
+    result = compile_restricted_exec(source)
+    if result.errors:
+        raise SyntaxError(result.errors[0])
+    code = result.code
+    timings = {}
+    for name, make_globals in STRATEGIES.items():
+        def execute(make_globals=make_globals):
+            exec(code, make_globals(**names))
+        timings[name] = best_time(execute, [()] * number, repeat)
+    timings['speedup'] = timings['copy'] / timings['factory']
+    return timings
+
+
+def run(workloads=WORKLOADS, name_filter=None, number=20000, repeat=5):
+    """Measure the `workloads` and return the results as dict."""
+    results = []
+    for name in sorted(workloads):
+        if name_filter and name_filter not in name:
+            continue
+        source, names = workloads[name]
+        timings = measure(source, names, number, repeat)
+        timings['workload'] = name
+        results.append(timings)
+    data = environment('globals_setup')
+    data.update(number=number, repeat=repeat, results=results)
+    return data
+
+
+def format_results(data):
+    lines = ['{0:<10} {1:>9} {2:>11} {3:>10} {4:>9}'.format(
+        'workload', 'copy us', 'factory us', 'shared us', 'speedup')]
+    for result in data['results']:
+        lines.append(
+            '{workload:<10} {copy:>9.3f} {factory:>11.3f} {shared:>10.3f} '
+            '{speedup:>8.2f}x'.format(
+                workload=result['workload'],
+                copy=result['copy'] * 1e6,
+                factory=result['factory'] * 1e6,
+                shared=result['shared'] * 1e6,
+                speedup=result['speedup']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help='write the results as JSON to FILE, "-" for stdout')
+    parser.add_argument(
+        '--filter', metavar='TEXT',
+        help='only run workloads containing TEXT')
+    parser.add_argument(
+        '--number', type=int, default=20000,
+        help='executions per measurement (default: %(default)s)')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='measurements per strategy, the best is reported '
+             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    data = run(name_filter=args.filter, number=args.number,
+               repeat=args.repeat)
+    if args.json != '-':
+        print(format_results(data))
+    if args.json:
+        write_json(data, args.json)
+
+
+if __name__ == '__main__':
+    main()
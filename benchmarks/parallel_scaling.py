@@ -0,0 +1,197 @@
+"""Measure how compiling and running restricted code scales with threads.
+
+Each workload is run by 1, 2, 4, ... threads up to the number of cores, each
+thread doing the same number of operations. The speedup is the throughput
+relative to one thread, the efficiency the speedup per thread. With the GIL
+the speedup stays around 1, on a free-threaded Python (PEP 703) it should
+grow linearly.
+
+The threads share what hosts usually share: the builtins, the guards, the
+compiled code and `RestrictionCapableEval` instances. So the benchmark also
+stresses their thread safety, the results of all threads are checked.
+
+Usage::
+
+    $ python -m benchmarks.parallel_scaling [--json FILE] [--threads N]
+"""
+
+from __future__ import print_function
+from benchmarks.corpus import LISTING_SCRIPT
+from benchmarks.runtime_overhead import restricted_globals
+from benchmarks.runtime_overhead import WORKLOADS as RUNTIME_WORKLOADS
+from benchmarks.timing import clock
+from benchmarks.timing import environment
+from benchmarks.timing import write_json
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import compile_restricted_function
+from RestrictedPython.Eval import RestrictionCapableEval
+
+import argparse
+import multiprocessing
+import sys
+import threading
+
+
+def compile_workload():
+    """Compile a script, every call does the complete compilation."""
+    def operation():
+        result = compile_restricted_function(
+            'items', LISTING_SCRIPT, 'listing')
+        assert result.errors == ()
+    return operation
+
+
+def exec_workload():
+    """Run a restricted loop with globals shared by all threads."""
+    source, make_data = RUNTIME_WORKLOADS['attribute']
+    scope = restricted_globals()
+    exec(compile_restricted_exec(source).code, scope)
+    workload = scope['workload']
+    data = make_data(1000)
+    expected = workload(data)
+
+    def operation():
+        assert workload(data) == expected
+    return operation
+
+
+def eval_workload():
+    """Evaluate new and shared `RestrictionCapableEval` instances."""
+    shared = RestrictionCapableEval('a * 2 + len(b)')
+    shared.globals = {'len': len}
+
+    def operation():
+        expression = RestrictionCapableEval('a + 1')
+        assert expression.eval({'a': 1}) == 2
+        assert shared.eval({'a': 3, 'b': 'ab'}) == 8
+    return operation
+
+
+WORKLOADS = {
+    'compile': (compile_workload, 50),
+    'exec': (exec_workload, 50),
+    'eval': (eval_workload, 2000),
+}
+
+
+def gil_enabled():
+    """Return whether the interpreter runs with the GIL."""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def thread_counts(max_threads):
+    """Return 1, 2, 4, ... up to and including `max_threads`."""
+    counts = []
+    count = 1
+    while count < max_threads:
+        counts.append(count)
+        count *= 2
+    counts.append(max_threads)
+    return counts
+
+
+def run_threads(operation, threads, operations):
+    """Run `operation` `operations` times in each of `threads` threads.
+
+    Returns the elapsed time, raises the first exception of a thread.
+    """
+    barrier = threading.Barrier(threads + 1)
+    errors = []
+
+    def target():
+        barrier.wait()
+        try:
+            for i in range(operations):
+                operation()
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    workers = [threading.Thread(target=target) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = clock()
+    for worker in workers:
+        worker.join()
+    elapsed = clock() - start
+    if errors:  # pragma: no cover
+        raise errors[0]
+    return elapsed
+
+
+def run(workloads=WORKLOADS, name_filter=None, max_threads=None,
+        scale=1.0):
+    """Measure the `workloads` and return the results as dict.
+
+    `scale` multiplies the number of operations per thread.
+    """
+    if max_threads is None:
+        max_threads = multiprocessing.cpu_count()
+    results = []
+    for name in sorted(workloads):
+        if name_filter and name_filter not in name:
+            continue
+        make_operation, operations = workloads[name]
+        operations = max(1, int(operations * scale))
+        operation = make_operation()
+        base = None
+        for threads in thread_counts(max_threads):
+            elapsed = run_threads(operation, threads, operations)
+            throughput = threads * operations / elapsed
+            if base is None:
+                base = throughput
+            results.append({
+                'workload': name,
+                'threads': threads,
+                'operations': threads * operations,
+                'time': elapsed,
+                'throughput': throughput,
+                'speedup': throughput / base,
+                'efficiency': throughput / base / threads,
+            })
+    data = environment('parallel_scaling')
+    data.update(gil_enabled=gil_enabled(), max_threads=max_threads,
+                results=results)
+    return data
+
+
+def format_results(data):
+    lines = [
+        'GIL enabled: {0}'.format(data['gil_enabled']),
+        '{0:<10} {1:>8} {2:>14} {3:>9} {4:>11}'.format(
+            'workload', 'threads', 'operations/s', 'speedup', 'efficiency')]
+    for result in data['results']:
+        lines.append(
+            '{workload:<10} {threads:>8} {throughput:>14.1f} '
+            '{speedup:>8.2f}x {efficiency:>10.0%}'.format(**result))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help='write the results as JSON to FILE, "-" for stdout')
+    parser.add_argument(
+        '--filter', metavar='TEXT',
+        help='only run workloads containing TEXT')
+    parser.add_argument(
+        '--threads', type=int, default=None,
+        help='maximal number of threads (default: number of cores)')
+    parser.add_argument(
+        '--scale', type=float, default=1.0,
+        help='factor for the number of operations per thread '
+             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    data = run(name_filter=args.filter, max_threads=args.threads,
+               scale=args.scale)
+    if args.json != '-':
+        print(format_results(data))
+    if args.json:
+        write_json(data, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Measure how much slower restricted code runs than unrestricted code.
+
+Each workload is compiled twice, restricted and with `policy=None`, and run
+on the same data. The restricted code gets the reference guard
+implementations of RestrictedPython, the unrestricted code the real
+builtins. The slowdown factor is the restricted divided by the unrestricted
+time.
+
+Usage::
+
+    $ python -m benchmarks.runtime_overhead [--json FILE] [--filter TEXT]
+"""
+
+from __future__ import print_function
+from benchmarks.timing import best_time
+from benchmarks.timing import environment
+from benchmarks.timing import write_json
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import PrintCollector
+from RestrictedPython import safe_builtins
+from RestrictedPython.Guards import full_write_guard
+from RestrictedPython.Guards import guarded_iter_unpack_sequence
+from RestrictedPython.Guards import guarded_unpack_sequence
+from RestrictedPython.Guards import safer_getattr
+
+import argparse
+import functools
+import io
+import operator
+
+
+try:
+    import builtins
+except ImportError:  # pragma: no cover
+    # Python 2
+    import __builtin__ as builtins
+
+
+class Point(object):
+
+    def __init__(self, x, y, origin=None):
+        self.x = x
+        self.y = y
+        self.origin = origin
+
+
+# Maps names to `(source, make_data)`. The source defines `workload(data)`,
+# `make_data(size)` builds its argument.
+WORKLOADS = {
+    'loop': ("""
+def workload(items):
+    total = 0
+    for item in items:
+        total = total + item
+    return total
+""", lambda size: list(range(size))),
+
+    'attribute': ("""
+def workload(points):
+    total = 0
+    for point in points:
+        total = total + point.x * point.y + point.origin.x
+    return total
+""", lambda size: [Point(i, 2, Point(1, 1)) for i in range(size)]),
+
+    'subscript': ("""
+def workload(rows):
+    total = 0
+    for row in rows:
+        total = total + row['a'] + row['b'][1] + len(row['c'][1:3])
+    return total
+""", lambda size: [{'a': i, 'b': (i, 2), 'c': 'text'} for i in range(size)]),
+
+    'unpacking': ("""
+def workload(pairs):
+    total = 0
+    for key, (a, b) in pairs:
+        first, second = b, a
+        total = total + first - second
+    return total
+""", lambda size: [(i, (i, 2 * i)) for i in range(size)]),
+
+    'printing': ("""
+def workload(items):
+    for item in items:
+        print(item, 'item')
+    return len(items)
+""", lambda size: list(range(size))),
+
+    'augmented_assignment': ("""
+def workload(numbers):
+    total = 0
+    count = 0
+    for number in numbers:
+        total += number
+        count += 1
+        total *= 1
+    return total, count
+""", lambda size: list(range(size))),
+}
+
+
+INPLACE_OPERATORS = {
+    '+=': operator.iadd,
+    '-=': operator.isub,
+    '*=': operator.imul,
+    '/=': operator.itruediv,
+    '//=': operator.ifloordiv,
+    '%=': operator.imod,
+    '**=': operator.ipow,
+    '<<=': operator.ilshift,
+    '>>=': operator.irshift,
+    '|=': operator.ior,
+    '^=': operator.ixor,
+    '&=': operator.iand,
+}
+
+
+def guarded_getitem(ob, index):
+    return ob[index]
+
+
+def guarded_inplacevar(op, x, y):
+    return INPLACE_OPERATORS[op](x, y)
+
+
+def restricted_globals():
+    """Return globals with the reference guard implementations."""
+    return {
+        '__builtins__': safe_builtins,
+        '_getattr_': safer_getattr,
+        '_getitem_': guarded_getitem,
+        '_getiter_': iter,
+        '_iter_unpack_sequence_': guarded_iter_unpack_sequence,
+        '_unpack_sequence_': guarded_unpack_sequence,
+        '_inplacevar_': guarded_inplacevar,
+        '_print_': PrintCollector,
+        '_write_': full_write_guard,
+    }
+
+
+def unrestricted_globals():
+    """Return globals with the real builtins, `print` writes to memory."""
+    unrestricted_builtins = dict(vars(builtins))
+    unrestricted_builtins['print'] = functools.partial(
+        print, file=io.StringIO())
+    return {'__builtins__': unrestricted_builtins}
+
+
+def _workload_function(source, policy_is_none):
+    if policy_is_none:
+        result = compile_restricted_exec(source, policy=None)
+        scope = unrestricted_globals()
+    else:
+        result = compile_restricted_exec(source)
+        scope = restricted_globals()
+    if result.errors:
+        raise SyntaxError(result.errors[0])
+    exec(result.code, scope)
+    return scope['workload']
+
+
+def measure(source, data, number=5, repeat=5):
+    """Return the best restricted and unrestricted time of one run."""
+    restricted = _workload_function(source, policy_is_none=False)
+    unrestricted = _workload_function(source, policy_is_none=True)
+    restricted_result = restricted(data)
+    if restricted_result != unrestricted(data):
+        raise AssertionError('The results differ: {0!r}'.format(
+            restricted_result))
+    restricted_time = best_time(restricted, [(data, )] * number, repeat)
+    unrestricted_time = best_time(unrestricted, [(data, )] * number, repeat)
+    return {
+        'restricted': restricted_time,
+        'unrestricted': unrestricted_time,
+        'slowdown': restricted_time / unrestricted_time,
+    }
+
+
+def run(workloads=WORKLOADS, name_filter=None, size=10000, number=5,
+        repeat=5):
+    """Measure the `workloads` and return the results as dict."""
+    results = []
+    for name in sorted(workloads):
+        if name_filter and name_filter not in name:
+            continue
+        source, make_data = workloads[name]
+        timings = measure(source, make_data(size), number, repeat)
+        timings['workload'] = name
+        results.append(timings)
+    data = environment('runtime_overhead')
+    data.update(size=size, number=number, repeat=repeat, results=results)
+    return data
+
+
+def format_results(data):
+    lines = ['{0:<22} {1:>15} {2:>15} {3:>9}'.format(
+        'workload', 'restricted ms', 'unrestricted ms', 'slowdown')]
+    for result in data['results']:
+        lines.append(
+            '{workload:<22} {restricted:>15.3f} {unrestricted:>15.3f} '
+            '{slowdown:>8.2f}x'.format(
+                workload=result['workload'],
+                restricted=result['restricted'] * 1000,
+                unrestricted=result['unrestricted'] * 1000,
+                slowdown=result['slowdown']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--json', metavar='FILE',
+        help='write the results as JSON to FILE, "-" for stdout')
+    parser.add_argument(
+        '--filter', metavar='TEXT',
+        help='only run workloads containing TEXT')
+    parser.add_argument(
+        '--size', type=int, default=10000,
+        help='number of items each workload loops over '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--number', type=int, default=5,
+        help='runs per measurement (default: %(default)s)')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='measurements per workload, the best is reported '
+             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    data = run(name_filter=args.filter, size=args.size, number=args.number,
+               repeat=args.repeat)
+    if args.json != '-':
+        print(format_results(data))
+    if args.json:
+        write_json(data, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Helpers shared by the benchmarks."""
+
+import json
+import platform
+import sys
+import time
+
+
+try:
+    from time import perf_counter as clock
+except ImportError:  # pragma: no cover
+    # Python 2
+    from time import clock
+
+
+def best_time(func, args_list, repeat):
+    """Return the best time per call of `func` for the arguments.
+
+    `func` is called once for each argument tuple in `args_list`, this is
+    repeated `repeat` times.
+    """
+    best = None
+    for i in range(repeat):
+        start = clock()
+        for args in args_list:
+            func(*args)
+        elapsed = (clock() - start) / len(args_list)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def environment(benchmark):
+    """Return the metadata stored with the results of `benchmark`."""
+    return {
+        'benchmark': benchmark,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+    }
+
+
+def write_json(data, path):
+    """Write `data` to the file `path`, "-" means stdout."""
+    if path == '-':
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+        return
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
@@ -0,0 +1,341 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Single-file bundles of precompiled restricted code.
+
+A bundle stores many restricted code objects compiled in advance, so a
+server does not have to run the policy at all. The file layout is:
+
+  header -- `HEADER`: bundle magic, format version, magic number of the
+            Python bytecode, number of entries and the offsets of the
+            records and of the hashes
+  entries -- one marshalled tuple per script:
+             `(code, used_names, warnings, mode, filename, fingerprint)`
+  ids -- the UTF-8 encoded script ids
+  records -- one `RECORD` per script, sorted by id:
+             `(id offset, id size, entry offset, entry size)`
+  hashes -- one `HASH_RECORD` per script, sorted by hash:
+            `(SHA-256 digest of the source, record number)`
+
+`Bundle` maps the file into memory and looks up ids and hashes by binary
+search in the mapped records, so opening a bundle reads nothing but the
+header. The entries are unmarshalled on first use, so the memory of scripts
+which never run is not paid for.
+
+Marshalled code can only be loaded by the Python version which wrote it, so
+bundles have to be built with the same Python as the servers using them.
+"""
+
+from .compile import CompileResult
+from .transformer import RestrictingNodeTransformer
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+
+
+try:
+    from importlib.util import MAGIC_NUMBER as PYTHON_MAGIC
+except ImportError:  # pragma: no cover
+    # Python 2
+    from imp import get_magic
+    PYTHON_MAGIC = get_magic()
+
+
+MAGIC = b'RPYB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH4sQQQ')
+RECORD = struct.Struct('<QIQI')
+HASH_RECORD = struct.Struct('<32sI')
+
+
+# `os.replace` does not exist in Python 2, `os.rename` is atomic on POSIX.
+_replace = getattr(os, 'replace', os.rename)
+
+
+class BundleError(Exception):
+    """The bundle can not be used."""
+
+
+def _digest(source):
+    if not isinstance(source, bytes):
+        source = source.encode('utf-8')
+    return hashlib.sha256(source).digest()
+
+
+# Fingerprints of the policies by class, see `policy_fingerprint`.
+_fingerprints = {}
+
+
+def _module_digest(module_name):
+    """Return the hex SHA-256 digest of the file of the module or `None`."""
+    path = getattr(sys.modules.get(module_name), '__file__', None)
+    if path is None:
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def policy_fingerprint(policy):
+    """Return a string identifying `policy`.
+
+    It contains the names of the policy classes in the method resolution
+    order and a digest of the files of their modules, so bundles compiled by
+    an other version of a policy (e.g. before an upgrade of
+    RestrictedPython) are not accepted.
+    """
+    fingerprint = _fingerprints.get(policy)
+    if fingerprint is None:
+        classes = [cls for cls in policy.__mro__
+                   if issubclass(cls, RestrictingNodeTransformer)]
+        digest = hashlib.sha256()
+        for module_name in sorted(set(cls.__module__ for cls in classes)):
+            digest.update(
+                '{0}:{1}\n'.format(
+                    module_name, _module_digest(module_name)).encode('utf-8'))
+        fingerprint = ' '.join(
+            ['{0.__module__}.{0.__name__}'.format(cls) for cls in classes]
+            + ['sha256:' + digest.hexdigest()[:16]])
+        _fingerprints[policy] = fingerprint
+    return fingerprint
+
+
+class BundleWriter(object):
+    """Write a bundle to the file `path`.
+
+    Usage::
+
+        with BundleWriter('scripts.bundle') as writer:
+            for script_id, source in scripts:
+                result = compile_restricted_exec(source, script_id)
+                writer.add(script_id, source, result, filename=script_id)
+
+    The bundle is written to a temporary file which replaces `path` only on
+    `close`, so readers having the old bundle mapped are not affected. If
+    the `with` block raises an exception, `abort` is called instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # `(encoded id, entry offset, entry size, digest)` per script
+        self._entries = []
+        self._ids = set()
+        self._temp_path = '{0}.{1}-{2}.tmp'.format(path, os.getpid(), id(self))
+        self._file = open(self._temp_path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, 0, b'\0' * 4, 0, 0, 0))
+        self._offset = HEADER.size
+
+    def add(self, script_id, source, result, mode='exec',
+            filename='<string>', policy=RestrictingNodeTransformer):
+        """Add the `CompileResult` of `source` under `script_id`.
+
+        Raises a ValueError if the source was rejected by the policy.
+        """
+        if result.code is None:
+            raise ValueError(
+                'Script {0!r} did not compile: {1}'.format(
+                    script_id, '; '.join(result.errors)))
+        self.add_code(
+            script_id, source, result.code, tuple(result.used_names),
+            tuple(result.warnings), mode, filename, policy_fingerprint(policy))
+
+    def add_code(self, script_id, source, code, used_names, warnings, mode,
+                 filename, fingerprint):
+        """Add an already compiled entry, e.g. compiled by another process.
+        """
+        if script_id in self._ids:
+            raise ValueError('Duplicate script id {0!r}'.format(script_id))
+        self._ids.add(script_id)
+        data = marshal.dumps(
+            (code, used_names, warnings, mode, filename, fingerprint))
+        self._file.write(data)
+        self._entries.append((
+            script_id.encode('utf-8'), self._offset, len(data),
+            _digest(source)))
+        self._offset += len(data)
+
+    def close(self):
+        if self._file is None:
+            return
+        write = self._file.write
+        entries = sorted(self._entries)
+        records = []
+        offset = self._offset
+        for encoded_id, entry_offset, entry_size, digest in entries:
+            write(encoded_id)
+            records.append(RECORD.pack(
+                offset, len(encoded_id), entry_offset, entry_size))
+            offset += len(encoded_id)
+        records_offset = offset
+        write(b''.join(records))
+        hashes_offset = records_offset + len(records) * RECORD.size
+        write(b''.join(sorted(
+            HASH_RECORD.pack(entry[3], number)
+            for number, entry in enumerate(entries))))
+        self._file.seek(0)
+        write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, PYTHON_MAGIC, len(entries),
+            records_offset, hashes_offset))
+        self._file.close()
+        self._file = None
+        _replace(self._temp_path, self.path)
+
+    def abort(self):
+        """Discard the written entries, `path` is not changed."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class Bundle(object):
+    """Read-only access to a bundle written by `BundleWriter`.
+
+    where:
+
+      path -- the path of the bundle file
+      policy -- if not `None`, only entries compiled by this policy are
+                returned, others raise a `BundleError`
+
+    `get` returns a `CompileResult` like the `compile_restricted_*`
+    functions.
+    """
+
+    def __init__(self, path, policy=RestrictingNodeTransformer):
+        self.path = path
+        self.fingerprint = (
+            None if policy is None else policy_fingerprint(policy))
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise BundleError('{0} is not a bundle.'.format(path))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def _read_header(self):
+        (magic, version, python_magic, self._count, self._records_offset,
+         self._hashes_offset) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise BundleError('{0} is not a bundle.'.format(self.path))
+        if version != FORMAT_VERSION:
+            raise BundleError(
+                '{0} has the unsupported format version {1}.'.format(
+                    self.path, version))
+        if python_magic != PYTHON_MAGIC:
+            raise BundleError(
+                '{0} was written by another Python version.'.format(
+                    self.path))
+
+    def _record(self, number):
+        return RECORD.unpack_from(
+            self._mmap, self._records_offset + number * RECORD.size)
+
+    def _record_id(self, record):
+        id_offset, id_size = record[:2]
+        return self._mmap[id_offset:id_offset + id_size]
+
+    def _find_record(self, script_id):
+        key = script_id.encode('utf-8')
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            found = self._record_id(record)
+            if found == key:
+                return record
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, script_id):
+        return self._find_record(script_id) is not None
+
+    def ids(self):
+        """Iterate over the script ids in sorted order."""
+        for number in range(self._count):
+            yield self._record_id(self._record(number)).decode('utf-8')
+
+    def get(self, script_id):
+        """Return the `CompileResult` of `script_id`.
+
+        Raises a KeyError if there is no such entry.
+        """
+        result = self._loaded.get(script_id)
+        if result is None:
+            record = self._find_record(script_id)
+            if record is None:
+                raise KeyError(script_id)
+            entry_offset, entry_size = record[2:]
+            code, used_names, warnings, mode, filename, fingerprint = \
+                marshal.loads(
+                    self._mmap[entry_offset:entry_offset + entry_size])
+            if (self.fingerprint is not None
+                    and fingerprint != self.fingerprint):
+                raise BundleError(
+                    'Script {0!r} was compiled with another policy: '
+                    '{1}'.format(script_id, fingerprint))
+            result = CompileResult(
+                code, (), list(warnings), dict.fromkeys(used_names, True))
+            with self._lock:
+                result = self._loaded.setdefault(script_id, result)
+        return result
+
+    def find(self, source):
+        """Return the id of the script compiled from `source` or `None`."""
+        key = _digest(source)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            digest, number = HASH_RECORD.unpack_from(
+                self._mmap, self._hashes_offset + middle * HASH_RECORD.size)
+            if digest == key:
+                return self._record_id(self._record(number)).decode('utf-8')
+            if digest < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
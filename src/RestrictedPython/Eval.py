@@ -12,10 +12,22 @@
 ##############################################################################
 """Restricted Python Expressions."""
 
+from . import tracing
+from ._compat import IS_CPYTHON
 from ._compat import IS_PY2
 from .compile import compile_restricted_eval
+from .compile import compile_restricted_function
+from .compile import NOT_CPYTHON_WARNING
+from .Interpreter import ExpressionInterpreter
+from .Interpreter import NotInterpretable
+from .names import free_names
+from .transformer import RestrictingNodeTransformer
+from collections import namedtuple
+from collections import OrderedDict
 
 import ast
+import threading
+import warnings
 
 
 if IS_PY2:
@@ -40,6 +52,82 @@ def default_guarded_getiter(ob):
     return ob
 
 
+CacheInfo = namedtuple('CacheInfo', 'hits, misses, maxsize, currsize')
+
+
+class ExpressionCache(object):
+    """Thread-safe, size bounded LRU cache for compiled expressions.
+
+    It maps `(expr, policy)` to `(code, used)`, `policy` is `None` for the
+    unrestricted code. The code of the function variant is stored under
+    `(expr, policy, params)`.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            # Re-insert to mark it as the most recently used entry.
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._data))
+
+    def hit_rate(self):
+        """Return the ratio of hits of all lookups."""
+        hits, misses = self.info()[:2]
+        if not hits + misses:
+            return 0.0
+        return float(hits) / (hits + misses)
+
+
+# The lazy preparation of a `RestrictionCapableEval` changes its `exp_node` in
+# place, so it is serialized per instance. The instances share a fixed set of
+# locks instead of having their own one, which would make them unpicklable.
+_preparation_locks = tuple(threading.RLock() for i in range(64))
+
+
+def _preparation_lock(ob):
+    # Objects are aligned to 16 bytes, so the low bits of `id` are zero.
+    return _preparation_locks[(id(ob) >> 4) % len(_preparation_locks)]
+
+
+def _used_names(exp_node):
+    """Examine the ast to discover which names the expression needs."""
+    used = set()
+    for node in ast.walk(exp_node):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                used.add(node.id)
+    return tuple(used)
+
+
 class RestrictionCapableEval(object):
     """A base class for restricted code."""
 
@@ -53,55 +141,227 @@ class RestrictionCapableEval(object):
     # Names used by the expression
     used = None
 
+    # restricted function, called with the values of `params`
+    rfunction = None
+
+    # Names passed as positional arguments to `rfunction`
+    params = None
+
+    # Parsed expression, shared by the restricted and unrestricted code
+    exp_node = None
+
+    # Expression ast checked and transformed by `policy`, it is kept until
+    # the restricted code is compiled from it.
+    rtree = None
+
+    # `ExpressionInterpreter` of `rtree` used by `eval` for cold expressions
+    interpreter = None
+
+    # Expressions up to this length are interpreted by `eval` instead of
+    # compiled, set to `None` to always compile.
+    interpret_max_length = 200
+
+    # Number of calls of `eval` after which an interpreted expression is hot
+    # and gets compiled.
+    compile_threshold = 5
+
+    # Number of interpreted evaluations so far
+    evaluations = 0
+
+    # Policy used to compile the restricted code
+    policy = RestrictingNodeTransformer
+
+    # Process-wide cache of the compiled code shared by all instances,
+    # set to `None` to disable caching.
+    cache = ExpressionCache()
+
     def __init__(self, expr):
         """Create a restricted expression
 
         where:
 
           expr -- a string containing the expression to be evaluated.
+
+        The expression is parsed once to catch syntax errors and to discover
+        the used names. The restricted and unrestricted code are only compiled
+        when they are needed. If the restricted code of the expression is
+        already cached it is reused without parsing.
         """
         expr = expr.strip()
         self.__name__ = expr
         expr = expr.translate(nltosp)
         self.expr = expr
+        cached = self._cache_get((self.policy,))
+        if cached is not None:
+            self.rcode, self.used = cached
+            return
         # Catch syntax errors.
-        self.prepUnrestrictedCode()
+        self.exp_node = compile(expr, '<string>', 'eval', ast.PyCF_ONLY_AST)
+        self.used = _used_names(self.exp_node)
+
+    def _cache_get(self, key):
+        if self.cache is None:
+            return None
+        if not tracing.enabled:
+            return self.cache.get((self.expr,) + key)
+        with tracing.span('cache_lookup', '<string>', 'eval',
+                          len(self.expr)) as span:
+            result = self.cache.get((self.expr,) + key)
+            span.set_outcome('miss' if result is None else 'hit')
+        return result
+
+    def _cache_set(self, key, value):
+        if self.cache is not None:
+            self.cache.set((self.expr,) + key, value)
 
     def prepRestrictedCode(self):
         if self.rcode is None:
-            result = compile_restricted_eval(self.expr, '<string>')
+            with _preparation_lock(self):
+                self._prepRestrictedCode()
+
+    def _prepRestrictedCode(self):
+        if self.rcode is None:
+            if self.rtree is not None:
+                # The expression is already checked and transformed.
+                self.rcode = compile(self.rtree, '<string>', 'eval')
+                self.rtree = None
+                self._cache_set((self.policy,), (self.rcode, self.used))
+                return
+            exp_node = self.exp_node
+            if exp_node is None:
+                cached = self._cache_get((self.policy,))
+                if cached is not None:
+                    self.rcode, self.used = cached
+                    return
+                exp_node = self.expr
+            else:
+                # `__init__` already missed the cache. The restricting
+                # transformer changes the ast in place.
+                self.exp_node = None
+            result = compile_restricted_eval(
+                exp_node, '<string>', policy=self.policy)
             if result.errors:
                 raise SyntaxError(result.errors[0])
             self.used = tuple(result.used_names)
             self.rcode = result.code
+            self._cache_set((self.policy,), (self.rcode, self.used))
+
+    def _prepRestrictedTree(self):
+        """Check and transform the expression without compiling it."""
+        if not IS_CPYTHON:
+            warnings.warn_explicit(
+                NOT_CPYTHON_WARNING, RuntimeWarning, 'RestrictedPython', 0)
+        exp_node = self.exp_node
+        # The restricting transformer changes the ast in place.
+        self.exp_node = None
+        errors = []
+        used_names = {}
+        self.policy(errors, [], used_names).visit(exp_node)
+        if errors:
+            raise SyntaxError(errors[0])
+        self.used = tuple(used_names)
+        self.rtree = exp_node
+
+    def _interpret(self):
+        """Return the interpreter `eval` uses or `None` to use the code.
+
+        Parsing and checking the expression has to be done anyway, compiling
+        it only pays off if it is evaluated several times. So short
+        expressions are interpreted until they were evaluated
+        `compile_threshold` times, then they are compiled.
+        """
+        if self.rcode is not None:
+            return None
+        with _preparation_lock(self):
+            interpreter = self.interpreter
+            if interpreter is None:
+                if (self.exp_node is None
+                        or self.interpret_max_length is None
+                        or len(self.expr) > self.interpret_max_length):
+                    return None
+                self._prepRestrictedTree()
+                try:
+                    interpreter = ExpressionInterpreter(self.rtree)
+                except NotInterpretable:
+                    return None
+                self.interpreter = interpreter
+            self.evaluations += 1
+            if self.evaluations > self.compile_threshold:
+                self.interpreter = None
+                return None
+            return interpreter
 
     def prepUnrestrictedCode(self):
         if self.ucode is None:
-            exp_node = compile(
-                self.expr,
-                '<string>',
-                'eval',
-                ast.PyCF_ONLY_AST)
+            with _preparation_lock(self):
+                self._prepUnrestrictedCode()
+
+    def _prepUnrestrictedCode(self):
+        if self.ucode is None:
+            cached = self._cache_get((None,))
+            if cached is not None:
+                self.ucode, used = cached
+                if self.used is None:
+                    self.used = used
+                return
+            exp_node = self.exp_node
+            if exp_node is None:
+                exp_node = compile(
+                    self.expr,
+                    '<string>',
+                    'eval',
+                    ast.PyCF_ONLY_AST)
 
             co = compile(exp_node, '<string>', 'eval')
 
-            # Examine the ast to discover which names the expression needs.
+            used = _used_names(exp_node)
             if self.used is None:
-                used = set()
-                for node in ast.walk(exp_node):
-                    if isinstance(node, ast.Name):
-                        if isinstance(node.ctx, ast.Load):
-                            used.add(node.id)
-
-                self.used = tuple(used)
+                self.used = used
 
             self.ucode = co
+            self._cache_set((None,), (co, used))
 
-    def eval(self, mapping):
-        # This default implementation is probably not very useful. :-(
-        # This is meant to be overridden.
-        self.prepRestrictedCode()
+    def prepRestrictedFunction(self):
+        """Compile the expression as a restricted function.
+
+        The parameters of `rfunction` (see `params`) are the names the
+        expression reads from its global scope and which are not defined in
+        `globals`. So they are fast local variables and no global scope has to
+        be built per call:
+
+          ob.rfunction(*[mapping[name] for name in ob.params])
 
+        The global scope of the function is prepared only once.
+        """
+        if self.rfunction is None:
+            with _preparation_lock(self):
+                self._prepRestrictedFunction()
+
+    def _prepRestrictedFunction(self):
+        if self.rfunction is None:
+            global_scope = self._global_scope()
+            params = tuple(sorted(
+                name for name in free_names(self.expr, mode='eval')
+                if name not in global_scope))
+            code = self._cache_get((self.policy, params))
+            if code is None:
+                result = compile_restricted_function(
+                    ', '.join(params),
+                    'return ' + self.expr,
+                    'expression',
+                    filename='<string>',
+                    policy=self.policy)
+                if result.errors:
+                    raise SyntaxError(result.errors[0])
+                code = result.code
+                self._cache_set((self.policy, params), code)
+            exec(code, global_scope)
+            # `params` has to be set first as `rfunction` is checked without
+            # the lock.
+            self.params = params
+            self.rfunction = global_scope.pop('expression')
+
+    def _global_scope(self):
         global_scope = {
             '_getattr_': default_guarded_getattr,
             '_getitem_': default_guarded_getitem,
@@ -109,12 +369,52 @@ class RestrictionCapableEval(object):
         }
 
         global_scope.update(self.globals)
+        return global_scope
+
+    def eval(self, mapping):
+        # This default implementation is probably not very useful. :-(
+        # This is meant to be overridden.
+        interpreter = self._interpret()
+        if interpreter is None:
+            self.prepRestrictedCode()
+
+        global_scope = self._global_scope()
 
         for name in self.used:
             if (name not in global_scope) and (name in mapping):
                 global_scope[name] = mapping[name]
 
+        if tracing.enabled:
+            with tracing.span(
+                    'execute', '<string>', 'eval', len(self.expr)):
+                if interpreter is not None:
+                    return interpreter(global_scope)
+                return eval(self.rcode, global_scope)
+        if interpreter is not None:
+            return interpreter(global_scope)
         return eval(self.rcode, global_scope)
 
+    def eval_many(self, mappings):
+        """Evaluate the expression once for each mapping in `mappings`.
+
+        This is a generator yielding the results. The global scope is prepared
+        only once, for each mapping only the used names are rebound.
+        """
+        self.prepRestrictedCode()
+
+        code = self.rcode
+        global_scope = self._global_scope()
+        names = tuple(
+            name for name in self.used if name not in global_scope)
+
+        for mapping in mappings:
+            for name in names:
+                try:
+                    global_scope[name] = mapping[name]
+                except KeyError:
+                    # Do not leak the value of the previous mapping.
+                    global_scope.pop(name, None)
+            yield eval(code, global_scope)
+
     def __call__(self, **kw):
         return self.eval(kw)
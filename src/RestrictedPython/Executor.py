@@ -0,0 +1,115 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Execute restricted code with host names resolved on demand.
+
+Hosts often put many expensive objects into the globals of each script call
+although most scripts use only a few of them. `RestrictedExecutor` takes a
+mapping of names to factories (the resolvers) and calls only the factories
+of the names the compiled code can read. These free names are computed once
+when the source is compiled and cached together with the code.
+"""
+
+from . import tracing
+from .compile import _compile_restricted_mode
+from .Eval import ExpressionCache
+from .names import free_names
+from .transformer import RestrictingNodeTransformer
+from collections import namedtuple
+
+
+# `code` compiled by `policy` and the global names the source reads.
+CompiledCode = namedtuple('CompiledCode', 'code, free_names')
+
+
+class RestrictedExecutor(object):
+    """Compile and run restricted code with lazily resolved globals.
+
+    where:
+
+      policy -- the policy used to compile the code
+      cache -- the `ExpressionCache` for the compiled code, by default each
+               executor has its own one
+    """
+
+    def __init__(self, policy=RestrictingNodeTransformer, cache=None):
+        self.policy = policy
+        if cache is None:
+            cache = ExpressionCache()
+        self.cache = cache
+
+    def compile(self, source, filename='<string>', mode='exec'):
+        """Return the `CompiledCode` of `source`.
+
+        Raises a SyntaxError with the first error if the source is not
+        allowed.
+        """
+        key = (source, filename, mode, self.policy)
+        if not tracing.enabled:
+            compiled = self.cache.get(key)
+        else:
+            with tracing.span(
+                    'cache_lookup', filename, mode, len(source)) as span:
+                compiled = self.cache.get(key)
+                span.set_outcome('miss' if compiled is None else 'hit')
+        if compiled is None:
+            result = _compile_restricted_mode(
+                source, filename=filename, mode=mode, policy=self.policy)
+            if result.errors:
+                raise SyntaxError(result.errors[0])
+            compiled = CompiledCode(
+                result.code, free_names(source, filename, mode))
+            self.cache.set(key, compiled)
+        return compiled
+
+    def globals(self, compiled, global_scope, resolvers=None):
+        """Return a copy of `global_scope` with the needed names resolved.
+
+        where:
+
+          compiled -- the `CompiledCode` to be run
+          global_scope -- the globals which are always available, e.g. the
+                          `__builtins__` and the guards
+          resolvers -- a mapping of names to callables without arguments
+                       returning the value of the name
+
+        Only the resolvers of free names of `compiled` which are not already
+        in `global_scope` are called.
+        """
+        result = dict(global_scope)
+        if resolvers:
+            for name in compiled.free_names:
+                if name not in result and name in resolvers:
+                    result[name] = resolvers[name]()
+        return result
+
+    def execute(self, source, global_scope, resolvers=None,
+                filename='<string>'):
+        """Execute `source` and return its global scope."""
+        compiled = self.compile(source, filename, 'exec')
+        scope = self.globals(compiled, global_scope, resolvers)
+        if not tracing.enabled:
+            exec(compiled.code, scope)
+            return scope
+        with tracing.span('execute', filename, 'exec', len(source)):
+            exec(compiled.code, scope)
+        return scope
+
+    def evaluate(self, source, global_scope, resolvers=None,
+                 filename='<string>'):
+        """Evaluate the expression `source` and return its value."""
+        compiled = self.compile(source, filename, 'eval')
+        scope = self.globals(compiled, global_scope, resolvers)
+        if not tracing.enabled:
+            return eval(compiled.code, scope)
+        with tracing.span('execute', filename, 'eval', len(source)):
+            return eval(compiled.code, scope)
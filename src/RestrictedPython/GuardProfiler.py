@@ -0,0 +1,161 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Find the source lines of restricted code spending time in guards.
+
+`GuardProfiler.wrap` replaces the guards (`_getattr_`, `_getiter_`, ...) in
+the globals of restricted code by wrappers counting their calls and time per
+source line. `report` lists the most expensive lines, `dump_json` writes all
+of them for further processing.
+"""
+
+from RestrictedPython.compile import GUARD_NAMES
+from RestrictedPython.tracing import _clock
+
+import json
+import sys
+import threading
+
+
+class GuardProfiler(object):
+    """Count the calls and the time spent in the guards per source line.
+
+    filename ... the filename the restricted code was compiled with (see
+                 `compile_restricted_*`). Guard calls are attributed to the
+                 innermost line of this file on the call stack. If it is
+                 `None`, the line calling the guard is used.
+    enabled ... if false, `wrap` returns the globals unchanged, so there is
+                no cost at all.
+
+    Usage::
+
+        profiler = GuardProfiler(filename='<script>')
+        exec(code, profiler.wrap(global_scope))
+        print(profiler.report())
+
+    The times are cumulative: they contain the time of guards called by a
+    guard. For guards returning iterators (`_getiter_`,
+    `_iter_unpack_sequence_`) only the creation is timed.
+    """
+
+    # Maximal number of frames searched for a line of `filename`.
+    max_depth = 20
+
+    def __init__(self, filename=None, enabled=True):
+        self.filename = filename
+        self.enabled = enabled
+        # Maps `(guard name, filename, lineno)` to `[calls, seconds]`.
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, global_scope):
+        """Return a copy of `global_scope` with profiled guards.
+
+        Guards in a `__builtins__` mapping are profiled, too, the copy of
+        the builtins is a writable `dict`.
+        """
+        if not self.enabled:
+            return global_scope
+        result = self._wrap_mapping(global_scope)
+        builtins = result.get('__builtins__')
+        if hasattr(builtins, 'keys'):
+            result['__builtins__'] = self._wrap_mapping(builtins)
+        return result
+
+    def _wrap_mapping(self, mapping):
+        result = dict(mapping)
+        for name in GUARD_NAMES:
+            if name in result:
+                result[name] = self.profiled(name, result[name])
+        return result
+
+    def profiled(self, name, guard):
+        """Return `guard` wrapped to record its calls under `name`."""
+        stats = self.stats
+        lock = self._lock
+
+        def profiled_guard(*args, **kwargs):
+            if not self.enabled:
+                return guard(*args, **kwargs)
+            filename, lineno = self._caller(sys._getframe(1))
+            start = _clock()
+            try:
+                return guard(*args, **kwargs)
+            finally:
+                elapsed = _clock() - start
+                key = (name, filename, lineno)
+                with lock:
+                    entry = stats.get(key)
+                    if entry is None:
+                        stats[key] = [1, elapsed]
+                    else:
+                        entry[0] += 1
+                        entry[1] += elapsed
+
+        profiled_guard.__name__ = getattr(guard, '__name__', name)
+        profiled_guard.__wrapped__ = guard
+        return profiled_guard
+
+    def _caller(self, frame):
+        if self.filename is not None:
+            candidate = frame
+            for i in range(self.max_depth):
+                if candidate is None:
+                    break
+                if candidate.f_code.co_filename == self.filename:
+                    return self.filename, candidate.f_lineno
+                candidate = candidate.f_back
+        return frame.f_code.co_filename, frame.f_lineno
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+    def dump(self):
+        """Return the stats as list of dicts, sorted by time descending."""
+        with self._lock:
+            items = [
+                {'guard': name, 'filename': filename, 'lineno': lineno,
+                 'calls': calls, 'time': seconds}
+                for (name, filename, lineno), (calls, seconds)
+                in self.stats.items()]
+        items.sort(key=lambda item: (-item['time'], item['guard']))
+        return items
+
+    def dump_json(self, path):
+        """Write the result of `dump` as JSON to the file `path`."""
+        with open(path, 'w') as f:
+            json.dump(self.dump(), f, indent=2)
+
+    def report(self, limit=20):
+        """Return a text report of the guards and of the `limit` most
+        expensive lines.
+        """
+        items = self.dump()
+        totals = {}
+        for item in items:
+            calls, seconds = totals.get(item['guard'], (0, 0.0))
+            totals[item['guard']] = (
+                calls + item['calls'], seconds + item['time'])
+        lines = ['{0:<24} {1:>10} {2:>12}'.format('guard', 'calls', 'ms')]
+        for name, (calls, seconds) in sorted(
+                totals.items(), key=lambda item: -item[1][1]):
+            lines.append('{0:<24} {1:>10} {2:>12.3f}'.format(
+                name, calls, seconds * 1000))
+        lines.append('')
+        lines.append('{0:<32} {1:<24} {2:>10} {3:>12}'.format(
+            'line', 'guard', 'calls', 'ms'))
+        for item in items[:limit]:
+            lines.append('{0:<32} {1:<24} {2:>10} {3:>12.3f}'.format(
+                '{0}:{1}'.format(item['filename'], item['lineno']),
+                item['guard'], item['calls'], item['time'] * 1000))
+        return '\n'.join(lines)
@@ -226,7 +226,7 @@ def _write_wrapper():
 def _full_write_guard():
     # Nested scope abuse!
     # safetypes and Wrapper variables are used by guard()
-    safetypes = {dict, list}
+    safetypes = frozenset([dict, list])
     Wrapper = _write_wrapper()
 
     def guard(ob):
@@ -316,3 +316,101 @@ def guarded_unpack_sequence(it, spec, _getiter_):
 
 
 safe_globals = {'__builtins__': safe_builtins}
+
+
+def freeze_builtins(builtins):
+    """Return a copy of the mapping `builtins` to be shared read-only.
+
+    Restricted code can not reach `__builtins__`, as the name starts with
+    `_`, so the returned mapping can be shared by all executions instead of
+    copying the builtins for each of them. It is an exact `dict` as CPython
+    looks up builtins fastest in one, the host must not change it.
+    """
+    return dict(builtins)
+
+
+class GlobalsFactory(object):
+    """Create the global scopes for executions of restricted code.
+
+    where:
+
+      builtins -- the builtins, they are copied once and shared read-only by
+                  all created global scopes
+      names -- further globals of each scope, e.g. the guards
+
+    Calling the factory returns a new `dict` containing `__builtins__`,
+    `names` and the keyword arguments of the call. So each execution gets its
+    own writable globals without copying the builtins.
+    """
+
+    def __init__(self, builtins=safe_builtins, **names):
+        self.builtins = freeze_builtins(builtins)
+        self.template = dict(names, __builtins__=self.builtins)
+
+    def __call__(self, **names):
+        scope = self.template.copy()
+        scope.update(names)
+        return scope
+
+
+class AwaitGuard(object):
+    """`_await_` guard allowing only awaitables permitted by the host.
+
+    where:
+
+      functions -- coroutine functions whose coroutines may be awaited
+      types -- types of other awaitables which may be awaited, e.g.
+               `asyncio.Future`
+      filenames -- filenames of restricted code (see `compile_restricted_*`)
+                   whose coroutines may be awaited, so scripts can await
+                   their own `async def` functions
+
+    Awaiting anything else raises a TypeError, a rejected coroutine is
+    closed.
+    """
+
+    def __init__(self, functions=(), types=(), filenames=()):
+        self.codes = frozenset(
+            getattr(function, '__code__', None) for function in functions)
+        self.types = tuple(types)
+        self.filenames = frozenset(filenames)
+
+    def __call__(self, ob):
+        code = getattr(ob, 'cr_code', None)
+        if code is not None and (
+                code in self.codes or code.co_filename in self.filenames):
+            return ob
+        if self.types and isinstance(ob, self.types):
+            return ob
+        if code is not None:
+            ob.close()
+        raise TypeError(
+            'Awaiting {0!r} is not allowed.'.format(type(ob).__name__))
+
+
+class AsyncIterGuard(AwaitGuard):
+    """`_getaiter_` guard allowing only asynchronous iterables permitted by
+    the host.
+
+    where:
+
+      functions -- asynchronous generator functions whose generators may be
+                   iterated
+      types -- types of other asynchronous iterables which may be iterated
+      filenames -- filenames of restricted code whose asynchronous
+                   generators may be iterated
+
+    `async for` awaits the steps of the iteration implicitly, they do not
+    pass through `_await_`. So iterating anything else raises a TypeError.
+    """
+
+    def __call__(self, ob):
+        code = getattr(ob, 'ag_code', None)
+        if code is not None and (
+                code in self.codes or code.co_filename in self.filenames):
+            return ob
+        if self.types and isinstance(ob, self.types):
+            return ob
+        raise TypeError(
+            'Iterating {0!r} asynchronously is not allowed.'.format(
+                type(ob).__name__))
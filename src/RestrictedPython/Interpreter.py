@@ -0,0 +1,278 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Evaluate restricted expressions without compiling them.
+
+For an expression which is evaluated only once calling `compile()` costs more
+than the evaluation itself. `ExpressionInterpreter` evaluates the ast of an
+expression after the restricting transformer checked and changed it, so
+`a.b` and `a[b]` call the same `_getattr_` and `_getitem_` guards as the
+compiled code does.
+
+The ast is walked once to build a tree of closures, so all nodes are known to
+be supported before anything is evaluated.
+"""
+
+from ._compat import IS_PY2
+
+import ast
+import operator
+import types
+
+
+if IS_PY2:
+    import __builtin__ as builtins
+else:
+    import builtins
+
+
+def _contains(a, b):
+    return a in b
+
+
+def _not_contains(a, b):
+    return a not in b
+
+
+BINOP_TO_FUNC = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.BitAnd: operator.and_,
+}
+
+if IS_PY2:
+    # Without `from __future__ import division`.
+    BINOP_TO_FUNC[ast.Div] = operator.div
+
+if hasattr(ast, 'MatMult'):
+    BINOP_TO_FUNC[ast.MatMult] = operator.matmul
+
+UNARYOP_TO_FUNC = {
+    ast.Not: operator.not_,
+    ast.Invert: operator.invert,
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+COMPARE_TO_FUNC = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+    ast.In: _contains,
+    ast.NotIn: _not_contains,
+}
+
+
+class NotInterpretable(Exception):
+    """The expression contains a node the interpreter does not support.
+
+    E.g. comprehensions, lambdas and calls with `*args` are left to the
+    compiled code.
+    """
+
+
+def _lookup_builtin(global_scope, name):
+    # Like the compiled code: a missing `__builtins__` means the real ones.
+    builtins_ = global_scope.get('__builtins__', builtins)
+    if isinstance(builtins_, types.ModuleType):
+        builtins_ = builtins_.__dict__
+    try:
+        return builtins_[name]
+    except KeyError:
+        raise NameError("name '{0}' is not defined".format(name))
+
+
+class ExpressionInterpreter(object):
+    """Interpreter for a restricted `ast.Expression`.
+
+    Raises `NotInterpretable` if the expression contains unsupported nodes.
+    Calling the instance with a global scope evaluates the expression.
+    """
+
+    # Maps ast node classes to the `build_*` methods, see below the class.
+    builders = {}
+
+    def __init__(self, tree):
+        self._evaluate = self.build(tree)
+
+    def __call__(self, global_scope):
+        return self._evaluate(global_scope)
+
+    def build(self, node):
+        builder = self.builders.get(node.__class__)
+        if builder is None:
+            raise NotInterpretable(node.__class__.__name__)
+        return builder(self, node)
+
+    def build_all(self, nodes):
+        return [self.build(node) for node in nodes]
+
+    def build_Expression(self, node):
+        return self.build(node.body)
+
+    def build_constant(self, value):
+        return lambda global_scope: value
+
+    def build_Constant(self, node):
+        return self.build_constant(node.value)
+
+    def build_Num(self, node):
+        return self.build_constant(node.n)
+
+    def build_Str(self, node):
+        return self.build_constant(node.s)
+
+    build_Bytes = build_Str
+    build_NameConstant = build_Constant
+
+    def build_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            raise NotInterpretable('assignment')
+        name = node.id
+
+        def evaluate(global_scope):
+            try:
+                return global_scope[name]
+            except KeyError:
+                return _lookup_builtin(global_scope, name)
+        return evaluate
+
+    def build_Tuple(self, node):
+        elts = self.build_all(node.elts)
+        return lambda global_scope: tuple([elt(global_scope) for elt in elts])
+
+    def build_List(self, node):
+        elts = self.build_all(node.elts)
+        return lambda global_scope: [elt(global_scope) for elt in elts]
+
+    def build_Set(self, node):
+        elts = self.build_all(node.elts)
+        return lambda global_scope: set([elt(global_scope) for elt in elts])
+
+    def build_Dict(self, node):
+        if None in node.keys:
+            raise NotInterpretable('dict unpacking')
+        items = list(zip(self.build_all(node.keys),
+                         self.build_all(node.values)))
+
+        def evaluate(global_scope):
+            result = {}
+            for key, value in items:
+                result[key(global_scope)] = value(global_scope)
+            return result
+        return evaluate
+
+    def build_BinOp(self, node):
+        func = BINOP_TO_FUNC.get(type(node.op))
+        if func is None:  # pragma: no cover
+            raise NotInterpretable(node.op.__class__.__name__)
+        left = self.build(node.left)
+        right = self.build(node.right)
+        return lambda global_scope: func(left(global_scope),
+                                         right(global_scope))
+
+    def build_UnaryOp(self, node):
+        func = UNARYOP_TO_FUNC[type(node.op)]
+        operand = self.build(node.operand)
+        return lambda global_scope: func(operand(global_scope))
+
+    def build_BoolOp(self, node):
+        is_and = isinstance(node.op, ast.And)
+        values = self.build_all(node.values)
+
+        def evaluate(global_scope):
+            for value in values:
+                result = value(global_scope)
+                # `and` stops at the first false, `or` at the first true value
+                if bool(result) is not is_and:
+                    break
+            return result
+        return evaluate
+
+    def build_Compare(self, node):
+        first = self.build(node.left)
+        comparisons = list(zip(
+            [COMPARE_TO_FUNC[type(op)] for op in node.ops],
+            self.build_all(node.comparators)))
+
+        def evaluate(global_scope):
+            left = first(global_scope)
+            for func, comparator in comparisons:
+                right = comparator(global_scope)
+                result = func(left, right)
+                if not result:
+                    break
+                left = right
+            return result
+        return evaluate
+
+    def build_IfExp(self, node):
+        test = self.build(node.test)
+        body = self.build(node.body)
+        orelse = self.build(node.orelse)
+
+        def evaluate(global_scope):
+            if test(global_scope):
+                return body(global_scope)
+            return orelse(global_scope)
+        return evaluate
+
+    def build_Call(self, node):
+        if getattr(node, 'starargs', None) or getattr(node, 'kwargs', None):
+            raise NotInterpretable('*args')
+        func = self.build(node.func)
+        args = self.build_all(node.args)
+        keywords = []
+        for keyword in node.keywords:
+            if keyword.arg is None:
+                raise NotInterpretable('**kwargs')
+            keywords.append((keyword.arg, self.build(keyword.value)))
+
+        def evaluate(global_scope):
+            function = func(global_scope)
+            arguments = [arg(global_scope) for arg in args]
+            kwargs = {}
+            for name, value in keywords:
+                kwargs[name] = value(global_scope)
+            return function(*arguments, **kwargs)
+        return evaluate
+
+
+for _name in dir(ExpressionInterpreter):
+    if _name.startswith('build_') and hasattr(ast, _name[len('build_'):]):
+        ExpressionInterpreter.builders[getattr(ast, _name[len('build_'):])] = \
+            getattr(ExpressionInterpreter, _name)
+del _name
+
+
+def interpret(tree, global_scope):
+    """Evaluate the restricted `ast.Expression` `tree` in `global_scope`.
+
+    `tree` has to be checked and transformed by the restricting policy
+    before. Raises `NotInterpretable` before evaluating anything if `tree`
+    contains unsupported nodes.
+    """
+    return ExpressionInterpreter(tree)(global_scope)
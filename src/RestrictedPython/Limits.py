@@ -11,50 +11,272 @@
 #
 ##############################################################################
 
-limited_builtins = {}
-
-
-def limited_range(iFirst, *args):
-    # limited range function from Martijn Pieters
-    RANGELIMIT = 1000
-    if not len(args):
-        iStart, iEnd, iStep = 0, iFirst, 1
-    elif len(args) == 1:
-        iStart, iEnd, iStep = iFirst, args[0], 1
-    elif len(args) == 2:
-        iStart, iEnd, iStep = iFirst, args[0], args[1]
-    else:
-        raise AttributeError('range() requires 1-3 int arguments')
-    if iStep == 0:
-        raise ValueError('zero step for range()')
-    iLen = int((iEnd - iStart) / iStep)
-    if iLen < 0:
-        iLen = 0
-    if iLen >= RANGELIMIT:
+from RestrictedPython._compat import basestring
+from RestrictedPython._compat import IS_PY2
+
+import functools
+import itertools
+import operator
+
+
+if IS_PY2:
+    _integer_types = (int, long)  # NOQA: F821  # Python 2 only built-in
+    _sequence_types = (str, unicode, bytearray, list, tuple)  # NOQA: F821
+else:
+    _integer_types = (int,)
+    _sequence_types = (str, bytes, bytearray, list, tuple)
+
+_string_types = (basestring, bytes, bytearray)
+
+# Operators which are routed through `_binop_guard_` by the
+# `GuardedBinOpTransformer` policy, the in-place ones for augmented
+# assignments.
+_binop_operators = {
+    '*': operator.mul,
+    '**': operator.pow,
+    '<<': operator.lshift,
+    '*=': operator.imul,
+    '**=': operator.ipow,
+    '<<=': operator.ilshift,
+}
+
+
+def _estimated_size(op, left, right):
+    """Cheaply estimate the size of `left <op> right` before computing it.
+
+    Returns a tuple `(kind, size)` where kind is either 'bits' for an integer
+    result or 'elements' for a repeated sequence, or `None` if the size cannot
+    be estimated (e.g. for user defined types).
+    """
+    left_is_int = isinstance(left, _integer_types)
+    right_is_int = isinstance(right, _integer_types)
+    if op == '*':
+        if left_is_int and right_is_int:
+            return 'bits', left.bit_length() + right.bit_length()
+        if right_is_int and isinstance(left, _sequence_types):
+            return 'elements', len(left) * max(right, 0)
+        if left_is_int and isinstance(right, _sequence_types):
+            return 'elements', len(right) * max(left, 0)
+    elif op == '**':
+        if left_is_int and right_is_int and right > 0 and abs(left) > 1:
+            return 'bits', left.bit_length() * right
+    elif op == '<<':
+        if left_is_int and right_is_int and right > 0 and left:
+            return 'bits', left.bit_length() + right
+    return None
+
+
+def make_binop_guard(max_sequence_length=10 ** 6, max_int_bits=10 ** 5):
+    """Create a `_binop_guard_` which rejects memory amplification.
+
+    The guard is called as `_binop_guard_(op, left, right)` for `*`, `**` and
+    `<<` and their augmented assignments `*=`, `**=` and `<<=`. It estimates
+    the size of the result from the operand types and lengths and raises a
+    `ValueError` if it exceeds the budget, before the result is computed.
+    """
+    def guard(op, left, right):
+        operation = _binop_operators[op]
+        if type(left) is float or type(right) is float:
+            # Fast path: float arithmetic overflows instead of growing.
+            return operation(left, right)
+        estimate = _estimated_size(op.rstrip('='), left, right)
+        if estimate is not None:
+            kind, size = estimate
+            if kind == 'bits':
+                limit = max_int_bits
+            else:
+                limit = max_sequence_length
+            if size > limit:
+                raise ValueError(
+                    'To be created result of "{op}" would be to large, '
+                    'in RestrictedPython we only allow {limit} {kind} '
+                    'in such a result.'.format(op=op, limit=limit, kind=kind))
+        return operation(left, right)
+    return guard
+
+
+def _check_length(length, limit, what):
+    if limit is not None and length > limit:
         raise ValueError(
-            'To be created range() object would be to large, '
+            'To be created {what} would be to large, '
             'in RestrictedPython we only allow {limit} '
-            'elements in a range.'.format(limit=str(RANGELIMIT)),
-        )
-    return range(iStart, iEnd, iStep)
+            'elements in a {what}.'.format(what=what, limit=limit))
+
+
+def _take(iterable, limit, what):
+    """Materialize `iterable` but consume at most `limit` + 1 items."""
+    if limit is None:
+        return list(iterable)
+    items = list(itertools.islice(iterable, limit + 1))
+    _check_length(len(items), limit, what)
+    return items
+
+
+class LimitsProfile(object):
+    """Configuration of the limits enforced by `limited_builtins`.
+
+    Each limit is the maximal number of elements (or characters for
+    `str.join`), `None` disables the limit. Create one profile per tenant and
+    use `builtins()` to get the limited builtins for it.
+    """
+
+    def __init__(self,
+                 max_range_length=1000,
+                 max_container_length=None,
+                 max_join_length=None,
+                 max_sorted_length=None,
+                 max_sequence_length=10 ** 6,
+                 max_int_bits=10 ** 5):
+        self.max_range_length = max_range_length
+        self.max_container_length = max_container_length
+        self.max_join_length = max_join_length
+        self.max_sorted_length = max_sorted_length
+        self.max_sequence_length = max_sequence_length
+        self.max_int_bits = max_int_bits
+        self.limited_binop = make_binop_guard(
+            max_sequence_length=max_sequence_length,
+            max_int_bits=max_int_bits)
+
+    def limited_range(self, iFirst, *args):
+        # limited range function from Martijn Pieters
+        if not len(args):
+            iStart, iEnd, iStep = 0, iFirst, 1
+        elif len(args) == 1:
+            iStart, iEnd, iStep = iFirst, args[0], 1
+        elif len(args) == 2:
+            iStart, iEnd, iStep = iFirst, args[0], args[1]
+        else:
+            raise AttributeError('range() requires 1-3 int arguments')
+        if iStep == 0:
+            raise ValueError('zero step for range()')
+        iLen = int((iEnd - iStart) / iStep)
+        if iLen < 0:
+            iLen = 0
+        if self.max_range_length is not None \
+                and iLen >= self.max_range_length:
+            raise ValueError(
+                'To be created range() object would be to large, '
+                'in RestrictedPython we only allow {limit} '
+                'elements in a range.'.format(
+                    limit=str(self.max_range_length)),
+            )
+        return range(iStart, iEnd, iStep)
+
+    def limited_pow(self, base, exp, mod=None):
+        """`pow` rejecting results with more than `max_int_bits` bits like
+        `**` in `_binop_guard_`. With `mod` the result stays below it."""
+        if mod is not None:
+            return pow(base, exp, mod)
+        return self.limited_binop('**', base, exp)
+
+    def limited_list(self, seq):
+        if isinstance(seq, str):
+            raise TypeError('cannot convert string to list')
+        return _take(seq, self.max_container_length, 'list')
+
+    def limited_tuple(self, seq):
+        if isinstance(seq, str):
+            raise TypeError('cannot convert string to tuple')
+        return tuple(_take(seq, self.max_container_length, 'tuple'))
+
+    def limited_set(self, seq=()):
+        return set(_take(seq, self.max_container_length, 'set'))
+
+    def limited_dict(self, *args, **kwargs):
+        limit = self.max_container_length
+        if limit is None:
+            return dict(*args, **kwargs)
+        if len(args) > 1:
+            raise TypeError(
+                'dict expected at most 1 arguments, got {0}'.format(len(args)))
+        items = []
+        if args:
+            seq = args[0]
+            if hasattr(seq, 'keys'):
+                mapping = seq
+                seq = ((key, mapping[key]) for key in mapping.keys())
+            items = _take(seq, limit, 'dict')
+        result = dict(items, **kwargs)
+        _check_length(len(result), limit, 'dict')
+        return result
+
+    def limited_sorted(self, iterable, **kwargs):
+        return sorted(
+            _take(iterable, self.max_sorted_length, 'sorted() input'),
+            **kwargs)
+
+    def limited_pieces(self, separator, iterable):
+        """Return the pieces of `iterable` to be joined with `separator`.
 
+        Raises a `ValueError` as soon as the joined pieces exceed
+        `max_join_length`, so an endless iterable is not consumed.
+        """
+        limit = self.max_join_length
+        if limit is None:
+            return iterable
+        pieces = []
+        size = -len(separator)
+        for piece in iterable:
+            size += len(separator) + len(piece)
+            if size > limit:
+                raise ValueError(
+                    'To be created join() result would be to large, '
+                    'in RestrictedPython we only allow {limit} '
+                    'characters in a join() result.'.format(limit=limit))
+            pieces.append(piece)
+        return pieces
 
-limited_builtins['range'] = limited_range
+    def limited_join(self, separator, iterable):
+        """Join like `separator.join(iterable)` with limited output size."""
+        return separator.join(self.limited_pieces(separator, iterable))
 
+    def wrap_getattr(self, getattr_):
+        """Wrap a `_getattr_` guard to return a limited `str.join`.
 
-def limited_list(seq):
-    if isinstance(seq, str):
-        raise TypeError('cannot convert string to list')
-    return list(seq)
+        Besides the bound method (`'-'.join`) the unbound one (`str.join`)
+        is limited, too.
+        """
+        def guarded_getattr(object, name, *args):
+            attr = getattr_(object, name, *args)
+            if name != 'join' or self.max_join_length is None:
+                return attr
+            if isinstance(object, _string_types):
+                return functools.partial(self.limited_join, object)
+            if isinstance(object, type) and issubclass(object, _string_types):
+                def limited_unbound_join(separator, iterable):
+                    return attr(
+                        separator, self.limited_pieces(separator, iterable))
+                return limited_unbound_join
+            return attr
+        return guarded_getattr
 
+    def builtins(self):
+        """Return a new dict of limited builtins configured by this profile.
 
-limited_builtins['list'] = limited_list
+        `set`, `dict` and `sorted` are only replaced if their limit is set, so
+        by default the real types stay usable e.g. for `isinstance`.
+        """
+        builtins = {
+            'range': self.limited_range,
+            'list': self.limited_list,
+            'tuple': self.limited_tuple,
+            'pow': self.limited_pow,
+            '_binop_guard_': self.limited_binop,
+        }
+        if self.max_container_length is not None:
+            builtins['set'] = self.limited_set
+            builtins['dict'] = self.limited_dict
+        if self.max_sorted_length is not None:
+            builtins['sorted'] = self.limited_sorted
+        return builtins
 
 
-def limited_tuple(seq):
-    if isinstance(seq, str):
-        raise TypeError('cannot convert string to tuple')
-    return tuple(seq)
+default_limits_profile = LimitsProfile()
 
+limited_range = default_limits_profile.limited_range
+limited_list = default_limits_profile.limited_list
+limited_tuple = default_limits_profile.limited_tuple
+limited_binop = default_limits_profile.limited_binop
+limited_pow = default_limits_profile.limited_pow
 
-limited_builtins['tuple'] = limited_tuple
+limited_builtins = default_limits_profile.builtins()
@@ -0,0 +1,173 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Run restricted code in parallel worker interpreters or processes.
+
+The code compiled by `compile_restricted_exec` is sent to the workers
+marshalled. Each worker creates the globals of the scripts with a factory
+given by the host, so no module state is shared between the workers::
+
+    executor = ParallelExecutor('myapp.scripts.make_globals', workers=4)
+    result = compile_restricted_exec('total = sum(values)')
+    future = executor.submit(result, {'values': [1, 2]}, ['total'])
+    future.result()  # {'total': 3}
+    executor.shutdown()
+
+The workers are subinterpreters with their own GIL (PEP 684, PEP 734) if
+the Python version provides `concurrent.futures.InterpreterPoolExecutor`,
+otherwise processes.
+"""
+
+from RestrictedPython.compile import CompileResult
+
+import importlib
+import marshal
+import multiprocessing
+
+
+try:
+    from concurrent.futures import InterpreterPoolExecutor
+except ImportError:
+    InterpreterPoolExecutor = None
+
+
+BACKENDS = ('interpreters', 'processes')
+
+# The globals factory of the current worker, set by `_initialize`.
+_globals_factory = None
+
+
+def _resolve(dotted_name):
+    """Return the object named `module.name`."""
+    module_name, _, name = dotted_name.rpartition('.')
+    try:
+        return getattr(importlib.import_module(module_name), name)
+    except (ImportError, AttributeError, ValueError):
+        raise ValueError('Cannot import {0!r}.'.format(dotted_name))
+
+
+def _initialize(globals_factory):
+    global _globals_factory
+    if not callable(globals_factory):
+        globals_factory = _resolve(globals_factory)
+    _globals_factory = globals_factory
+
+
+def _run(task):
+    """Run one script, it runs in the workers.
+
+    where:
+
+      task -- `(marshalled code, names, result names)`
+
+    Returns the values of the result names after running the code in new
+    globals updated by `names`.
+    """
+    code, names, result_names = task
+    global_scope = _globals_factory()
+    if '__builtins__' not in global_scope:
+        # `exec` would add the unrestricted builtins.
+        raise ValueError(
+            'The globals factory has to provide "__builtins__".')
+    if names:
+        global_scope.update(names)
+    exec(marshal.loads(code), global_scope)
+    return dict((name, global_scope[name]) for name in result_names)
+
+
+def available_backends():
+    """Return the names of the backends usable in this Python."""
+    if InterpreterPoolExecutor is None:
+        return ('processes',)
+    return BACKENDS
+
+
+class _PoolFuture(object):
+    """The part of the `concurrent.futures.Future` API needed for the result
+    of `multiprocessing.Pool.apply_async`."""
+
+    def __init__(self, async_result):
+        self._async_result = async_result
+
+    def done(self):
+        return self._async_result.ready()
+
+    def result(self, timeout=None):
+        return self._async_result.get(timeout)
+
+
+class ParallelExecutor(object):
+    """Run restricted code in a pool of workers.
+
+    where:
+
+      globals_factory -- callable returning new globals for a script, or its
+                         dotted name which is imported in each worker. It has
+                         to be picklable, e.g. a module level function or
+                         `GlobalsFactory`. The globals have to contain the
+                         restricted `__builtins__`, otherwise the scripts are
+                         rejected as `exec` would give them all builtins.
+      workers -- number of workers, by default one per core
+      backend -- 'interpreters' or 'processes', by default the first one of
+                 `available_backends()`
+    """
+
+    def __init__(self, globals_factory, workers=None, backend=None):
+        if backend is None:
+            backend = available_backends()[0]
+        if backend not in available_backends():
+            raise ValueError(
+                'Backend {0!r} is not available, use one of {1}.'.format(
+                    backend, ', '.join(available_backends())))
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.backend = backend
+        self.workers = workers
+        if backend == 'interpreters':
+            self._pool = InterpreterPoolExecutor(
+                workers, initializer=_initialize,
+                initargs=(globals_factory,))
+        else:
+            self._pool = multiprocessing.Pool(
+                workers, _initialize, (globals_factory,))
+
+    def submit(self, code, names=None, result_names=()):
+        """Run `code` in a worker.
+
+        `code` is a code object or the `CompileResult` of
+        `compile_restricted_exec`, `names` are added to the globals of the
+        script. Returns a future whose `result()` is a dict of the values of
+        `result_names` after the script ran, or raises the exception of the
+        script. The values have to be picklable.
+        """
+        if isinstance(code, CompileResult):
+            if code.errors:
+                raise SyntaxError(code.errors[0])
+            code = code.code
+        task = (marshal.dumps(code), names, tuple(result_names))
+        if self.backend == 'interpreters':
+            return self._pool.submit(_run, task)
+        return _PoolFuture(self._pool.apply_async(_run, (task,)))
+
+    def shutdown(self):
+        """Stop the workers after the submitted scripts finished."""
+        if self.backend == 'interpreters':
+            self._pool.shutdown(wait=True)
+        else:
+            self._pool.close()
+            self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
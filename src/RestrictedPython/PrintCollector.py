@@ -11,25 +11,52 @@
 #
 ##############################################################################
 from __future__ import print_function
+from RestrictedPython._compat import IS_PY3
 
 
 class PrintCollector(object):
-    """Collect written text, and return it when called."""
+    """Collect written text, and return it when called.
 
-    def __init__(self, _getattr_=None):
+    max_size ... maximal number of characters which may be written, writing
+                 more raises a `ValueError`. `None` means no limit.
+    sink ... optional file-like object (having a `write` method) or callable
+             the written text is forwarded to instead of collecting it.
+
+    Use `functools.partial(PrintCollector, max_size=..., sink=...)` as
+    `_print_` to configure these options.
+    """
+
+    def __init__(self, _getattr_=None, max_size=None, sink=None):
         self.txt = []
         self._getattr_ = _getattr_
+        self.max_size = max_size
+        self.size = 0
+        if sink is not None and hasattr(sink, 'write'):
+            sink = sink.write
+        self.sink = sink
 
     def write(self, text):
-        self.txt.append(text)
+        self.size += len(text)
+        if self.max_size is not None and self.size > self.max_size:
+            raise ValueError(
+                'Printed output would be to large, in RestrictedPython we '
+                'only allow {limit} characters to be printed.'.format(
+                    limit=self.max_size))
+        if self.sink is None:
+            self.txt.append(text)
+        else:
+            self.sink(text)
 
     def __call__(self):
         return ''.join(self.txt)
 
-    def _call_print(self, *objects, **kwargs):
-        if kwargs.get('file', None) is None:
-            kwargs['file'] = self
-        else:
-            self._getattr_(kwargs['file'], 'write')
+    if IS_PY3:
+        from RestrictedPython._print_function import _call_print
+    else:  # pragma: no cover
+        def _call_print(self, *objects, **kwargs):
+            if kwargs.get('file', None) is None:
+                kwargs['file'] = self
+            else:
+                self._getattr_(kwargs['file'], 'write')
 
-        print(*objects, **kwargs)
+            print(*objects, **kwargs)
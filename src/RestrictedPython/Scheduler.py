@@ -0,0 +1,118 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Run many restricted scripts interleaved in one thread.
+
+The scripts have to be compiled with the `CheckpointTransformer` policy,
+which turns them into generators yielding at the start of each loop
+iteration. The `Scheduler` runs them round-robin, each one until its time
+slice is used up, so long running scripts do not block the others::
+
+    scheduler = Scheduler(time_slice=0.005, max_in_flight=100)
+    for source, global_scope in scripts:
+        code = compile_restricted_exec(
+            source, policy=CheckpointTransformer).code
+        scheduler.add(code, global_scope)
+    scheduler.run()
+
+Scripts are only interrupted at the checkpoints: a single long running
+statement or a loop in a function defined by the script is not interrupted.
+"""
+
+from RestrictedPython.tracing import _clock
+from RestrictedPython.transformer import CHECKPOINT_FUNCTION_NAME
+
+import collections
+
+
+class Task(object):
+    """A script run by the `Scheduler`.
+
+    where:
+
+      global_scope -- the globals the script runs in
+      done -- whether the script has finished
+      exception -- the exception raised by the script or `None`
+      checkpoints -- the number of checkpoints the script passed so far
+    """
+
+    done = False
+    exception = None
+    checkpoints = 0
+
+    def __init__(self, generator, global_scope, name=None):
+        self.generator = generator
+        self.global_scope = global_scope
+        self.name = name
+
+    def __repr__(self):
+        return '<Task {0!r} done={1}>'.format(self.name, self.done)
+
+
+class Scheduler(object):
+    """Round-robin scheduler of scripts compiled by `CheckpointTransformer`.
+
+    where:
+
+      time_slice -- seconds a script runs before the next one gets its turn,
+                    it is checked at the checkpoints only
+      max_in_flight -- maximal number of started but unfinished scripts, the
+                       others wait until a script finishes. `None` means no
+                       limit.
+    """
+
+    def __init__(self, time_slice=0.001, max_in_flight=None):
+        self.time_slice = time_slice
+        self.max_in_flight = max_in_flight
+        self.waiting = collections.deque()
+        self.running = collections.deque()
+
+    def add(self, code, global_scope, name=None):
+        """Add the script `code` to be run in `global_scope`.
+
+        Returns the `Task` of the script. The module level code of the script
+        does not run before `run` is called.
+        """
+        exec(code, global_scope)
+        function = global_scope.pop(CHECKPOINT_FUNCTION_NAME)
+        task = Task(function(), global_scope, name)
+        self.waiting.append(task)
+        return task
+
+    def run(self):
+        """Run the scripts until all of them are done."""
+        while self.waiting or self.running:
+            while self.waiting and (
+                    self.max_in_flight is None
+                    or len(self.running) < self.max_in_flight):
+                self.running.append(self.waiting.popleft())
+            task = self.running.popleft()
+            if not self.step(task):
+                self.running.append(task)
+
+    def step(self, task):
+        """Run `task` for a time slice, return whether it is done."""
+        generator = task.generator
+        deadline = _clock() + self.time_slice
+        try:
+            while True:
+                next(generator)
+                task.checkpoints += 1
+                if _clock() >= deadline:
+                    return False
+        except StopIteration:
+            pass
+        except Exception as e:
+            task.exception = e
+        task.done = True
+        task.generator = None
+        return True
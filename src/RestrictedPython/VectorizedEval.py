@@ -0,0 +1,490 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Vectorized evaluation of restricted expressions over columns.
+
+If NumPy is installed, arithmetic expressions are evaluated once over whole
+columns instead of once per row. Every construct which could give a different
+result than evaluating row by row (integer overflow, division by zero, ...)
+makes the evaluation fall back to the row by row path.
+"""
+
+from ._compat import IS_PY2
+from .Eval import RestrictionCapableEval
+
+import ast
+import math
+
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+if IS_PY2:
+    import __builtin__ as builtins
+    _integer_types = (int, long)  # NOQA: F821  # Python 2 only built-in
+else:
+    import builtins
+    _integer_types = (int,)
+
+INT64_MAX = 2 ** 63 - 1
+# Integers up to this magnitude are converted to float without rounding.
+FLOAT_EXACT_INT_MAX = 2 ** 53
+
+
+class _NotVectorizable(Exception):
+    """The expression can not be evaluated vectorized with exact results."""
+
+
+class _Object(object):
+    """A value which is not a column, e.g. a module or a function."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _Vector(object):
+    """A column of numbers, `kind` is 'b' (bool), 'i' (int) or 'f' (float).
+
+    For integers the bounds of the values are tracked to detect overflows of
+    the int64 arithmetic before they happen.
+    """
+
+    def __init__(self, array, kind, bounds=None):
+        self.array = array
+        self.kind = kind
+        if kind == 'i' and bounds is None:
+            bounds = (int(array.min()), int(array.max()))
+        self.bounds = bounds
+
+    def as_int(self):
+        if self.kind == 'b':
+            return _Vector(self.array.astype(numpy.int64), 'i', (0, 1))
+        return self
+
+    def as_float(self):
+        if self.kind == 'f':
+            return self
+        return _Vector(self.array.astype(numpy.float64), 'f')
+
+    def truth(self):
+        if self.kind == 'b':
+            return self.array
+        return self.array != 0
+
+    def max_abs(self):
+        low, high = self.bounds
+        return max(abs(low), abs(high))
+
+
+def _check_bounds(low, high):
+    if low < -INT64_MAX or high > INT64_MAX:
+        raise _NotVectorizable('int64 overflow')
+    return low, high
+
+
+def _check_exact_float(vector):
+    if vector.kind == 'i' and vector.max_abs() > FLOAT_EXACT_INT_MAX:
+        raise _NotVectorizable('int can not be converted exactly to float')
+
+
+def _check_no_zero(vector):
+    if numpy.any(vector.array == 0):
+        raise _NotVectorizable('division by zero')
+
+
+def _vector_from_value(value):
+    """Convert a scalar or a column to a `_Vector`."""
+    if isinstance(value, bool):
+        return _Vector(numpy.array(value), 'b')
+    if isinstance(value, _integer_types):
+        _check_bounds(value, value)
+        return _Vector(numpy.array(value, dtype=numpy.int64), 'i')
+    if isinstance(value, float):
+        return _Vector(numpy.array(value, dtype=numpy.float64), 'f')
+    if not isinstance(value, (numpy.ndarray, numpy.generic)):
+        if not isinstance(value, (list, tuple)):
+            raise _NotVectorizable('unsupported value')
+        # Array-likes must not mix types, e.g. int and float, as NumPy would
+        # convert them to a common type.
+        if len(set(type(item) for item in value)) > 1:
+            raise _NotVectorizable('mixed types')
+    array = numpy.asarray(value)
+    if array.ndim > 1:
+        raise _NotVectorizable('not a column')
+    kind = array.dtype.kind
+    if kind == 'b':
+        return _Vector(array, 'b')
+    if kind in 'iu':
+        if array.size and kind == 'u' and int(array.max()) > INT64_MAX:
+            raise _NotVectorizable('uint64 overflow')
+        return _Vector(array.astype(numpy.int64), 'i')
+    if kind == 'f' and array.dtype.itemsize <= 8:
+        # float16 and float32 are converted exactly to float64.
+        return _Vector(array.astype(numpy.float64), 'f')
+    raise _NotVectorizable('unsupported dtype')
+
+
+def _int_binop(op, left, right):
+    (l_low, l_high), (r_low, r_high) = left.bounds, right.bounds
+    if op in ('+', '-', '*'):
+        if op == '+':
+            bounds = (l_low + r_low, l_high + r_high)
+        elif op == '-':
+            bounds = (l_low - r_high, l_high - r_low)
+        else:
+            corners = [a * b for a in (l_low, l_high) for b in (r_low, r_high)]
+            bounds = (min(corners), max(corners))
+        _check_bounds(*bounds)
+        func = {'+': numpy.add, '-': numpy.subtract, '*': numpy.multiply}[op]
+        return _Vector(func(left.array, right.array), 'i', bounds)
+    if op == '/':
+        _check_exact_float(left)
+        _check_exact_float(right)
+        _check_no_zero(right)
+        return _Vector(
+            numpy.true_divide(left.as_float().array, right.as_float().array),
+            'f')
+    if op in ('//', '%'):
+        _check_no_zero(right)
+        if op == '//':
+            limit = left.max_abs() + 1
+            result = numpy.floor_divide(left.array, right.array)
+        else:
+            limit = right.max_abs()
+            result = numpy.remainder(left.array, right.array)
+        return _Vector(result, 'i', _check_bounds(-limit, limit))
+    # op == '**'
+    if r_low < 0:
+        raise _NotVectorizable('negative integer exponent')
+    base = left.max_abs()
+    if base <= 1:
+        limit = 1
+    elif r_high * base.bit_length() > 63:
+        raise _NotVectorizable('int64 overflow')
+    else:
+        limit = base ** r_high
+    return _Vector(
+        numpy.power(left.array, right.array), 'i',
+        _check_bounds(-limit, limit))
+
+
+def _float_binop(op, left, right):
+    left, right = left.as_float(), right.as_float()
+    a, b = left.array, right.array
+    if op in ('/', '//', '%'):
+        _check_no_zero(right)
+    if op == '**':
+        if numpy.any((a < 0) & (b != numpy.floor(b))):
+            raise _NotVectorizable('complex result')
+        if numpy.any((a == 0) & (b < 0)):
+            raise _NotVectorizable('division by zero')
+    func = {
+        '+': numpy.add,
+        '-': numpy.subtract,
+        '*': numpy.multiply,
+        '/': numpy.true_divide,
+        '//': numpy.floor_divide,
+        '%': numpy.remainder,
+        '**': numpy.power,
+    }[op]
+    result = func(a, b)
+    if op == '**' and numpy.any(
+            numpy.isinf(result) & numpy.isfinite(a) & numpy.isfinite(b)):
+        # Python raises an OverflowError.
+        raise _NotVectorizable('float overflow')
+    return _Vector(result, 'f')
+
+
+def _vector_abs(vector):
+    if vector.kind == 'f':
+        return _Vector(numpy.abs(vector.array), 'f')
+    vector = vector.as_int()
+    limit = vector.max_abs()
+    return _Vector(numpy.abs(vector.array), 'i', _check_bounds(0, limit))
+
+
+def _vector_fabs(vector):
+    return _Vector(numpy.abs(vector.as_float().array), 'f')
+
+
+def _vector_sqrt(vector):
+    vector = vector.as_float()
+    if numpy.any(vector.array < 0):
+        # Python raises a ValueError.
+        raise _NotVectorizable('math domain error')
+    return _Vector(numpy.sqrt(vector.array), 'f')
+
+
+# Functions which can be called in vectorized expressions. The NumPy
+# implementations return exactly the same results as the Python ones.
+VECTORIZED_FUNCTIONS = (
+    (builtins.abs, _vector_abs),
+    (math.fabs, _vector_fabs),
+    (math.sqrt, _vector_sqrt),
+)
+
+BINOP_TO_STR = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Div: '/',
+    ast.FloorDiv: '//',
+    ast.Mod: '%',
+    ast.Pow: '**',
+}
+
+COMPARE_TO_FUNC = {
+    ast.Eq: 'equal',
+    ast.NotEq: 'not_equal',
+    ast.Lt: 'less',
+    ast.LtE: 'less_equal',
+    ast.Gt: 'greater',
+    ast.GtE: 'greater_equal',
+}
+
+
+class _VectorEvaluator(object):
+    """Evaluate a restricted expression ast over `_Vector` columns."""
+
+    def __init__(self, global_scope, columns):
+        self.global_scope = global_scope
+        self.columns = columns
+
+    def evaluate(self, node):
+        method = getattr(self, 'eval_' + node.__class__.__name__, None)
+        if method is None:
+            raise _NotVectorizable(node.__class__.__name__)
+        return method(node)
+
+    def vector(self, node):
+        value = self.evaluate(node)
+        if not isinstance(value, _Vector):
+            raise _NotVectorizable('not a number')
+        return value
+
+    def eval_Expression(self, node):
+        return self.vector(node.body)
+
+    def eval_constant(self, value):
+        if isinstance(value, str):
+            return _Object(value)
+        return _vector_from_value(value)
+
+    def eval_Constant(self, node):
+        return self.eval_constant(node.value)
+
+    def eval_Num(self, node):
+        return self.eval_constant(node.n)
+
+    def eval_Str(self, node):
+        return self.eval_constant(node.s)
+
+    def eval_NameConstant(self, node):
+        return self.eval_constant(node.value)
+
+    def eval_Name(self, node):
+        name = node.id
+        if name in self.global_scope:
+            return _Object(self.global_scope[name])
+        if name in self.columns:
+            return _vector_from_value(self.columns[name])
+        builtins_ = self.global_scope.get('__builtins__')
+        if isinstance(builtins_, dict) and name in builtins_:
+            return _Object(builtins_[name])
+        if hasattr(builtins_, name) and not isinstance(builtins_, dict):
+            return _Object(getattr(builtins_, name))
+        raise _NotVectorizable('unknown name')
+
+    def eval_Call(self, node):
+        if node.keywords or getattr(node, 'starargs', None) \
+                or getattr(node, 'kwargs', None):
+            raise _NotVectorizable('keyword arguments')
+        func = self.evaluate(node.func)
+        if not isinstance(func, _Object):
+            raise _NotVectorizable('not callable')
+        args = [self.evaluate(arg) for arg in node.args]
+        if func.value is self.global_scope.get('_getattr_'):
+            # `a.b` became `_getattr_(a, 'b')`, the guard decides.
+            if not all(isinstance(arg, _Object) for arg in args):
+                raise _NotVectorizable('attribute of a column')
+            return _Object(func.value(*[arg.value for arg in args]))
+        for candidate, implementation in VECTORIZED_FUNCTIONS:
+            if func.value is candidate:
+                if len(args) != 1 or not isinstance(args[0], _Vector):
+                    raise _NotVectorizable('unsupported arguments')
+                return implementation(args[0])
+        raise _NotVectorizable('function is not vectorizable')
+
+    def eval_BinOp(self, node):
+        op = BINOP_TO_STR.get(type(node.op))
+        if op is None:
+            raise _NotVectorizable(node.op.__class__.__name__)
+        left = self.vector(node.left)
+        right = self.vector(node.right)
+        if left.kind != 'f' and right.kind != 'f':
+            return _int_binop(op, left.as_int(), right.as_int())
+        return _float_binop(op, left, right)
+
+    def eval_UnaryOp(self, node):
+        operand = self.vector(node.operand)
+        if isinstance(node.op, ast.Not):
+            return _Vector(numpy.logical_not(operand.truth()), 'b')
+        if not isinstance(node.op, (ast.UAdd, ast.USub)):
+            raise _NotVectorizable(node.op.__class__.__name__)
+        if operand.kind != 'f':
+            operand = operand.as_int()
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        bounds = None
+        if operand.kind == 'i':
+            low, high = operand.bounds
+            bounds = _check_bounds(-high, -low)
+        return _Vector(numpy.negative(operand.array), operand.kind, bounds)
+
+    def eval_BoolOp(self, node):
+        values = [self.vector(value) for value in node.values]
+        kinds = set(value.kind for value in values)
+        if len(kinds) > 1:
+            # Python would return values of different types per row.
+            raise _NotVectorizable('mixed types')
+        result = values[-1]
+        for value in reversed(values[:-1]):
+            if isinstance(node.op, ast.And):
+                array = numpy.where(value.truth(), result.array, value.array)
+            else:
+                array = numpy.where(value.truth(), value.array, result.array)
+            bounds = None
+            if value.kind == 'i':
+                bounds = (min(value.bounds[0], result.bounds[0]),
+                          max(value.bounds[1], result.bounds[1]))
+            result = _Vector(array, value.kind, bounds)
+        return result
+
+    def eval_Compare(self, node):
+        left = self.vector(node.left)
+        result = None
+        for op, comparator in zip(node.ops, node.comparators):
+            func = COMPARE_TO_FUNC.get(type(op))
+            if func is None:
+                raise _NotVectorizable(op.__class__.__name__)
+            right = self.vector(comparator)
+            a, b = left, right
+            if 'f' in (a.kind, b.kind):
+                # Python compares int and float exactly.
+                _check_exact_float(a)
+                _check_exact_float(b)
+                a, b = a.as_float(), b.as_float()
+            elif 'i' in (a.kind, b.kind):
+                a, b = a.as_int(), b.as_int()
+            compared = getattr(numpy, func)(a.array, b.array)
+            if result is None:
+                result = compared
+            else:
+                result = numpy.logical_and(result, compared)
+            left = right
+        return _Vector(result, 'b')
+
+
+def _column_values(value, length):
+    """Return the Python values of a column or repeat a scalar."""
+    if not _is_column(value):
+        if hasattr(value, 'tolist'):
+            value = value.tolist()
+        return [value] * length
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return list(value)
+
+
+def _is_column(value):
+    if isinstance(value, (str, bytes)):
+        return False
+    return getattr(value, 'ndim', 1) > 0 and hasattr(value, '__len__')
+
+
+class VectorizedEval(RestrictionCapableEval):
+    """A restricted expression which can be evaluated over columns.
+
+    `eval_columns` evaluates the expression over NumPy arrays (or other
+    array-likes) if the restricted expression only uses arithmetic,
+    comparisons, boolean operations and the functions in
+    `VECTORIZED_FUNCTIONS`. Otherwise, or if NumPy is not installed or a
+    vectorized evaluation could give a different result, it falls back to the
+    evaluation row by row.
+    """
+
+    # Was the last call of `eval_columns` vectorized?
+    vectorized = None
+    # The ast checked by the policy, see `_restricted_tree`.
+    _vectorized_tree = None
+
+    def eval_columns(self, columns):
+        """Evaluate the expression for each row of `columns`.
+
+        where:
+
+          columns -- a mapping of names to equally long columns, a value which
+                     is not a sequence is used for every row.
+
+        Returns the list of results.
+        """
+        self.prepRestrictedCode()
+
+        lengths = set(
+            len(value) for name, value in columns.items()
+            if name in self.used and _is_column(value))
+        if len(lengths) > 1:
+            raise ValueError('All columns must have the same length.')
+        length = lengths.pop() if lengths else 1
+
+        if numpy is not None and length:
+            try:
+                results = self._eval_vectorized(columns, length)
+            except _NotVectorizable:
+                pass
+            else:
+                self.vectorized = True
+                return results
+
+        self.vectorized = False
+        names = [name for name in self.used if name in columns]
+        values = [_column_values(columns[name], length) for name in names]
+        rows = (dict(zip(names, row)) for row in zip(*values))
+        if not names:
+            rows = ({} for i in range(length))
+        return list(self.eval_many(rows))
+
+    def _restricted_tree(self):
+        """Return the ast of the expression checked by the policy.
+
+        It is computed on the first call and kept on the instance.
+        """
+        tree = self._vectorized_tree
+        if tree is None:
+            tree = ast.parse(self.expr, '<string>', 'eval')
+            errors = []
+            self.policy(errors, [], {}).visit(tree)
+            if errors:  # pragma: no cover
+                # `prepRestrictedCode` already raised the SyntaxError.
+                raise _NotVectorizable('restricted')
+            self._vectorized_tree = tree
+        return tree
+
+    def _eval_vectorized(self, columns, length):
+        tree = self._restricted_tree()
+        evaluator = _VectorEvaluator(self._global_scope(), columns)
+        with numpy.errstate(all='ignore'):
+            result = evaluator.evaluate(tree)
+        return numpy.broadcast_to(result.array, (length,)).tolist()
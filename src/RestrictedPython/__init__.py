@@ -22,21 +22,79 @@
 from RestrictedPython.compile import compile_restricted  # isort:skip
 from RestrictedPython.compile import compile_restricted_eval  # isort:skip
 from RestrictedPython.compile import compile_restricted_exec  # isort:skip
+from RestrictedPython.compile import (  # isort:skip
+    compile_restricted_expressions)
 from RestrictedPython.compile import compile_restricted_function  # isort:skip
 from RestrictedPython.compile import compile_restricted_single  # isort:skip
 
-# predefined builtins
-from RestrictedPython.Guards import safe_builtins  # isort:skip
-from RestrictedPython.Guards import safe_globals  # isort:skip
-from RestrictedPython.Limits import limited_builtins  # isort:skip
-from RestrictedPython.Utilities import utility_builtins  # isort:skip
-
 # Helper Methods
 from RestrictedPython.PrintCollector import PrintCollector  # isort:skip
+from RestrictedPython.compile import CompiledExpressions  # isort:skip
 from RestrictedPython.compile import CompileResult  # isort:skip
+from RestrictedPython.compile import CompileStats  # isort:skip
 
 # Policy
 from RestrictedPython.transformer import RestrictingNodeTransformer  # isort:skip
+from RestrictedPython.transformer import GuardedBinOpTransformer  # isort:skip
+from RestrictedPython.transformer import CheckpointTransformer  # isort:skip
+from RestrictedPython.transformer import AsyncTransformer  # isort:skip
 
-#
-from RestrictedPython.Eval import RestrictionCapableEval
+from RestrictedPython._compat import IS_PY37_OR_GREATER  # isort:skip
+
+# The names below are imported on first access (PEP 562) to keep the import
+# of RestrictedPython cheap, e.g. `Utilities` imports `DateTime` if it is
+# installed.
+_lazy_names = {
+    # predefined builtins
+    'safe_builtins': 'RestrictedPython.Guards',
+    'safe_globals': 'RestrictedPython.Guards',
+    'freeze_builtins': 'RestrictedPython.Guards',
+    'GlobalsFactory': 'RestrictedPython.Guards',
+    'limited_builtins': 'RestrictedPython.Limits',
+    'LimitsProfile': 'RestrictedPython.Limits',
+    'utility_builtins': 'RestrictedPython.Utilities',
+    #
+    'RestrictionCapableEval': 'RestrictedPython.Eval',
+}
+
+__all__ = [
+    'compile_restricted',
+    'compile_restricted_eval',
+    'compile_restricted_exec',
+    'compile_restricted_expressions',
+    'compile_restricted_function',
+    'compile_restricted_single',
+    'PrintCollector',
+    'CompiledExpressions',
+    'CompileResult',
+    'CompileStats',
+    'RestrictingNodeTransformer',
+    'GuardedBinOpTransformer',
+    'CheckpointTransformer',
+    'AsyncTransformer',
+] + sorted(_lazy_names)
+
+if IS_PY37_OR_GREATER:
+    import importlib as _importlib  # isort:skip
+
+    def __getattr__(name):
+        try:
+            module_name = _lazy_names[name]
+        except KeyError:
+            raise AttributeError(
+                'module {0!r} has no attribute {1!r}'.format(__name__, name))
+        value = getattr(_importlib.import_module(module_name), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_lazy_names))
+else:  # pragma: no cover
+    from RestrictedPython.Guards import safe_builtins  # isort:skip
+    from RestrictedPython.Guards import safe_globals  # isort:skip
+    from RestrictedPython.Guards import freeze_builtins  # isort:skip
+    from RestrictedPython.Guards import GlobalsFactory  # isort:skip
+    from RestrictedPython.Limits import limited_builtins  # isort:skip
+    from RestrictedPython.Limits import LimitsProfile  # isort:skip
+    from RestrictedPython.Utilities import utility_builtins  # isort:skip
+    from RestrictedPython.Eval import RestrictionCapableEval  # isort:skip
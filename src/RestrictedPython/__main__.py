@@ -0,0 +1,222 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Precompile a tree of restricted scripts into a bundle.
+
+Usage::
+
+    $ python -m RestrictedPython --output scripts.bundle scripts/
+    $ python -m RestrictedPython --output scripts.bundle --manifest list.txt
+
+All scripts are compiled in parallel and all errors and warnings are reported
+at the end. The bundle (see `RestrictedPython.Bundle`) is only written if no
+script was rejected, otherwise the exit code is 1.
+"""
+
+from RestrictedPython.Bundle import BundleWriter
+from RestrictedPython.Bundle import policy_fingerprint
+from RestrictedPython.compile import _compile_restricted_mode
+from RestrictedPython.transformer import RestrictingNodeTransformer
+
+import argparse
+import fnmatch
+import importlib
+import io
+import marshal
+import multiprocessing
+import os
+import sys
+
+
+def find_scripts(directory, pattern='*.py'):
+    """Return `(script id, path)` of the files below `directory` matching
+    `pattern`.
+
+    The script id is the path relative to `directory` with `/` as separator.
+    """
+    result = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(fnmatch.filter(filenames, pattern)):
+            path = os.path.join(dirpath, filename)
+            script_id = os.path.relpath(path, directory).replace(os.sep, '/')
+            result.append((script_id, path))
+    return result
+
+
+def read_manifest(path):
+    """Return `(script id, path)` of the files listed in the manifest.
+
+    The manifest lists one path relative to its own directory per line,
+    which is also the script id. Empty lines and lines starting with `#` are
+    skipped.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    result = []
+    with io.open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                result.append((line, os.path.join(base, line)))
+    return result
+
+
+def resolve_policy(dotted_name):
+    """Return the policy class named `module.Class`."""
+    module_name, _, name = dotted_name.rpartition('.')
+    try:
+        policy = getattr(importlib.import_module(module_name), name)
+    except (ImportError, AttributeError, ValueError):
+        raise ValueError('Cannot import policy {0!r}.'.format(dotted_name))
+    if not (isinstance(policy, type)
+            and issubclass(policy, RestrictingNodeTransformer)):
+        raise ValueError(
+            '{0!r} is not a RestrictingNodeTransformer.'.format(dotted_name))
+    return policy
+
+
+def compile_script(task):
+    """Compile one script, it runs in the worker processes.
+
+    where:
+
+      task -- `(script id, path, mode, policy)`
+
+    Returns `(script id, source, errors, warnings, used names, code)` with
+    the code marshalled as code objects can not be pickled. `source` is
+    `None` if the file could not be read. Exceptions raised while compiling
+    are reported as errors.
+    """
+    script_id, path, mode, policy = task
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            source = f.read()
+    except (IOError, UnicodeDecodeError) as e:
+        return script_id, None, (str(e),), [], (), None
+    try:
+        result = _compile_restricted_mode(
+            source, filename=script_id, mode=mode, policy=policy)
+        code = None if result.code is None else marshal.dumps(result.code)
+    except Exception as e:
+        # e.g. a RecursionError for too deeply nested code
+        return (script_id, source,
+                ('{0}: {1}'.format(e.__class__.__name__, e),), [], (), None)
+    return (script_id, source, result.errors, result.warnings,
+            tuple(result.used_names), code)
+
+
+def compile_scripts(scripts, mode='exec', policy=RestrictingNodeTransformer,
+                    jobs=None):
+    """Compile the `(script id, path)` pairs in `scripts` with `jobs`
+    processes, by default one per core.
+
+    Yields the results of `compile_script` in the order of `scripts`.
+    """
+    tasks = [(script_id, path, mode, policy) for script_id, path in scripts]
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield compile_script(task)
+        return
+    pool = multiprocessing.Pool(jobs)
+    try:
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        for item in pool.imap(compile_script, tasks, chunksize):
+            yield item
+    finally:
+        pool.close()
+        pool.join()
+
+
+def precompile(scripts, output, mode='exec',
+               policy=RestrictingNodeTransformer, jobs=None,
+               stream=None):
+    """Compile `scripts` into the bundle `output`.
+
+    Errors and warnings are written to `stream`, by default `sys.stderr`.
+    Returns the number of rejected scripts, the bundle is only written if it
+    is 0.
+    """
+    if stream is None:
+        stream = sys.stderr
+    fingerprint = policy_fingerprint(policy)
+    rejected = warned = 0
+    with BundleWriter(output) as writer:
+        for (script_id, source, errors, warnings, used_names,
+             code) in compile_scripts(scripts, mode, policy, jobs):
+            for warning in warnings:
+                warned += 1
+                stream.write('{0}: warning: {1}\n'.format(script_id, warning))
+            if errors:
+                rejected += 1
+                for error in errors:
+                    stream.write('{0}: {1}\n'.format(script_id, error))
+            elif not rejected:
+                # Once a script is rejected the bundle is not written, but
+                # the others are still compiled to report all errors.
+                writer.add_code(
+                    script_id, source, marshal.loads(code), used_names,
+                    tuple(warnings), mode, script_id, fingerprint)
+        if rejected:
+            writer.abort()
+    stream.write(
+        '{0} scripts, {1} rejected, {2} warnings.\n'.format(
+            len(scripts), rejected, warned))
+    return rejected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m RestrictedPython',
+        description='Precompile restricted scripts into a bundle.')
+    parser.add_argument(
+        'directory', nargs='?',
+        help='directory containing the scripts')
+    parser.add_argument(
+        '--manifest',
+        help='file listing the script paths, one per line')
+    parser.add_argument(
+        '--pattern', default='*.py',
+        help='file name pattern of the scripts in the directory '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '-o', '--output', required=True,
+        help='path of the bundle to write')
+    parser.add_argument(
+        '--mode', default='exec', choices=['exec', 'eval'],
+        help='compile mode (default: %(default)s)')
+    parser.add_argument(
+        '--policy',
+        default='RestrictedPython.transformer.RestrictingNodeTransformer',
+        help='dotted name of the policy class (default: %(default)s)')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='number of processes (default: number of cores)')
+    args = parser.parse_args(argv)
+    if (args.directory is None) == (args.manifest is None):
+        parser.error('Give either a directory or a manifest.')
+    try:
+        policy = resolve_policy(args.policy)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.manifest:
+        scripts = read_manifest(args.manifest)
+    else:
+        scripts = find_scripts(args.directory, args.pattern)
+    rejected = precompile(
+        scripts, args.output, args.mode, policy, args.jobs)
+    return 1 if rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,3 @@
-import platform
 import sys
 
 
@@ -16,4 +15,9 @@ if IS_PY2:
 else:
     basestring = str
 
-IS_CPYTHON = platform.python_implementation() == 'CPython'
+if IS_PY2:
+    import platform
+    IS_CPYTHON = platform.python_implementation() == 'CPython'
+else:
+    # Importing `platform` is expensive, it is only used on Python 2.
+    IS_CPYTHON = sys.implementation.name == 'cpython'
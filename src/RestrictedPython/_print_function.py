@@ -0,0 +1,31 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""`PrintCollector._call_print` for Python 3.
+
+It is in its own module as its keyword-only parameters are no Python 2
+syntax. They keep CPython from creating a dict of keyword arguments for
+each call like `**kwargs` does.
+"""
+
+
+def _call_print(self, *objects, sep=' ', end='\n', file=None, flush=False):
+    if file is None:
+        if sep == ' ' and end == '\n':
+            # Fast path for the common `print(...)` call.
+            self.write(' '.join([str(ob) for ob in objects]) + '\n')
+            return
+        file = self
+    else:
+        self._getattr_(file, 'write')
+
+    print(*objects, sep=sep, end=end, file=file, flush=flush)
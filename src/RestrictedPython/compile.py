@@ -1,14 +1,56 @@
 from collections import namedtuple
+from RestrictedPython import tracing
 from RestrictedPython._compat import IS_CPYTHON
 from RestrictedPython._compat import IS_PY2
+from RestrictedPython.tracing import _clock
 from RestrictedPython.transformer import RestrictingNodeTransformer
 
 import ast
+import bisect
 import warnings
 
 
-CompileResult = namedtuple(
-    'CompileResult', 'code, errors, warnings, used_names')
+_CompileResult = namedtuple(
+    'CompileResult', 'code, errors, warnings, used_names, stats')
+
+
+class CompileResult(_CompileResult):
+    """Result of the `compile_restricted_*` functions.
+
+    `stats` is a `CompileStats` if the function was called with
+    `stats=True`, otherwise `None`. It is the last field, so the first four
+    ones keep their positions.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, code, errors, warnings, used_names, stats=None):
+        return super(CompileResult, cls).__new__(
+            cls, code, errors, warnings, used_names, stats)
+
+
+# Times are in seconds, `node_count` is the size of the parsed ast and
+# `guard_counts` maps the guard names to the number of calls injected by the
+# policy.
+CompileStats = namedtuple(
+    'CompileStats',
+    'parse_time, transform_time, compile_time, node_count, guard_counts')
+
+# Names the policy injects into the restricted code.
+GUARD_NAMES = (
+    '_apply_',
+    '_await_',
+    '_binop_guard_',
+    '_getaiter_',
+    '_getattr_',
+    '_getitem_',
+    '_getiter_',
+    '_inplacevar_',
+    '_iter_unpack_sequence_',
+    '_print_',
+    '_unpack_sequence_',
+    '_write_',
+)
 syntax_error_template = (
     'Line {lineno}: {type}: {msg} at statement: {statement!r}')
 
@@ -18,29 +60,69 @@ NOT_CPYTHON_WARNING = (
 )
 
 
+def _guard_counts(tree):
+    """Count the loads of guard names in a transformed ast.
+
+    Restricted code can not use names starting with `_`, so all of them
+    were injected by the policy.
+    """
+    counts = dict((name, 0) for name in GUARD_NAMES)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in counts:
+            counts[node.id] += 1
+    return counts
+
+
 def _compile_restricted_mode(
         source,
         filename='<string>',
         mode="exec",
         flags=0,
         dont_inherit=False,
-        policy=RestrictingNodeTransformer):
+        policy=RestrictingNodeTransformer,
+        stats=False):
 
     if not IS_CPYTHON:
         warnings.warn_explicit(
             NOT_CPYTHON_WARNING, RuntimeWarning, 'RestrictedPython', 0)
 
+    if not tracing.enabled:
+        return _compile_restricted_steps(
+            source, filename, mode, flags, dont_inherit, policy, stats, {})
+    attributes = {
+        'filename': filename,
+        'mode': mode,
+        'source_size': len(source) if isinstance(source, str) else None,
+    }
+    with tracing.span('compile', **attributes) as span:
+        result = _compile_restricted_steps(
+            source, filename, mode, flags, dont_inherit, policy, stats,
+            attributes)
+        if result.errors:
+            span.set_outcome('error')
+    return result
+
+
+def _compile_restricted_steps(
+        source, filename, mode, flags, dont_inherit, policy, stats,
+        attributes):
     byte_code = None
     collected_errors = []
     collected_warnings = []
     used_names = {}
+    parse_time = transform_time = compile_time = 0.0
+    node_count = 0
+    guard_counts = {}
     if policy is None:
         # Unrestricted Source Checks
-        byte_code = compile(source, filename, mode=mode, flags=flags,
-                            dont_inherit=dont_inherit)
+        start = _clock()
+        with tracing.span('bytecode', **attributes):
+            byte_code = compile(source, filename, mode=mode, flags=flags,
+                                dont_inherit=dont_inherit)
+        compile_time = _clock() - start
     elif issubclass(policy, RestrictingNodeTransformer):
         c_ast = None
-        allowed_source_types = [str, ast.Module]
+        allowed_source_types = [str, ast.Module, ast.Expression]
         if IS_PY2:
             allowed_source_types.append(unicode)  # NOQA: F821,E501  # PY2 only statement, in Python 2 only module
         if not issubclass(type(source), tuple(allowed_source_types)):
@@ -48,36 +130,59 @@ def _compile_restricted_mode(
                             '"{0.__class__.__name__}".'.format(source))
         c_ast = None
         # workaround for pypy issue https://bitbucket.org/pypy/pypy/issues/2552
-        if isinstance(source, ast.Module):
+        if isinstance(source, (ast.Module, ast.Expression)):
             c_ast = source
         else:
-            try:
-                c_ast = ast.parse(source, filename, mode)
-            except (TypeError, ValueError) as e:
-                collected_errors.append(str(e))
-            except SyntaxError as v:
-                collected_errors.append(syntax_error_template.format(
-                    lineno=v.lineno,
-                    type=v.__class__.__name__,
-                    msg=v.msg,
-                    statement=v.text.strip() if v.text else None
-                ))
+            start = _clock()
+            with tracing.span('parse', **attributes) as span:
+                try:
+                    c_ast = ast.parse(source, filename, mode)
+                except (TypeError, ValueError) as e:
+                    collected_errors.append(str(e))
+                    span.set_outcome('error')
+                except SyntaxError as v:
+                    collected_errors.append(syntax_error_template.format(
+                        lineno=v.lineno,
+                        type=v.__class__.__name__,
+                        msg=v.msg,
+                        statement=v.text.strip() if v.text else None
+                    ))
+                    span.set_outcome('error')
+            parse_time = _clock() - start
         if c_ast:
-            policy_instance = policy(
-                collected_errors, collected_warnings, used_names)
-            policy_instance.visit(c_ast)
+            if stats:
+                node_count = sum(1 for node in ast.walk(c_ast))
+            start = _clock()
+            with tracing.span('transform', **attributes) as span:
+                policy_instance = policy(
+                    collected_errors, collected_warnings, used_names)
+                policy_instance.visit(c_ast)
+                if collected_errors:
+                    span.set_outcome('error')
+            transform_time = _clock() - start
             if not collected_errors:
-                byte_code = compile(c_ast, filename, mode=mode  # ,
-                                    # flags=flags,
-                                    # dont_inherit=dont_inherit
-                                    )
+                start = _clock()
+                with tracing.span('bytecode', **attributes):
+                    byte_code = compile(c_ast, filename, mode=mode  # ,
+                                        # flags=flags,
+                                        # dont_inherit=dont_inherit
+                                        )
+                compile_time = _clock() - start
+                if stats:
+                    guard_counts = _guard_counts(c_ast)
     else:
         raise TypeError('Unallowed policy provided for RestrictedPython')
+    compile_stats = None
+    if stats:
+        compile_stats = CompileStats(
+            parse_time, transform_time, compile_time, node_count,
+            guard_counts)
     return CompileResult(
         byte_code,
         tuple(collected_errors),
         collected_warnings,
-        used_names)
+        used_names,
+        stats=compile_stats)
 
 
 def compile_restricted_exec(
@@ -85,15 +190,20 @@ def compile_restricted_exec(
         filename='<string>',
         flags=0,
         dont_inherit=False,
-        policy=RestrictingNodeTransformer):
-    """Compile restricted for the mode `exec`."""
+        policy=RestrictingNodeTransformer,
+        stats=False):
+    """Compile restricted for the mode `exec`.
+
+    If `stats` is true, the `stats` of the result are collected.
+    """
     return _compile_restricted_mode(
         source,
         filename=filename,
         mode='exec',
         flags=flags,
         dont_inherit=dont_inherit,
-        policy=policy)
+        policy=policy,
+        stats=stats)
 
 
 def compile_restricted_eval(
@@ -101,15 +211,20 @@ def compile_restricted_eval(
         filename='<string>',
         flags=0,
         dont_inherit=False,
-        policy=RestrictingNodeTransformer):
-    """Compile restricted for the mode `eval`."""
+        policy=RestrictingNodeTransformer,
+        stats=False):
+    """Compile restricted for the mode `eval`.
+
+    If `stats` is true, the `stats` of the result are collected.
+    """
     return _compile_restricted_mode(
         source,
         filename=filename,
         mode='eval',
         flags=flags,
         dont_inherit=dont_inherit,
-        policy=policy)
+        policy=policy,
+        stats=stats)
 
 
 def compile_restricted_single(
@@ -117,15 +232,20 @@ def compile_restricted_single(
         filename='<string>',
         flags=0,
         dont_inherit=False,
-        policy=RestrictingNodeTransformer):
-    """Compile restricted for the mode `single`."""
+        policy=RestrictingNodeTransformer,
+        stats=False):
+    """Compile restricted for the mode `single`.
+
+    If `stats` is true, the `stats` of the result are collected.
+    """
     return _compile_restricted_mode(
         source,
         filename=filename,
         mode='single',
         flags=flags,
         dont_inherit=dont_inherit,
-        policy=policy)
+        policy=policy,
+        stats=stats)
 
 
 def compile_restricted_function(
@@ -136,12 +256,14 @@ def compile_restricted_function(
         globalize=None,  # List of globals (e.g. ['here', 'context', ...])
         flags=0,
         dont_inherit=False,
-        policy=RestrictingNodeTransformer):
+        policy=RestrictingNodeTransformer,
+        stats=False):
     """Compile a restricted code object for a function.
 
     Documentation see:
     http://restrictedpython.readthedocs.io/en/latest/usage/index.html#RestrictedPython.compile_restricted_function
     """
+    start = _clock()
     # Parse the parameters and body, then combine them.
     try:
         body_ast = ast.parse(body, '<func code>', 'exec')
@@ -151,8 +273,12 @@ def compile_restricted_function(
             type=v.__class__.__name__,
             msg=v.msg,
             statement=v.text.strip())
+        compile_stats = None
+        if stats:
+            compile_stats = CompileStats(_clock() - start, 0.0, 0.0, 0, {})
         return CompileResult(
-            code=None, errors=(error,), warnings=(), used_names=())
+            code=None, errors=(error,), warnings=(), used_names=(),
+            stats=compile_stats)
 
     # The compiled code is actually executed inside a function
     # (that is called when the code is called) so reading and assigning to a
@@ -171,6 +297,7 @@ def compile_restricted_function(
 
     wrapper_ast.body[0].body = body_ast.body
     wrapper_ast = ast.fix_missing_locations(wrapper_ast)
+    parse_time = _clock() - start
 
     result = _compile_restricted_mode(
         wrapper_ast,
@@ -178,11 +305,172 @@ def compile_restricted_function(
         mode='exec',
         flags=flags,
         dont_inherit=dont_inherit,
-        policy=policy)
+        policy=policy,
+        stats=stats)
+    if stats:
+        result = result._replace(
+            stats=result.stats._replace(parse_time=parse_time))
 
     return result
 
 
+class CompiledExpressions(object):
+    """Result of `compile_restricted_expressions`.
+
+    where:
+
+      code -- code object evaluating to a tuple of functions, one per
+              expression in `expressions`, or `None` if no expression
+              compiled
+      expressions -- the expressions without errors in the order of `code`
+      errors -- dict of the expressions with errors to their error messages
+      warnings -- dict of the expressions with warnings to their warnings
+      used_names -- the names used by the expressions in `expressions`
+    """
+
+    def __init__(self, code, expressions, errors, warnings, used_names):
+        self.code = code
+        self.expressions = expressions
+        self.errors = errors
+        self.warnings = warnings
+        self.used_names = used_names
+
+    def bind(self, global_scope):
+        """Return a dict of the expressions to functions without parameters
+        evaluating them in `global_scope`."""
+        if self.code is None:
+            return {}
+        return dict(zip(self.expressions, eval(self.code, global_scope)))
+
+
+# Nodes which turn the function of an expression into a generator or
+# coroutine, they are only allowed inside a `lambda` of the expression.
+_FUNCTION_ONLY_NODES = {
+    'Yield': 'yield',
+    'YieldFrom': 'yield',
+    'Await': 'await',
+}
+
+
+def _function_only_node(node):
+    """Return a node of the expression `node` which requires a function
+    around it, or `None`."""
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if node.__class__.__name__ in _FUNCTION_ONLY_NODES:
+            return node
+        if isinstance(node, ast.Lambda):
+            # Only the defaults are evaluated outside of the lambda.
+            nodes.extend(ast.iter_child_nodes(node.args))
+        else:
+            nodes.extend(ast.iter_child_nodes(node))
+    return None
+
+
+def _expression_error(expression, lineno, msg, type_name='SyntaxError'):
+    """Return the error message for line `lineno` of `expression`."""
+    statement = expression.splitlines()[lineno - 1].strip()
+    return syntax_error_template.format(
+        lineno=lineno, type=type_name, msg=msg, statement=statement)
+
+
+def compile_restricted_expressions(
+        expressions,
+        filename='<string>',
+        policy=RestrictingNodeTransformer):
+    """Compile many expressions for the mode `eval` at once.
+
+    Each expression becomes a `lambda` of one code object, so the policy is
+    instantiated and `compile()` is called only once instead of once per
+    expression. In the code the expressions follow each other line by line,
+    errors and warnings are reported per expression with line numbers
+    relative to the expression.
+
+    Returns a `CompiledExpressions`, duplicate expressions are compiled once.
+    """
+    if policy is None or not issubclass(policy, RestrictingNodeTransformer):
+        raise TypeError('Unallowed policy provided for RestrictedPython')
+    policy_instance = policy()
+    arguments = ast.parse('lambda: 0', filename, 'eval').body.args
+    errors = {}
+    collected_warnings = {}
+    seen = set()
+    # The compiled expressions, their offsets in the code, their functions
+    # and their used names.
+    compiled = []
+    offsets = []
+    functions = []
+    names = []
+    offset = 0
+    for expression in expressions:
+        if expression in seen:
+            continue
+        seen.add(expression)
+        # Parse the expression at its line in the code, so the line numbers
+        # of the ast do not have to be changed afterwards.
+        try:
+            c_ast = ast.parse('\n' * offset + expression, filename, 'eval')
+        except (TypeError, ValueError) as e:
+            errors[expression] = (str(e),)
+            continue
+        except SyntaxError as v:
+            errors[expression] = (syntax_error_template.format(
+                lineno=v.lineno - offset if v.lineno else v.lineno,
+                type=v.__class__.__name__,
+                msg=v.msg,
+                statement=v.text.strip() if v.text else None),)
+            continue
+        # `compile_restricted_eval` rejects them as outside of a function.
+        node = _function_only_node(c_ast.body)
+        if node is not None:
+            errors[expression] = (_expression_error(
+                expression, node.lineno - offset, "'{0}' outside function"
+                .format(_FUNCTION_ONLY_NODES[node.__class__.__name__])),)
+            continue
+        policy_instance.errors = []
+        policy_instance.warnings = []
+        policy_instance.used_names = {}
+        policy_instance.line_offset = offset
+        policy_instance.visit(c_ast)
+        if policy_instance.warnings:
+            collected_warnings[expression] = tuple(policy_instance.warnings)
+        if policy_instance.errors:
+            errors[expression] = tuple(policy_instance.errors)
+            continue
+        function = ast.copy_location(
+            ast.Lambda(args=arguments, body=c_ast.body), c_ast.body)
+        compiled.append(expression)
+        offsets.append(offset)
+        functions.append(function)
+        names.append(policy_instance.used_names)
+        offset += expression.count('\n') + 1
+    code = None
+    while functions:
+        module = ast.Expression(ast.copy_location(
+            ast.Tuple(functions, ast.Load()), functions[0]))
+        try:
+            code = compile(module, filename, mode='eval')
+        except SyntaxError as v:
+            # Attribute the error to the expression at its line and compile
+            # the other ones again.
+            lineno = v.lineno or 1
+            index = max(bisect.bisect_right(offsets, lineno - 1) - 1, 0)
+            expression = compiled.pop(index)
+            errors[expression] = (_expression_error(
+                expression, lineno - offsets.pop(index), v.msg,
+                v.__class__.__name__),)
+            del functions[index]
+            del names[index]
+        else:
+            break
+    used_names = {}
+    for expression_names in names:
+        used_names.update(expression_names)
+    return CompiledExpressions(
+        code, tuple(compiled), errors, collected_warnings, used_names)
+
+
 def compile_restricted(
         source,
         filename='<unknown>',
@@ -0,0 +1,301 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Scope-aware analysis of the names a restricted source uses.
+
+`used_names` of `CompileResult` contains every loaded name, including local
+variables, parameters and comprehension variables. The functions in this
+module use the symbol table of the compiler to report only the names which
+are resolved in the global scope (or in an enclosing function), so a host
+knows exactly which objects a script can ask for.
+"""
+
+from collections import namedtuple
+
+import ast
+import symtable
+
+
+# How a code unit uses a name which is not local to it. `scope` is 'global'
+# for names resolved in the module globals (or builtins) and 'free' for
+# names of an enclosing function.
+NameUsage = namedtuple('NameUsage', 'scope, load, store, delete')
+
+# A module, class, function, lambda or comprehension. `names` maps the
+# non-local names to their `NameUsage`.
+CodeUnit = namedtuple('CodeUnit', 'name, type, lineno, names')
+
+
+class _BindingCollector(ast.NodeVisitor):
+    """Collect the names bound and deleted by statements per scope.
+
+    The symbol table does not distinguish between `x = ...` and `del x` and
+    does not report `x += 1` as reading `x`. Only modules, classes and
+    functions can contain statements, so they are identified by
+    `(name, lineno)` like in the symbol table.
+    """
+
+    def __init__(self):
+        self.scope = ('top', 0)
+        self.stores = {}
+        self.deletes = {}
+        self.augmented = {}
+        # Inside of lambdas and comprehensions, they bind only their own
+        # variables.
+        self.in_expression_scope = False
+
+    def add(self, mapping, name):
+        mapping.setdefault(self.scope, set()).add(name)
+
+    def visit_scope(self, node):
+        self.add(self.stores, node.name)
+        # Decorators, defaults, annotations and bases belong to the outer
+        # scope.
+        for field, value in ast.iter_fields(node):
+            if field != 'body':
+                self.visit_value(value)
+        outer = self.scope, self.in_expression_scope
+        self.scope, self.in_expression_scope = (node.name, node.lineno), False
+        for child in node.body:
+            self.visit(child)
+        self.scope, self.in_expression_scope = outer
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_scope
+
+    def visit_value(self, value):
+        if isinstance(value, list):
+            for item in value:
+                self.visit_value(item)
+        elif isinstance(value, ast.AST):
+            self.visit(value)
+
+    def visit_expression_scope(self, node):
+        outer = self.in_expression_scope
+        self.in_expression_scope = True
+        self.generic_visit(node)
+        self.in_expression_scope = outer
+
+    visit_Lambda = visit_GeneratorExp = visit_expression_scope
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_expression_scope
+
+    def visit_NamedExpr(self, node):
+        # `(x := ...)` binds `x` in the enclosing function or module.
+        self.add(self.stores, node.target.id)
+        self.visit(node.value)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Del):
+            self.add(self.deletes, node.id)
+        elif (isinstance(node.ctx, ast.Store)
+                and not self.in_expression_scope):
+            self.add(self.stores, node.id)
+
+    def visit_AugAssign(self, node):
+        if isinstance(node.target, ast.Name):
+            self.add(self.augmented, node.target.id)
+        self.generic_visit(node)
+
+    def visit_alias(self, node):
+        name = node.asname or node.name.split('.')[0]
+        self.add(self.stores, name)
+
+    def visit_ExceptHandler(self, node):
+        if isinstance(getattr(node, 'name', None), str):
+            self.add(self.stores, node.name)
+        self.generic_visit(node)
+
+
+def _code_units(table, bindings):
+    is_module = table.get_type() == 'module'
+    key = ('top' if is_module else table.get_name(), table.get_lineno())
+    stores = bindings.stores.get(key, set())
+    deletes = bindings.deletes.get(key, set())
+    augmented = bindings.augmented.get(key, set())
+    names = {}
+    for symbol in table.get_symbols():
+        if is_module or symbol.is_global():
+            scope = 'global'
+        elif symbol.is_free():
+            scope = 'free'
+        else:
+            continue
+        name = symbol.get_name()
+        deleted = name in deletes
+        # `del x` marks `x` as assigned in the symbol table.
+        stored = symbol.is_imported() or (
+            symbol.is_assigned() and (not deleted or name in stores))
+        loaded = symbol.is_referenced() or name in augmented
+        if loaded or stored or deleted:
+            names[name] = NameUsage(scope, loaded, stored, deleted)
+    units = [CodeUnit(table.get_name(), table.get_type(), table.get_lineno(),
+                      names)]
+    for child in table.get_children():
+        units.extend(_code_units(child, bindings))
+    return units
+
+
+def analyze_names(source, filename='<string>', mode='exec'):
+    """Return the `CodeUnit`s of `source` with the names they do not define.
+
+    where:
+
+      source -- the source code as str
+      mode -- 'exec', 'eval' or 'single' like for `compile()`
+
+    The module is the first code unit followed by the nested ones in source
+    order. Raises a SyntaxError if the source can not be parsed.
+    """
+    table = symtable.symtable(source, filename, mode)
+    bindings = _BindingCollector()
+    bindings.visit(ast.parse(source, filename, mode))
+    return _code_units(table, bindings)
+
+
+_WITH_STATEMENTS = tuple(
+    getattr(ast, name) for name in ('With', 'AsyncWith') if hasattr(ast, name))
+
+
+def _target_names(target):
+    """Return the names bound by the assignment target `target`."""
+    if isinstance(target, ast.Name):
+        return set([target.id])
+    if isinstance(target, (ast.Tuple, ast.List)):
+        names = set()
+        for element in target.elts:
+            names.update(_target_names(element))
+        return names
+    if isinstance(target, getattr(ast, 'Starred', ())):
+        return _target_names(target.value)
+    return set()
+
+
+def _bound_names(statements):
+    """Return the names definitely bound after running `statements`.
+
+    Only bindings which happen on every path without an exception count, so
+    the bindings in the bodies of loops, `try` and `with` statements are
+    left out.
+    """
+    bound = set()
+    for node in statements:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                bound.update(_target_names(target))
+        elif isinstance(node, getattr(ast, 'AnnAssign', ())):
+            if node.value is not None:
+                bound.update(_target_names(node.target))
+        elif isinstance(node, ast.AugAssign):
+            bound.update(_target_names(node.target))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name != '*':
+                    bound.add(alias.asname or alias.name.split('.')[0])
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)) or isinstance(
+                node, getattr(ast, 'AsyncFunctionDef', ())):
+            bound.add(node.name)
+        elif isinstance(node, _WITH_STATEMENTS):
+            # The `as` names are bound before the body runs.
+            for item in getattr(node, 'items', [node]):
+                if item.optional_vars is not None:
+                    bound.update(_target_names(item.optional_vars))
+        elif isinstance(node, ast.If):
+            bound.update(
+                _bound_names(node.body) & _bound_names(node.orelse))
+    return bound
+
+
+# Statements whose bodies are checked with the names bound so far, the
+# bodies of functions and classes are checked as a whole.
+_BLOCK_STATEMENTS = tuple(
+    getattr(ast, name) for name in (
+        'If', 'For', 'AsyncFor', 'While', 'With', 'AsyncWith', 'Try',
+        'TryStar', 'TryExcept', 'TryFinally')
+    if hasattr(ast, name))
+
+
+def _reads(node, names, bound, free):
+    """Add the `names` read in `node` and not in `bound` to `free`."""
+    for child in ast.walk(node):
+        if isinstance(child, ast.AugAssign):
+            # `x += 1` reads `x` although its context is `Store`.
+            child = child.target
+        elif not isinstance(getattr(child, 'ctx', None), ast.Load):
+            continue
+        name = getattr(child, 'id', None)
+        if name in names and name not in bound:
+            free.add(name)
+
+
+def _reads_before_bound(statements, names, bound, free):
+    """Add the `names` read by `statements` before they are bound to
+    `free`."""
+    bound = set(bound)
+    for statement in statements:
+        if not isinstance(statement, _BLOCK_STATEMENTS):
+            _reads(statement, names, bound, free)
+        else:
+            # The loop variables and the `as` names of `with` are bound in
+            # the body.
+            inner = set(bound)
+            if isinstance(statement, (ast.For, getattr(ast, 'AsyncFor', ()))):
+                inner.update(_target_names(statement.target))
+            if isinstance(statement, _WITH_STATEMENTS):
+                inner.update(_bound_names([statement]))
+            for field, value in ast.iter_fields(statement):
+                if field in ('body', 'orelse', 'finalbody'):
+                    _reads_before_bound(
+                        value, names, inner if field == 'body' else bound,
+                        free)
+                elif field == 'handlers':
+                    for handler in value:
+                        if handler.type is not None:
+                            _reads(handler.type, names, bound, free)
+                        handler_bound = set(bound)
+                        if isinstance(handler.name, ast.AST):
+                            # Python 2
+                            handler_bound.update(
+                                _target_names(handler.name))
+                        elif handler.name is not None:
+                            handler_bound.add(handler.name)
+                        _reads_before_bound(
+                            handler.body, names, handler_bound, free)
+                elif isinstance(value, list):
+                    for item in value:
+                        _reads(item, names, bound, free)
+                elif isinstance(value, ast.AST):
+                    _reads(value, names, bound, free)
+        bound.update(_bound_names([statement]))
+
+
+def free_names(source, filename='<string>', mode='exec'):
+    """Return the names `source` reads from its global scope.
+
+    These are the names a host has to provide, either in the globals or in
+    the builtins. A name is omitted only if the module definitely binds it
+    before it is read and never deletes it, e.g. it is kept for `x = x + 1`
+    or for a function reading a global assigned later.
+    """
+    loaded = set()
+    for unit in analyze_names(source, filename, mode):
+        for name, usage in unit.names.items():
+            if usage.scope == 'global' and usage.load:
+                loaded.add(name)
+    tree = ast.parse(source, filename, mode)
+    if isinstance(tree, ast.Expression):
+        # An expression can not bind names.
+        return frozenset(loaded)
+    free = set(
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Del)
+        and node.id in loaded)
+    _reads_before_bound(tree.body, loaded - free, set(), free)
+    return frozenset(free)
@@ -0,0 +1,168 @@
+##############################################################################
+#
+# Copyright (c) 2002 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE
+#
+##############################################################################
+"""Tracing hooks around compiling and running restricted code.
+
+RestrictedPython opens a span around each step:
+
+  compile -- a `compile_restricted_*` call, containing the spans
+             parse -- `ast.parse`
+             transform -- checking and transforming by the policy
+             bytecode -- `compile()` of the transformed ast
+  cache_lookup -- a lookup of compiled code, the outcome is 'hit' or 'miss'
+  execute -- running restricted code (`RestrictedExecutor`,
+             `RestrictionCapableEval.eval`)
+
+The spans have the attributes `filename`, `mode` and `source_size` and an
+`outcome`: 'ok', 'error' (the code is not allowed), 'hit', 'miss' or
+'exception' (the exception class name is stored as attribute `exception`).
+
+Install a tracer with `set_tracer`. Without one `enabled` is false and the
+instrumented code skips building the spans. A tracer has a method
+`start_span(name, attributes)` returning a context manager with the methods
+`set_attribute(key, value)` and `set_outcome(outcome)`. Adapters to
+telemetry libraries can be written against this small interface.
+"""
+
+import threading
+
+
+try:
+    from time import perf_counter as _clock
+except ImportError:  # pragma: no cover
+    # Python 2
+    from time import time as _clock
+
+
+class _NullSpan(object):
+    """Span which records nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_outcome(self, outcome):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class NullTracer(object):
+    """Tracer which records nothing, it is the default."""
+
+    def start_span(self, name, attributes):
+        return _null_span
+
+
+class Span(object):
+    """A span recorded by `InMemoryTracer`."""
+
+    outcome = 'ok'
+    parent = None
+    start = end = None
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.parent = self.tracer._enter(self)
+        self.start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = _clock()
+        if exc_type is not None:
+            self.outcome = 'exception'
+            self.attributes['exception'] = exc_type.__name__
+        self.tracer._exit(self)
+        return False
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_outcome(self, outcome):
+        self.outcome = outcome
+
+    def __repr__(self):
+        return '<Span {0} {1}>'.format(self.name, self.outcome)
+
+
+class InMemoryTracer(object):
+    """Tracer collecting the finished spans in `spans`, e.g. for tests.
+
+    `parent` of a span is the span which was open in the same thread when it
+    started.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start_span(self, name, attributes):
+        return Span(self, name, attributes)
+
+    def _enter(self, span):
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(span)
+        return parent
+
+    def _exit(self, span):
+        self._local.stack.pop()
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name):
+        """Return the finished spans called `name`."""
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self):
+        with self._lock:
+            del self.spans[:]
+
+
+_tracer = NullTracer()
+# Is a tracer installed? Checked on the hot paths to skip the spans.
+enabled = False
+
+
+def get_tracer():
+    return _tracer
+
+
+def set_tracer(tracer):
+    """Install `tracer` process-wide, `None` restores the `NullTracer`."""
+    global _tracer, enabled
+    _tracer = NullTracer() if tracer is None else tracer
+    enabled = tracer is not None
+
+
+def span(name, filename=None, mode=None, source_size=None):
+    """Start a span of the installed tracer."""
+    if not enabled:
+        return _null_span
+    return _tracer.start_span(
+        name,
+        {'filename': filename, 'mode': mode, 'source_size': source_size})
@@ -52,6 +52,14 @@ IOPERATOR_TO_STR = {
 if IS_PY35_OR_GREATER:
     IOPERATOR_TO_STR[ast.MatMult] = '@='
 
+# Binary operators which can amplify memory usage, e.g. `'x' * 10 ** 9`.
+# They are converted to a string for `_binop_guard_`.
+GUARDED_BINOPERATOR_TO_STR = {
+    ast.Mult: '*',
+    ast.Pow: '**',
+    ast.LShift: '<<',
+}
+
 
 # For creation allowed magic method names. See also
 # https://docs.python.org/3/reference/datamodel.html#special-method-names
@@ -84,6 +92,11 @@ def copy_locations(new_node, old_node):
     assert 'col_offset' in new_node._attributes
     new_node.col_offset = old_node.col_offset
 
+    # Python 3.8+ additionally tracks the end position of a node.
+    if 'end_lineno' in new_node._attributes:
+        new_node.end_lineno = getattr(old_node, 'end_lineno', None)
+        new_node.end_col_offset = getattr(old_node, 'end_col_offset', None)
+
     ast.fix_missing_locations(new_node)
 
 
@@ -109,6 +122,10 @@ class PrintInfo(object):
 
 class RestrictingNodeTransformer(ast.NodeTransformer):
 
+    # Subtracted from the line numbers in errors and warnings, for source
+    # parsed at an offset.
+    line_offset = 0
+
     def __init__(self, errors=None, warnings=None, used_names=None):
         super(RestrictingNodeTransformer, self).__init__()
         self.errors = [] if errors is None else errors
@@ -136,12 +153,16 @@ class RestrictingNodeTransformer(ast.NodeTransformer):
     def error(self, node, info):
         """Record a security error discovered during transformation."""
         lineno = getattr(node, 'lineno', None)
+        if lineno is not None:
+            lineno -= self.line_offset
         self.errors.append(
             'Line {lineno}: {info}'.format(lineno=lineno, info=info))
 
     def warn(self, node, info):
         """Record a security error discovered during transformation."""
         lineno = getattr(node, 'lineno', None)
+        if lineno is not None:
+            lineno -= self.line_offset
         self.warnings.append(
             'Line {lineno}: {info}'.format(lineno=lineno, info=info))
 
@@ -385,6 +406,18 @@ class RestrictingNodeTransformer(ast.NodeTransformer):
                 dims.elts.append(self.transform_slice(item))
             return dims
 
+        elif isinstance(slice_, ast.Tuple):
+            # Python 3.9+ uses a plain tuple instead of `ExtSlice`.
+            dims = ast.Tuple([], ast.Load())
+            for item in slice_.elts:
+                dims.elts.append(self.transform_slice(item))
+            copy_locations(dims, slice_)
+            return dims
+
+        elif isinstance(slice_, ast.expr):
+            # Python 3.9+ does not wrap the index into an `Index` node.
+            return slice_
+
         else:  # pragma: no cover
             # Index, Slice and ExtSlice are only defined Slice types.
             raise NotImplementedError("Unknown slice type: {0}".format(slice_))
@@ -1469,3 +1502,288 @@ class RestrictingNodeTransformer(ast.NodeTransformer):
     def visit_AsyncWith(self, node):
         """Deny async functionality."""
         self.not_allowed(node)
+
+
+class GuardedBinOpTransformer(RestrictingNodeTransformer):
+    """Policy which additionally guards memory amplifying binary operations.
+
+    'a * b' becomes '_binop_guard_("*", a, b)'
+    'a ** b' becomes '_binop_guard_("**", a, b)'
+    'a << b' becomes '_binop_guard_("<<", a, b)'
+
+    'a *= b' becomes 'a = _binop_guard_("*=", a, b)', the same for `**=` and
+    `<<=`
+
+    `RestrictedPython.Limits.limited_binop` is a reference implementation for
+    `_binop_guard_`.
+    """
+
+    def visit_BinOp(self, node):
+        """Route `*`, `**` and `<<` through `_binop_guard_`."""
+        node = self.node_contents_visit(node)
+
+        op = GUARDED_BINOPERATOR_TO_STR.get(type(node.op))
+        if op is None:
+            return node
+
+        new_node = ast.Call(
+            func=ast.Name('_binop_guard_', ast.Load()),
+            args=[ast.Str(op), node.left, node.right],
+            keywords=[])
+
+        copy_locations(new_node, node)
+        return new_node
+
+    def visit_AugAssign(self, node):
+        """Route `*=`, `**=` and `<<=` of names through `_binop_guard_`.
+
+        The other augmented assignments still use `_inplacevar_`.
+        """
+        op = GUARDED_BINOPERATOR_TO_STR.get(type(node.op))
+        if op is None or not isinstance(node.target, ast.Name):
+            return super(GuardedBinOpTransformer, self).visit_AugAssign(node)
+
+        node = self.node_contents_visit(node)
+        new_node = ast.Assign(
+            targets=[node.target],
+            value=ast.Call(
+                func=ast.Name('_binop_guard_', ast.Load()),
+                args=[
+                    ast.Str(op + '='),
+                    ast.Name(node.target.id, ast.Load()),
+                    node.value],
+                keywords=[]))
+
+        copy_locations(new_node, node)
+        return new_node
+
+
+# Name of the generator function `CheckpointTransformer` wraps the code into.
+CHECKPOINT_FUNCTION_NAME = '_checkpointed_'
+
+# Nodes starting a new scope.
+SCOPE_NODES = (ast.FunctionDef, ast.Lambda, ast.ClassDef)
+if IS_PY3:
+    SCOPE_NODES += (
+        ast.AsyncFunctionDef, ast.GeneratorExp, ast.ListComp, ast.SetComp,
+        ast.DictComp)
+
+
+def walk_scope(node):
+    """Yield the descendants of `node` which are in its scope.
+
+    Nodes starting a new scope are yielded but not entered.
+    """
+    for child in ast.iter_child_nodes(node):
+        yield child
+        if not isinstance(child, SCOPE_NODES):
+            for grandchild in walk_scope(child):
+                yield grandchild
+
+
+class CheckpointTransformer(RestrictingNodeTransformer):
+    """Policy which turns the code into a generator for cooperative
+    multitasking.
+
+    The code is wrapped into a generator function named
+    `CHECKPOINT_FUNCTION_NAME`. It yields once at its start and at the start
+    of each iteration of the loops of the code, nested functions and classes
+    stay as they are. The names bound by the code are declared `global`, so
+    executing the generator binds them in the globals like executing the
+    code itself would do.
+
+    `RestrictedPython.Scheduler` runs such code. Only code compiled in the
+    mode `exec` can be transformed.
+    """
+
+    def visit_Module(self, node):
+        for child in walk_scope(node):
+            if isinstance(child, (ast.Return, ast.Yield)) or (
+                    IS_PY3 and isinstance(child, ast.YieldFrom)):
+                self.error(
+                    child, '"{0}" outside function is not allowed.'.format(
+                        type(child).__name__.lower()))
+        node = super(CheckpointTransformer, self).visit_Module(node)
+        if self.errors:
+            return node
+
+        # `from __future__` imports have to stay at the top of the module.
+        position = 0
+        while (position < len(node.body)
+               and isinstance(node.body[position], ast.ImportFrom)
+               and node.body[position].module == '__future__'):
+            position += 1
+        body = node.body[position:]
+        self.insert_checkpoints(body)
+
+        function = ast.parse(
+            'def {0}():\n    yield'.format(CHECKPOINT_FUNCTION_NAME)).body[0]
+        names = self.bound_names(node)
+        if names:
+            function.body.insert(0, ast.Global(names))
+        if body:
+            # The code of the wrapper is attributed to the first line.
+            for child in ast.walk(function):
+                if 'lineno' in child._attributes:
+                    copy_locations(child, body[0])
+        ast.fix_missing_locations(function)
+        function.body.extend(body)
+        node.body[position:] = [function]
+        return node
+
+    def bound_names(self, node):
+        """Return the sorted names bound in the scope of `node`.
+
+        Names starting with `_` are bound by the policy itself.
+        """
+        names = set()
+        for child in walk_scope(node):
+            if isinstance(child, ast.Name):
+                if not isinstance(child.ctx, ast.Load):
+                    names.add(child.id)
+            elif isinstance(child, (ast.FunctionDef, ast.ClassDef)) or (
+                    IS_PY3 and isinstance(child, ast.AsyncFunctionDef)):
+                names.add(child.name)
+            elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                for alias in child.names:
+                    names.add(alias.asname or alias.name.split('.')[0])
+            elif isinstance(child, ast.ExceptHandler):
+                if IS_PY3 and child.name:
+                    names.add(child.name)
+        return sorted(name for name in names if not name.startswith('_'))
+
+    def insert_checkpoints(self, body):
+        """Insert a `yield` at the start of the loops in the statements
+        `body` and in the statements nested in them.
+        """
+        for node in body:
+            if isinstance(node, SCOPE_NODES):
+                continue
+            if isinstance(node, (ast.For, ast.While)):
+                checkpoint = ast.Expr(ast.Yield(None))
+                copy_locations(checkpoint, node)
+                node.body.insert(0, checkpoint)
+            for field in ('body', 'orelse', 'finalbody'):
+                self.insert_checkpoints(getattr(node, field, ()))
+            for handler in getattr(node, 'handlers', ()):
+                self.insert_checkpoints(handler.body)
+
+
+class AsyncTransformer(RestrictingNodeTransformer):
+    """Policy which additionally allows `async def` with guarded `await`,
+    `async for` and `async with`.
+
+    'await x' becomes 'await _await_(x)'
+    'async for x in y' becomes 'async for x in _getaiter_(y)'
+    'async with x' awaits '_await_(...)' of `__aenter__` and `__aexit__`
+
+    `_await_` has to return its argument if it is an allowed awaitable and
+    raise an exception otherwise, see `RestrictedPython.Guards.AwaitGuard`.
+    `_getaiter_` guards asynchronous iteration like `_getiter_` guards the
+    synchronous one, see `RestrictedPython.Guards.AsyncIterGuard`. Tuple
+    targets of `async for` and `async with` are unpacked via `_getiter_` like
+    in their synchronous counterparts.
+    """
+
+    def visit_AsyncFunctionDef(self, node):
+        """Allow `async def` with the restrictions of `def`."""
+        return self.visit_FunctionDef(node)
+
+    def visit_Await(self, node):
+        """Route the awaited object through `_await_`."""
+        node = self.node_contents_visit(node)
+        new_value = ast.Call(
+            func=ast.Name('_await_', ast.Load()),
+            args=[node.value],
+            keywords=[])
+        copy_locations(new_value, node.value)
+        node.value = new_value
+        return node
+
+    def guard_aiter(self, node):
+        """Route the iterable of `node` through `_getaiter_`."""
+        new_iter = ast.Call(
+            func=ast.Name('_getaiter_', ast.Load()),
+            args=[node.iter],
+            keywords=[])
+        copy_locations(new_iter, node.iter)
+        node.iter = new_iter
+
+    def visit_AsyncFor(self, node):
+        """Allow `async for` with the restrictions of `for`."""
+        node = self.node_contents_visit(node)
+        self.guard_aiter(node)
+        if isinstance(node.target, ast.Tuple):
+            tmp_target, unpack = self.gen_unpack_wrapper(node, node.target)
+            node.target = tmp_target
+            node.body.insert(0, unpack)
+        return node
+
+    def visit_AsyncWith(self, node):
+        """Allow `async with` with the restrictions of `with`.
+
+        The awaits of `__aenter__` and `__aexit__` are implicit, so the
+        statement is rewritten to call and await them explicitly through
+        `_await_`, one nested statement per context manager. The rewritten
+        code catches `BaseException`, it is in `safe_builtins`.
+        """
+        node = self.visit_With(node)
+        body = node.body
+        for item in reversed(node.items):
+            body = self.gen_async_with(node, item, body)
+        return body
+
+    def gen_async_with(self, node, item, body):
+        """Return the statements running `body` in the context manager of
+        `item` with guarded awaits, like the specification of `async with`.
+        """
+        names = dict(
+            manager=self.gen_tmp_name(),
+            exit=self.gen_tmp_name(),
+            value=self.gen_tmp_name(),
+            ok=self.gen_tmp_name(),
+            exc=self.gen_tmp_name())
+        statements = ast.parse(textwrap.dedent('''\
+            {manager} = None
+            {exit} = {manager}.__class__.__aexit__
+            {value} = await _await_({manager}.__class__.__aenter__({manager}))
+            {ok} = True
+            try:
+                try:
+                    pass
+                except BaseException as {exc}:
+                    {ok} = False
+                    if not await _await_({exit}(
+                            {manager}, {exc}.__class__, {exc},
+                            {exc}.__traceback__)):
+                        raise
+            finally:
+                if {ok}:
+                    await _await_({exit}({manager}, None, None, None))
+        ''').format(**names)).body
+        for statement in statements:
+            for child in ast.walk(statement):
+                if 'lineno' in child._attributes:
+                    copy_locations(child, node)
+        statements[0].value = item.context_expr
+        if item.optional_vars is not None:
+            value = ast.Name(names['value'], ast.Load())
+            assign = ast.Assign(targets=[item.optional_vars], value=value)
+            copy_locations(assign, item.optional_vars)
+            copy_locations(value, item.optional_vars)
+            body = [assign] + body
+        statements[-1].body[0].body = body
+        return statements
+
+    def visit_comprehension(self, node):
+        """Guard asynchronous comprehensions via `_getaiter_`."""
+        if not getattr(node, 'is_async', False):
+            return super(AsyncTransformer, self).visit_comprehension(node)
+        node = self.node_contents_visit(node)
+        if isinstance(node.target, ast.Tuple):
+            self.error(
+                node.target,
+                'Tuple unpacking in asynchronous comprehensions is not '
+                'allowed.')
+        self.guard_aiter(node)
+        return node
@@ -1,7 +1,13 @@
+from RestrictedPython.Limits import limited_binop
+from RestrictedPython.Limits import limited_builtins
 from RestrictedPython.Limits import limited_list
+from RestrictedPython.Limits import limited_pow
 from RestrictedPython.Limits import limited_range
 from RestrictedPython.Limits import limited_tuple
+from RestrictedPython.Limits import LimitsProfile
+from RestrictedPython.Limits import make_binop_guard
 
+import os
 import pytest
 
 
@@ -75,3 +81,220 @@ def test_limited_tuple_valid_list_input():
 def test_limited_tuple_invalid_string_input():
     with pytest.raises(TypeError):
         limited_tuple('input')
+
+
+def test_limited_binop_allows_small_results():
+    assert limited_binop('*', 'ab', 3) == 'ababab'
+    assert limited_binop('*', 2, [0]) == [0, 0]
+    assert limited_binop('**', 2, 10) == 1024
+    assert limited_binop('<<', 1, 10) == 1024
+
+
+def test_limited_binop_fast_path_for_floats():
+    assert limited_binop('**', 2.0, 0.5) == 2.0 ** 0.5
+    assert limited_binop('*', 1.5, 2) == 3.0
+
+
+def test_limited_binop_rejects_sequence_repetition():
+    with pytest.raises(ValueError) as excinfo:
+        limited_binop('*', 'x', 10 ** 9)
+    assert 'only allow 1000000 elements' in str(excinfo.value)
+    with pytest.raises(ValueError):
+        limited_binop('*', 10 ** 9, [0])
+
+
+def test_limited_binop_rejects_big_int_growth():
+    with pytest.raises(ValueError) as excinfo:
+        limited_binop('**', 10, 10 ** 8)
+    assert 'only allow 100000 bits' in str(excinfo.value)
+    with pytest.raises(ValueError):
+        limited_binop('<<', 1, 10 ** 8)
+    with pytest.raises(ValueError):
+        limited_binop('*', 1 << 60000, 1 << 60000)
+
+
+def test_limited_binop_passes_non_estimable_operands():
+    class Repeatable(object):
+        def __mul__(self, other):
+            return 'mul'
+
+    assert limited_binop('*', Repeatable(), 10 ** 9) == 'mul'
+    assert limited_binop('**', 10, -2) == 0.01
+
+
+def test_make_binop_guard_uses_configured_budget():
+    guard = make_binop_guard(max_sequence_length=4, max_int_bits=8)
+    assert guard('*', 'ab', 2) == 'abab'
+    with pytest.raises(ValueError):
+        guard('*', 'ab', 3)
+    with pytest.raises(ValueError):
+        guard('**', 2, 9)
+
+
+def test_limited_binop_checks_inplace_operators():
+    items = [0]
+    assert limited_binop('*=', items, 3) is items
+    assert items == [0, 0, 0]
+    assert limited_binop('**=', 2, 10) == 1024
+    assert limited_binop('<<=', 1, 10) == 1024
+    with pytest.raises(ValueError):
+        limited_binop('*=', [0], 10 ** 9)
+    with pytest.raises(ValueError):
+        limited_binop('**=', 10, 10 ** 8)
+    with pytest.raises(ValueError):
+        limited_binop('<<=', 1, 10 ** 8)
+
+
+def test_limited_pow():
+    """It rejects the results `**` rejects unless there is a modulus."""
+    assert limited_pow(2, 10) == 1024
+    assert limited_pow(2.0, 0.5) == 2.0 ** 0.5
+    assert limited_pow(10, 10 ** 8, 7) == pow(10, 10 ** 8, 7)
+    with pytest.raises(ValueError):
+        limited_pow(10, 10 ** 8)
+    with pytest.raises(ValueError):
+        LimitsProfile(max_int_bits=10).builtins()['pow'](2, 11)
+
+
+def test_LimitsProfile__range_limit_is_configurable():
+    profile = LimitsProfile(max_range_length=5000)
+    assert profile.limited_range(0, 4999) == range(0, 4999)
+    with pytest.raises(ValueError) as excinfo:
+        profile.limited_range(0, 5000)
+    assert 'we only allow 5000 elements in a range.' in str(excinfo.value)
+
+
+def test_LimitsProfile__range_limit_can_be_disabled():
+    profile = LimitsProfile(max_range_length=None)
+    assert len(profile.limited_range(10 ** 6)) == 10 ** 6
+
+
+def test_LimitsProfile__container_limits():
+    profile = LimitsProfile(max_container_length=3)
+    assert profile.limited_list(iter([1, 2, 3])) == [1, 2, 3]
+    assert profile.limited_tuple([1, 2]) == (1, 2)
+    assert profile.limited_set([1, 1, 2]) == {1, 2}
+    assert profile.limited_dict([(1, 2)], a=3) == {1: 2, 'a': 3}
+    assert profile.limited_dict({1: 2}) == {1: 2}
+    with pytest.raises(ValueError) as excinfo:
+        profile.limited_list(range(4))
+    assert 'we only allow 3 elements in a list.' in str(excinfo.value)
+    with pytest.raises(ValueError):
+        profile.limited_tuple(range(4))
+    with pytest.raises(ValueError):
+        profile.limited_set(range(4))
+    with pytest.raises(ValueError):
+        profile.limited_dict(dict.fromkeys(range(4)))
+    with pytest.raises(ValueError):
+        profile.limited_dict([(1, 2)], a=1, b=2, c=3)
+    with pytest.raises(TypeError):
+        profile.limited_dict([], [])
+    assert profile.limited_dict(a=1) == {'a': 1}
+    assert LimitsProfile().limited_dict(a=1) == {'a': 1}
+    with pytest.raises(TypeError):
+        profile.limited_list('abc')
+
+
+def test_LimitsProfile__container_limit_consumes_bounded_input():
+    def endless():
+        while True:
+            yield 1
+
+    profile = LimitsProfile(max_container_length=10)
+    with pytest.raises(ValueError):
+        profile.limited_list(endless())
+
+
+def test_LimitsProfile__sorted_limit():
+    profile = LimitsProfile(max_sorted_length=3)
+    assert profile.limited_sorted([3, 1, 2], reverse=True) == [3, 2, 1]
+    with pytest.raises(ValueError):
+        profile.limited_sorted([4, 3, 1, 2])
+
+
+def test_LimitsProfile__join_limit():
+    profile = LimitsProfile(max_join_length=5)
+    assert profile.limited_join('-', ['ab', 'cd']) == 'ab-cd'
+    with pytest.raises(ValueError) as excinfo:
+        profile.limited_join('--', ['ab', 'cd'])
+    assert 'only allow 5 characters' in str(excinfo.value)
+
+
+def test_LimitsProfile__wrap_getattr_limits_str_join():
+    profile = LimitsProfile(max_join_length=5)
+    _getattr_ = profile.wrap_getattr(getattr)
+    assert _getattr_('-', 'join')(['ab', 'cd']) == 'ab-cd'
+    with pytest.raises(ValueError):
+        _getattr_('-', 'join')(['abc', 'def'])
+    assert _getattr_([1], 'count')(1) == 1
+
+
+def test_LimitsProfile__join_limit_stops_consuming():
+    """It raises before an endless iterable is consumed."""
+    def endless():
+        while True:
+            yield 'a'
+
+    profile = LimitsProfile(max_join_length=5)
+    with pytest.raises(ValueError):
+        profile.limited_join('', endless())
+    assert profile.limited_join('', iter('abcde')) == 'abcde'
+    assert LimitsProfile().limited_join('-', iter('ab')) == 'a-b'
+
+
+def test_LimitsProfile__wrap_getattr_limits_unbound_str_join():
+    """`str.join(separator, iterable)` is limited, too."""
+    profile = LimitsProfile(max_join_length=5)
+    _getattr_ = profile.wrap_getattr(getattr)
+    assert _getattr_(str, 'join')('-', ['ab', 'cd']) == 'ab-cd'
+    assert _getattr_(bytes, 'join')(b'-', [b'ab']) == b'ab'
+    with pytest.raises(ValueError):
+        _getattr_(str, 'join')('-', ['abc', 'def'])
+    with pytest.raises(TypeError):
+        _getattr_(str, 'join')(b'-', [b'ab'])
+    assert _getattr_(list, 'count') == list.count
+    assert _getattr_(os.path, 'join') is os.path.join
+
+
+def test_LimitsProfile__wrap_getattr_without_join_limit():
+    _getattr_ = LimitsProfile().wrap_getattr(getattr)
+    assert _getattr_('-', 'join') == '-'.join
+
+
+def test_LimitsProfile__builtins():
+    profile = LimitsProfile(
+        max_range_length=10, max_container_length=10, max_sorted_length=10)
+    builtins = profile.builtins()
+    assert sorted(builtins) == [
+        '_binop_guard_', 'dict', 'list', 'pow', 'range', 'set', 'sorted',
+        'tuple']
+    with pytest.raises(ValueError):
+        builtins['range'](10)
+    assert builtins is not profile.builtins()
+
+
+def test_LimitsProfile__binop_budget():
+    profile = LimitsProfile(max_sequence_length=4)
+    with pytest.raises(ValueError):
+        profile.builtins()['_binop_guard_']('*', 'ab', 3)
+
+
+def test_LimitsProfile__builtins__2():
+    """It only replaces `set`, `dict` and `sorted` if their limit is set."""
+    builtins = LimitsProfile(max_sorted_length=10).builtins()
+    assert 'sorted' in builtins
+    assert 'set' not in builtins
+    assert 'dict' not in builtins
+
+
+def test_limited_builtins_keys_are_unchanged():
+    """By default only `_binop_guard_` and `pow` are added to the former
+    builtins."""
+    assert sorted(limited_builtins) == [
+        '_binop_guard_', 'list', 'pow', 'range', 'tuple']
+
+
+def test_limited_builtins_uses_default_profile():
+    assert sorted(limited_builtins) == sorted(LimitsProfile().builtins())
+    with pytest.raises(ValueError):
+        limited_builtins['range'](1000)
@@ -0,0 +1,127 @@
+from RestrictedPython import compile_restricted_eval
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import GuardedBinOpTransformer
+from RestrictedPython.Bundle import Bundle
+from RestrictedPython.Bundle import BundleError
+from RestrictedPython.Bundle import BundleWriter
+from RestrictedPython.Bundle import policy_fingerprint
+from RestrictedPython.transformer import RestrictingNodeTransformer
+
+import os
+import pytest
+import RestrictedPython.Bundle
+
+
+SCRIPTS = {
+    'scripts/add': 'result = a + 1',
+    'scripts/unused': 'result = _x',
+    u'scripts/\xfcnicode': 'result = 2 * a',
+}
+
+
+@pytest.fixture
+def path(tmpdir):
+    path = str(tmpdir.join('scripts.bundle'))
+    with BundleWriter(path) as writer:
+        writer.add('scripts/add', SCRIPTS['scripts/add'],
+                   compile_restricted_exec(SCRIPTS['scripts/add']))
+        source = SCRIPTS[u'scripts/\xfcnicode']
+        writer.add(u'scripts/\xfcnicode', source,
+                   compile_restricted_exec(source, u'scripts/\xfcnicode'),
+                   filename=u'scripts/\xfcnicode')
+        writer.add('expression', 'a * 2', compile_restricted_eval('a * 2'),
+                   mode='eval')
+    return path
+
+
+def test_Bundle__1(path):
+    """It returns the compiled code of the scripts by id."""
+    with Bundle(path) as bundle:
+        assert len(bundle) == 3
+        assert sorted(bundle.ids()) == sorted(
+            ['expression', 'scripts/add', u'scripts/\xfcnicode'])
+        assert 'scripts/add' in bundle
+        assert 'scripts/missing' not in bundle
+        result = bundle.get('scripts/add')
+        assert result.errors == ()
+        assert list(result.used_names) == ['a']
+        scope = {'a': 41}
+        exec(result.code, scope)
+        assert scope['result'] == 42
+        code = bundle.get(u'scripts/\xfcnicode').code
+        assert code.co_filename == u'scripts/\xfcnicode'
+        assert eval(bundle.get('expression').code, {'a': 3}) == 6
+        # Entries are unmarshalled only once.
+        assert bundle.get('scripts/add') is result
+        with pytest.raises(KeyError):
+            bundle.get('scripts/missing')
+
+
+def test_Bundle__2(path):
+    """It finds the id of a script by its source."""
+    with Bundle(path) as bundle:
+        assert bundle.find('result = a + 1') == 'scripts/add'
+        assert bundle.find('a * 2') == 'expression'
+        assert bundle.find('result = a + 2') is None
+
+
+def test_Bundle__3(path):
+    """It refuses entries compiled with another policy."""
+    with Bundle(path, policy=GuardedBinOpTransformer) as bundle:
+        with pytest.raises(BundleError) as err:
+            bundle.get('scripts/add')
+    assert 'another policy' in str(err.value)
+    with Bundle(path, policy=None) as bundle:
+        assert bundle.get('scripts/add').code is not None
+
+
+def test_Bundle__4(tmpdir):
+    """It refuses files which are no bundles."""
+    path = str(tmpdir.join('other'))
+    for content in (b'', b'x' * 100):
+        with open(path, 'wb') as f:
+            f.write(content)
+        with pytest.raises(BundleError):
+            Bundle(path)
+
+
+def test_BundleWriter__1(tmpdir):
+    """It refuses rejected scripts and duplicate ids."""
+    with BundleWriter(str(tmpdir.join('scripts.bundle'))) as writer:
+        with pytest.raises(ValueError) as err:
+            writer.add('unused', SCRIPTS['scripts/unused'],
+                       compile_restricted_exec(SCRIPTS['scripts/unused']))
+        assert '"_x" is an invalid variable name' in str(err.value)
+        writer.add('add', 'a + 1', compile_restricted_eval('a + 1'))
+        with pytest.raises(ValueError):
+            writer.add('add', 'a + 1', compile_restricted_eval('a + 1'))
+    assert len(Bundle(writer.path)) == 1
+
+
+def test_BundleWriter__2(path):
+    """It replaces the bundle only when the writing succeeded."""
+    bundle = Bundle(path)
+    with pytest.raises(RuntimeError):
+        with BundleWriter(path) as writer:
+            writer.add('other', 'a + 1', compile_restricted_eval('a + 1'))
+            raise RuntimeError()
+    assert os.listdir(os.path.dirname(path)) == ['scripts.bundle']
+    with BundleWriter(path) as writer:
+        writer.add('other', 'a + 1', compile_restricted_eval('a + 1'))
+    # An open bundle still reads the file it mapped.
+    assert len(bundle) == 3
+    assert bundle.get('scripts/add').code is not None
+    bundle.close()
+    with Bundle(path) as bundle:
+        assert list(bundle.ids()) == ['other']
+
+
+def test_policy_fingerprint__1(monkeypatch):
+    """It changes with the source of the modules of the policy."""
+    fingerprint = policy_fingerprint(RestrictingNodeTransformer)
+    assert fingerprint.startswith(
+        'RestrictedPython.transformer.RestrictingNodeTransformer sha256:')
+    monkeypatch.setattr(RestrictedPython.Bundle, '_fingerprints', {})
+    monkeypatch.setattr(
+        RestrictedPython.Bundle, '_module_digest', lambda name: 'changed')
+    assert policy_fingerprint(RestrictingNodeTransformer) != fingerprint
@@ -0,0 +1,81 @@
+from RestrictedPython.Eval import ExpressionCache
+from RestrictedPython.Executor import RestrictedExecutor
+from RestrictedPython.Guards import safe_builtins
+
+import pytest
+
+
+def _resolvers(calls):
+    def factory(name, value):
+        def resolve():
+            calls.append(name)
+            return value
+        return resolve
+
+    return {
+        'context': factory('context', 'the context'),
+        'request': factory('request', {'form': 'data'}),
+        'container': factory('container', 'the container'),
+    }
+
+
+def test_Executor__RestrictedExecutor__compile__1():
+    """It caches the code together with its free names."""
+    executor = RestrictedExecutor()
+    compiled = executor.compile('x = context\n[y for y in request]')
+    assert compiled.free_names == frozenset(['context', 'request'])
+    assert executor.compile('x = context\n[y for y in request]') is compiled
+    assert executor.cache.info().hits == 1
+
+
+def test_Executor__RestrictedExecutor__compile__2():
+    """It raises a SyntaxError if the source is not allowed."""
+    with pytest.raises(SyntaxError) as err:
+        RestrictedExecutor().compile('a._b')
+    assert '"_b" is an invalid attribute name' in str(err.value)
+
+
+def test_Executor__RestrictedExecutor__execute__1():
+    """It calls only the resolvers of names the code uses."""
+    calls = []
+    scope = RestrictedExecutor().execute(
+        'result = context + " in " + container',
+        {'__builtins__': safe_builtins},
+        _resolvers(calls))
+    assert scope['result'] == 'the context in the container'
+    assert sorted(calls) == ['container', 'context']
+
+
+def test_Executor__RestrictedExecutor__execute__2():
+    """It does not call resolvers of names already in the globals."""
+    calls = []
+    scope = RestrictedExecutor().execute(
+        'result = context',
+        {'__builtins__': safe_builtins, 'context': 'eager'},
+        _resolvers(calls))
+    assert scope['result'] == 'eager'
+    assert calls == []
+
+
+def test_Executor__RestrictedExecutor__evaluate__1():
+    """It evaluates expressions with resolved names."""
+    calls = []
+    executor = RestrictedExecutor(cache=ExpressionCache(maxsize=10))
+    result = executor.evaluate(
+        'request["form"]',
+        {'__builtins__': safe_builtins,
+         '_getitem_': lambda ob, key: ob[key]},
+        _resolvers(calls))
+    assert result == 'data'
+    assert calls == ['request']
+
+
+def test_Executor__RestrictedExecutor__execute__3():
+    """It resolves names the script reads before assigning them."""
+    calls = []
+    scope = RestrictedExecutor().execute(
+        'context = context + "!"',
+        {'__builtins__': safe_builtins},
+        _resolvers(calls))
+    assert scope['context'] == 'the context!'
+    assert calls == ['context']
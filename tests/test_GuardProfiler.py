@@ -0,0 +1,91 @@
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import safe_builtins
+from RestrictedPython.GuardProfiler import GuardProfiler
+from RestrictedPython.Guards import guarded_iter_unpack_sequence
+from RestrictedPython.Guards import safer_getattr
+
+import json
+
+
+SOURCE = """\
+total = 0
+for a, b in pairs:
+    total = total + a.real
+    total = total + b.imag
+result = items[0]
+"""
+
+
+def _globals():
+    return {
+        '__builtins__': dict(safe_builtins, _getattr_=safer_getattr),
+        '_getitem_': lambda ob, index: ob[index],
+        '_getiter_': iter,
+        '_iter_unpack_sequence_': guarded_iter_unpack_sequence,
+        'pairs': [(1, 2j), (3, 4j)],
+        'items': ['first'],
+    }
+
+
+def _run(profiler):
+    code = compile_restricted_exec(SOURCE, filename='<script>').code
+    scope = profiler.wrap(_globals())
+    exec(code, scope)
+    return scope
+
+
+def test_GuardProfiler__1():
+    """It counts the guard calls per line of the restricted code."""
+    profiler = GuardProfiler(filename='<script>')
+    scope = _run(profiler)
+    assert scope['total'] == 10
+    assert scope['result'] == 'first'
+    calls = dict(
+        ((item['guard'], item['lineno']), item['calls'])
+        for item in profiler.dump())
+    assert calls == {
+        ('_iter_unpack_sequence_', 2): 1,
+        # `_getiter_` is called by `guarded_iter_unpack_sequence`.
+        ('_getiter_', 2): 3,
+        ('_getattr_', 3): 2,
+        ('_getattr_', 4): 2,
+        ('_getitem_', 5): 1,
+    }
+    for item in profiler.dump():
+        assert item['filename'] == '<script>'
+        assert item['time'] >= 0
+
+
+def test_GuardProfiler__2():
+    """It returns the globals unchanged if it is disabled."""
+    profiler = GuardProfiler(enabled=False)
+    scope = _globals()
+    assert profiler.wrap(scope) is scope
+    _run(profiler)
+    assert profiler.dump() == []
+
+
+def test_GuardProfiler__3():
+    """It stops recording if it is disabled after wrapping."""
+    profiler = GuardProfiler()
+    wrapped = profiler.wrap({'_getitem_': lambda ob, index: ob[index]})
+    assert wrapped['_getitem_']([1], 0) == 1
+    profiler.enabled = False
+    assert wrapped['_getitem_']([1], 0) == 1
+    assert [item['calls'] for item in profiler.dump()] == [1]
+    assert profiler.dump()[0]['filename'] == __file__.replace('.pyc', '.py')
+
+
+def test_GuardProfiler__report__1(tmpdir):
+    """It reports the guards and lines, and dumps them as JSON."""
+    profiler = GuardProfiler(filename='<script>')
+    _run(profiler)
+    report = profiler.report()
+    assert report.splitlines()[0].split() == ['guard', 'calls', 'ms']
+    assert '<script>:3' in report
+    path = str(tmpdir.join('guards.json'))
+    profiler.dump_json(path)
+    with open(path) as f:
+        assert len(json.load(f)) == 5
+    profiler.reset()
+    assert profiler.dump() == []
@@ -1,6 +1,8 @@
 from RestrictedPython import compile_restricted_exec
 from RestrictedPython._compat import IS_PY2
 from RestrictedPython._compat import IS_PY3
+from RestrictedPython.Guards import freeze_builtins
+from RestrictedPython.Guards import GlobalsFactory
 from RestrictedPython.Guards import guarded_unpack_sequence
 from RestrictedPython.Guards import safe_builtins
 from RestrictedPython.Guards import safe_globals
@@ -254,3 +256,53 @@ def test_safer_getattr__underscore_name():
     assert (
         '"__class__" is an invalid attribute name because it starts with "_"'
         == str(err.value))
+
+
+CLASS_DEFINITION = """
+class Counter:
+    value = 0
+
+counter = Counter()
+counter.value = len(values)
+result = counter.value
+"""
+
+
+def test_Guards__GlobalsFactory__1():
+    """It creates separate globals sharing the builtins."""
+    factory = GlobalsFactory(
+        _getattr_=safer_getattr, _write_=_write_, __metaclass__=type,
+        __name__='restricted')
+    code = compile_restricted_exec(CLASS_DEFINITION).code
+    scope1 = factory(values=[1, 2])
+    scope2 = factory(values=[3])
+    exec(code, scope1)
+    exec(code, scope2)
+    assert scope1['result'] == 2
+    assert scope2['result'] == 1
+    assert scope1['__builtins__'] is scope2['__builtins__']
+    assert 'result' not in factory()
+
+
+def test_Guards__GlobalsFactory__2():
+    """The created globals allow to import modules."""
+    factory = GlobalsFactory(
+        dict(safe_builtins, __import__=__import__), _getattr_=safer_getattr)
+    scope = factory()
+    exec(compile_restricted_exec('import math\nresult = math.floor(2.5)').code,
+         scope)
+    assert scope['result'] == 2
+
+
+def test_Guards__freeze_builtins__1():
+    """It returns an exact dict copying the builtins."""
+    builtins = freeze_builtins(safe_builtins)
+    assert builtins == safe_builtins
+    assert builtins is not safe_builtins
+    # CPython only looks up builtins fast in an exact dict:
+    assert type(builtins) is dict
+    # Restricted code can not reach the builtins to change them:
+    result = compile_restricted_exec('__builtins__["len"] = None')
+    assert result.errors == (
+        'Line 1: "__builtins__" is an invalid variable name because it '
+        'starts with "_"',)
@@ -0,0 +1,164 @@
+from RestrictedPython.Eval import RestrictionCapableEval
+from RestrictedPython.Interpreter import ExpressionInterpreter
+from RestrictedPython.Interpreter import interpret
+from RestrictedPython.Interpreter import NotInterpretable
+from RestrictedPython.transformer import RestrictingNodeTransformer
+
+import ast
+import pytest
+
+
+def _restricted_tree(expr):
+    tree = ast.parse(expr, '<string>', 'eval')
+    errors = []
+    RestrictingNodeTransformer(errors, [], {}).visit(tree)
+    assert errors == []
+    return tree
+
+
+def _scope():
+    calls = []
+
+    def _getattr_(ob, name):
+        calls.append(('getattr', name))
+        return getattr(ob, name)
+
+    def _getitem_(ob, index):
+        calls.append(('getitem', index))
+        return ob[index]
+
+    return calls, {
+        '_getattr_': _getattr_,
+        '_getitem_': _getitem_,
+        '__builtins__': {'len': len, 'max': max, 'abs': abs,
+                         'slice': slice},
+        'a': 3,
+        'b': -4.5,
+        's': 'text',
+        'items': [1, 2, 3],
+        'mapping': {'key': 'value'},
+    }
+
+
+@pytest.mark.parametrize('expr', [
+    'a + 1',
+    'a * b - a // 2 % 2 ** 3',
+    '-a < ~a <= +a',
+    'not a and b or s',
+    'a or b and s',
+    '0 < a < 2',
+    '1 < a < 5 > 4',
+    'a if b else s',
+    '(a, [b, s], {a, 1}, {"a": a, s: b})',
+    's.upper() + s.replace("t", "T")',
+    'items[0] + items[-1] + len(items[1:]) + len(items[::2])',
+    'mapping["key"] in s or "ex" in s',
+    'a is None or a is not None',
+    'max(a, b, key=abs)',
+    'a & 1 | a ^ 2 << 1 >> 1',
+    '"%s" % a',
+    'b"bytes"',
+])
+def test_Interpreter__interpret__1(expr):
+    """It gives the same results as the compiled code, calling the guards."""
+    calls, scope = _scope()
+    result = interpret(_restricted_tree(expr), scope)
+    interpreted_calls = list(calls)
+    del calls[:]
+    code = compile(_restricted_tree(expr), '<string>', 'eval')
+    assert result == eval(code, scope)
+    assert interpreted_calls == calls
+
+
+def test_Interpreter__interpret__2():
+    """It calls the guards for attribute and item access."""
+    calls, scope = _scope()
+    assert interpret(_restricted_tree('s.upper()[1:]'), scope) == 'EXT'
+    assert calls == [('getattr', 'upper'), ('getitem', slice(1, None))]
+
+
+@pytest.mark.parametrize('expr', [
+    '[x for x in items]',
+    'len(*items)',
+    'max(**mapping)',
+    '{**mapping}',
+    '(lambda: 1)()',
+])
+def test_Interpreter__ExpressionInterpreter__1(expr):
+    """It raises `NotInterpretable` for unsupported nodes."""
+    with pytest.raises(NotInterpretable):
+        ExpressionInterpreter(_restricted_tree(expr))
+
+
+def test_Interpreter__ExpressionInterpreter__2():
+    """It evaluates nothing if the expression is not interpretable."""
+    calls, scope = _scope()
+    tree = _restricted_tree('s.upper() + [x for x in s]')
+    with pytest.raises(NotInterpretable):
+        interpret(tree, scope)
+    assert calls == []
+
+
+def test_Interpreter__ExpressionInterpreter__3():
+    """It looks up names in the global scope and its `__builtins__`."""
+    interpreter = ExpressionInterpreter(_restricted_tree('len(name)'))
+    assert interpreter({'name': 'abc', '__builtins__': {'len': len}}) == 3
+    assert interpreter({'name': 'abc'}) == 3
+    with pytest.raises(NameError) as err:
+        interpreter({'name': 'abc', '__builtins__': {}})
+    assert str(err.value) == "name 'len' is not defined"
+    with pytest.raises(NameError):
+        interpreter({'__builtins__': {'len': len}})
+
+
+@pytest.fixture
+def clear_cache():
+    RestrictionCapableEval.cache.clear()
+    yield
+    RestrictionCapableEval.cache.clear()
+
+
+def test_Interpreter__RestrictionCapableEval__1(clear_cache):
+    """It interprets a cold expression and compiles it once it is hot."""
+    ob = RestrictionCapableEval('a + b')
+    for i in range(ob.compile_threshold):
+        assert ob.eval({'a': i, 'b': 1}) == i + 1
+        assert ob.rcode is None
+        assert ob.interpreter is not None
+    assert ob.eval({'a': 1, 'b': 1}) == 2
+    assert ob.rcode is not None
+    assert ob.interpreter is None
+    assert ob.rtree is None
+    assert RestrictionCapableEval('a + b').rcode is ob.rcode
+
+
+def test_Interpreter__RestrictionCapableEval__2(clear_cache):
+    """It compiles right away expressions which are not interpretable."""
+    ob = RestrictionCapableEval('[x * 2 for x in a]')
+    assert ob.eval({'a': [1, 2]}) == [2, 4]
+    assert ob.rcode is not None
+    assert ob.interpreter is None
+
+
+def test_Interpreter__RestrictionCapableEval__3(clear_cache):
+    """It compiles right away if `interpret_max_length` is exceeded."""
+
+    class Compiled(RestrictionCapableEval):
+        interpret_max_length = None
+
+    class Short(RestrictionCapableEval):
+        interpret_max_length = 4
+
+    for klass, compiled in ((Compiled, True), (Short, True),
+                            (RestrictionCapableEval, False)):
+        RestrictionCapableEval.cache.clear()
+        ob = klass('a + 1')
+        assert ob.eval({'a': 1}) == 2
+        assert (ob.rcode is not None) is compiled
+
+
+def test_Interpreter__RestrictionCapableEval__4(clear_cache):
+    """It raises the SyntaxError of the policy when interpreting."""
+    ob = RestrictionCapableEval('a._b')
+    with pytest.raises(SyntaxError):
+        ob.eval({'a': 1})
@@ -0,0 +1,91 @@
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import GlobalsFactory
+from RestrictedPython import safe_globals
+from RestrictedPython.Parallel import available_backends
+from RestrictedPython.Parallel import ParallelExecutor
+
+import pytest
+
+
+def make_globals():
+    return dict(safe_globals, _getiter_=iter)
+
+
+make_safe_globals = GlobalsFactory(_getiter_=iter)
+
+
+SCRIPT = """\
+total = 0
+for value in values:
+    total = total + value
+"""
+
+
+@pytest.fixture(params=available_backends())
+def executor(request):
+    with ParallelExecutor(make_globals, workers=2,
+                          backend=request.param) as executor:
+        yield executor
+
+
+def test_ParallelExecutor__submit__1(executor):
+    """It runs the compiled code in the workers and returns the results."""
+    result = compile_restricted_exec(SCRIPT)
+    futures = [executor.submit(result, {'values': range(i)}, ['total'])
+               for i in range(5)]
+    assert [future.result() for future in futures] == [
+        {'total': 0}, {'total': 0}, {'total': 1}, {'total': 3}, {'total': 6}]
+
+
+def test_ParallelExecutor__submit__2(executor):
+    """It raises the exception of the script."""
+    code = compile_restricted_exec('values = 1 / 0').code
+    with pytest.raises(ZeroDivisionError):
+        executor.submit(code).result()
+    future = executor.submit(
+        compile_restricted_exec('found = "values" in dir()').code,
+        result_names=['found'])
+    with pytest.raises(NameError):
+        # `dir` is not a safe builtin.
+        future.result()
+
+
+def test_ParallelExecutor__submit__3(executor):
+    """It rejects a `CompileResult` with errors."""
+    with pytest.raises(SyntaxError) as err:
+        executor.submit(compile_restricted_exec('_x = 1'))
+    assert err.value.msg == (
+        'Line 1: "_x" is an invalid variable name because it starts with '
+        '"_"')
+
+
+def test_ParallelExecutor__1():
+    """It imports a globals factory given by dotted name in the workers."""
+    with ParallelExecutor('tests.test_Parallel.make_safe_globals', workers=1,
+                          backend='processes') as executor:
+        future = executor.submit(
+            compile_restricted_exec('x = len("ab")').code, result_names=['x'])
+        assert future.result(timeout=10) == {'x': 2}
+        assert future.done()
+        # The builtins are restricted:
+        future = executor.submit(compile_restricted_exec('x = dir()').code)
+        with pytest.raises(NameError):
+            future.result(timeout=10)
+
+
+def test_ParallelExecutor__2():
+    """It rejects unknown backends."""
+    with pytest.raises(ValueError) as err:
+        ParallelExecutor(make_globals, backend='threads')
+    assert str(err.value).startswith("Backend 'threads' is not available")
+
+
+def test_ParallelExecutor__3():
+    """It rejects globals without `__builtins__`."""
+    with ParallelExecutor('collections.OrderedDict', workers=1,
+                          backend='processes') as executor:
+        future = executor.submit(compile_restricted_exec('x = 2').code)
+        with pytest.raises(ValueError) as err:
+            future.result(timeout=10)
+    assert str(err.value) == (
+        'The globals factory has to provide "__builtins__".')
@@ -0,0 +1,63 @@
+from RestrictedPython import CheckpointTransformer
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython.Scheduler import Scheduler
+
+
+SCRIPT = """\
+for i in range(3):
+    log.append(name)
+"""
+
+
+def _add(scheduler, source, **glb):
+    code = compile_restricted_exec(source, policy=CheckpointTransformer).code
+    glb.update(_getiter_=iter, _getattr_=getattr, range=range)
+    return scheduler.add(code, glb, name=glb.get('name'))
+
+
+def test_Scheduler__1():
+    """It interleaves the scripts at the checkpoints."""
+    log = []
+    scheduler = Scheduler(time_slice=0)
+    tasks = [_add(scheduler, SCRIPT, log=log, name=name) for name in 'ab']
+    assert log == []
+    scheduler.run()
+    assert log == ['a', 'b', 'a', 'b', 'a', 'b']
+    for task in tasks:
+        assert task.done
+        assert task.exception is None
+        assert task.checkpoints == 4
+        assert task.global_scope['i'] == 2
+
+
+def test_Scheduler__2():
+    """It starts at most `max_in_flight` scripts at once."""
+    log = []
+    scheduler = Scheduler(time_slice=0, max_in_flight=2)
+    for name in 'abc':
+        _add(scheduler, SCRIPT, log=log, name=name)
+    scheduler.run()
+    assert log == ['a', 'b', 'a', 'b', 'a', 'b', 'c', 'c', 'c']
+
+
+def test_Scheduler__3():
+    """It runs a script for its time slice before switching."""
+    log = []
+    scheduler = Scheduler(time_slice=60)
+    for name in 'ab':
+        _add(scheduler, SCRIPT, log=log, name=name)
+    scheduler.run()
+    assert log == ['a', 'a', 'a', 'b', 'b', 'b']
+
+
+def test_Scheduler__4():
+    """It stores the exception of a failing script and runs the others."""
+    log = []
+    scheduler = Scheduler(time_slice=0)
+    failing = _add(scheduler, 'for i in [1, 0]:\n    x = 1 / i', name='fail')
+    task = _add(scheduler, SCRIPT, log=log, name='a')
+    scheduler.run()
+    assert isinstance(failing.exception, ZeroDivisionError)
+    assert failing.done
+    assert task.exception is None
+    assert log == ['a', 'a', 'a']
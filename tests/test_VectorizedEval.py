@@ -0,0 +1,213 @@
+from RestrictedPython.VectorizedEval import VectorizedEval
+
+import math
+import pytest
+import RestrictedPython.VectorizedEval
+
+
+try:
+    import builtins
+except ImportError:  # pragma: no cover
+    # Python 2
+    import __builtin__ as builtins
+
+numpy = pytest.importorskip('numpy')
+
+
+def _row_wise(expr, columns, globals=None):
+    ob = VectorizedEval(expr)
+    if globals is not None:
+        ob.globals = globals
+    vectorize = RestrictedPython.VectorizedEval.numpy
+    RestrictedPython.VectorizedEval.numpy = None
+    try:
+        return ob.eval_columns(columns)
+    finally:
+        RestrictedPython.VectorizedEval.numpy = vectorize
+
+
+def _check(expr, columns, vectorized=True, globals=None):
+    """Evaluate vectorized and compare with the row by row results."""
+    ob = VectorizedEval(expr)
+    if globals is not None:
+        ob.globals = globals
+    result = ob.eval_columns(columns)
+    assert ob.vectorized is vectorized
+    expected = _row_wise(expr, columns, globals)
+    # `repr` compares floats exactly and treats nan as equal.
+    assert repr(result) == repr(expected)
+    assert [type(value) for value in result] == \
+        [type(value) for value in expected]
+    return result
+
+
+def test_VectorizedEval__arithmetic():
+    columns = {
+        'price': numpy.array([1.5, 2.0, 3.25]),
+        'qty': numpy.array([1, 2, 3]),
+        'discount': 1,
+    }
+    assert _check('price * qty - discount', columns) == [0.5, 3.0, 8.75]
+    assert _check('qty * 2 + discount', columns) == [3, 5, 7]
+    assert _check('qty / 2', columns) == [0.5, 1.0, 1.5]
+    assert _check('-qty // 2', columns) == [-1, -1, -2]
+    assert _check('-qty % 2', columns) == [1, 0, 1]
+    assert _check('-price % 2', columns) == [0.5, 0.0, 0.75]
+    assert _check('qty ** 2 + +qty', columns) == [2, 6, 12]
+    assert _check('price ** 0.5', columns) == [
+        x ** 0.5 for x in (1.5, 2, 3.25)]
+
+
+def test_VectorizedEval__comparisons_and_boolean_operations():
+    columns = {
+        'a': numpy.array([0, 1, 2, 3]),
+        'b': [0.0, 1.5, 2.0, float('nan')],
+        'flag': numpy.array([True, False, True, False]),
+    }
+    assert _check('a < b', columns) == [False, True, False, False]
+    assert _check('0 < a <= 2', columns) == [False, True, True, False]
+    assert _check('a == b or not flag', columns) == [True, True, True, True]
+    assert _check('a and a + 1', columns) == [0, 2, 3, 4]
+    assert _check('b or 7.0', columns)[:3] == [7.0, 1.5, 2.0]
+    assert _check('flag + flag', columns) == [2, 0, 2, 0]
+    assert _check('-flag', columns) == [-1, 0, -1, 0]
+
+
+def test_VectorizedEval__math_functions():
+    columns = {'x': numpy.array([-4.0, 0.0, 2.0]), 'n': [-1, 0, 3]}
+    glb = {'__builtins__': {'abs': abs}, 'math': math, '_getattr_': getattr}
+    assert _check('abs(n)', columns, globals=glb) == [1, 0, 3]
+    assert _check('math.sqrt(abs(x))', columns, globals=glb) == [
+        2.0, 0.0, 2.0 ** 0.5]
+    assert _check('math.fabs(n)', columns, globals=glb) == [1.0, 0.0, 3.0]
+
+
+def test_VectorizedEval__dtypes():
+    columns = {
+        'f32': numpy.array([0.1, 0.2], dtype=numpy.float32),
+        'u8': numpy.array([250, 255], dtype=numpy.uint8),
+        'i8': numpy.array([127, -128], dtype=numpy.int8),
+    }
+    _check('f32 * 3', columns)
+    assert _check('u8 + 10', columns) == [260, 265]
+    assert _check('i8 * 2', columns) == [254, -256]
+
+
+def test_VectorizedEval__falls_back_on_int_overflow():
+    columns = {'a': numpy.array([2 ** 62, 1])}
+    assert _check('a * 4', columns, vectorized=False) == [2 ** 64, 4]
+    assert _check('a ** 2', columns, vectorized=False) == [2 ** 124, 1]
+    assert _check('a + 2 ** 70', columns, vectorized=False)
+
+
+def test_VectorizedEval__falls_back_on_inexact_results():
+    columns = {
+        'big': numpy.array([2 ** 53 + 1, 3]),
+        'a': numpy.array([1, 2]),
+        'b': numpy.array([1.0, 2.5]),
+    }
+    _check('big == 2.0 ** 53', columns, vectorized=False)
+    _check('big / 3', columns, vectorized=False)
+    _check('a ** -1', columns, vectorized=False)
+    _check('a and b', columns, vectorized=False)
+    _check('a.real', columns, vectorized=False,
+           globals={'__builtins__': None, '_getattr_': getattr})
+    _check('[x for x in (a, b)]', columns, vectorized=False)
+
+
+def test_VectorizedEval__falls_back_before_errors():
+    columns = {'a': numpy.array([1.0, 0.0]), 'n': numpy.array([1, -1])}
+    ob = VectorizedEval('1 / a')
+    with pytest.raises(ZeroDivisionError):
+        ob.eval_columns(columns)
+    assert ob.vectorized is False
+    with pytest.raises(ZeroDivisionError):
+        VectorizedEval('0.0 ** n').eval_columns(columns)
+    with pytest.raises(OverflowError):
+        VectorizedEval('10.0 ** (a * 400)').eval_columns(columns)
+    glb = {'math': math, '_getattr_': getattr}
+    ob = VectorizedEval('math.sqrt(n)')
+    ob.globals = glb
+    with pytest.raises(ValueError):
+        ob.eval_columns(columns)
+
+
+def test_VectorizedEval__mixed_array_likes_are_not_vectorized():
+    assert _check('a / 2', {'a': [1, 2.0]}, vectorized=False) == [0.5, 1.0]
+
+
+def test_VectorizedEval__scalars_and_lengths():
+    assert _check('a + 1', {'a': 1}) == [2]
+    assert _check('a + 1', {'a': numpy.array([], dtype=int)},
+                  vectorized=False) == []
+    with pytest.raises(ValueError):
+        VectorizedEval('a + b').eval_columns({'a': [1], 'b': [1, 2]})
+
+
+def test_VectorizedEval__unknown_names_behave_like_eval():
+    ob = VectorizedEval('a + b')
+    ob.globals = {'__builtins__': {}}
+    with pytest.raises(NameError):
+        ob.eval_columns({'a': numpy.array([1, 2])})
+
+
+def test_VectorizedEval__checks_the_expression_once():
+    ob = VectorizedEval('a * 2')
+    assert ob.eval_columns({'a': numpy.array([1, 2])}) == [2, 4]
+    tree = ob._vectorized_tree
+    assert tree is not None
+    assert ob.eval_columns({'a': numpy.array([3])}) == [6]
+    assert ob._vectorized_tree is tree
+
+
+def test_VectorizedEval__more_vectorized_operations():
+    columns = {
+        'a': numpy.array([-1, 0, 1]),
+        'b': numpy.array([3, 2, 1]),
+        'flag': numpy.array([True, False, True]),
+        'scalar': numpy.int64(3),
+    }
+    assert _check('a - b', columns) == [-4, -2, 0]
+    assert _check('a ** b', columns) == [-1, 0, 1]
+    assert _check('a + True', columns) == [0, 1, 2]
+    assert _check('flag == flag', columns) == [True, True, True]
+    assert _check('a * scalar', columns) == [-3, 0, 3]
+    glb = {'__builtins__': builtins}
+    assert _check('abs(a)', columns, globals=glb) == [1, 0, 1]
+
+
+def test_VectorizedEval__falls_back_on_unsupported_columns():
+    _check('a * 2', {'a': 'ab'}, vectorized=False)
+    _check('a * 2', {'a': numpy.array(['x', 'y'])}, vectorized=False)
+    _check('a * 2', {'a': numpy.array([1 + 2j])}, vectorized=False)
+    _check('a * 2', {'a': numpy.array([[1, 2], [3, 4]])}, vectorized=False)
+    assert _check('a + 0', {'a': numpy.array([2 ** 64 - 1, 1],
+                                             dtype=numpy.uint64)},
+                  vectorized=False) == [2 ** 64 - 1, 1]
+
+
+def test_VectorizedEval__falls_back_on_unsupported_operations():
+    columns = {
+        'a': numpy.array([1, 2]),
+        'b': numpy.array([-4.0, 1.0]),
+    }
+    glb = {'__builtins__': {'round': round}}
+    _check('b ** 0.5', columns, vectorized=False)
+    _check("a * 'x'", columns, vectorized=False)
+    _check('round(b, ndigits=1)', columns, vectorized=False, globals=glb)
+    _check('round(b)', columns, vectorized=False, globals=glb)
+    _check('a << 1', columns, vectorized=False)
+    _check('~a', columns, vectorized=False)
+    _check('a is None', columns, vectorized=False)
+    assert _check('2 << 1', {}, vectorized=False) == [4]
+
+
+def test_VectorizedEval__falls_back_before_call_errors():
+    columns = {'a': numpy.array([1, 2])}
+    glb = {'__builtins__': {'abs': abs}}
+    for expr in ('a(1)', 'abs(a, a)'):
+        ob = VectorizedEval(expr)
+        ob.globals = glb
+        with pytest.raises(TypeError):
+            ob.eval_columns(columns)
+        assert ob.vectorized is False
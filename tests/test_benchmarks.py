@@ -0,0 +1,72 @@
+from benchmarks.compile_throughput import _compile_restricted
+from benchmarks.compile_throughput import main
+from benchmarks.corpus import CORPUS
+from benchmarks.globals_setup import run as run_globals_setup
+from benchmarks.parallel_scaling import run as run_parallel_scaling
+from benchmarks.runtime_overhead import run
+from benchmarks.runtime_overhead import WORKLOADS
+from RestrictedPython import RestrictingNodeTransformer
+
+import json
+import pytest
+
+
+@pytest.mark.parametrize('name', sorted(CORPUS))
+def test_benchmarks__corpus__1(name):
+    """The corpus compiles without errors in all its modes."""
+    source, modes = CORPUS[name]
+    for mode in modes:
+        result = _compile_restricted(source, mode, RestrictingNodeTransformer)
+        assert result.errors == ()
+
+
+def test_benchmarks__compile_throughput__main__1(tmpdir, capsys):
+    """It writes the timings of each phase as JSON."""
+    path = str(tmpdir.join('results.json'))
+    main(['--filter', 'tales_expression_0', '--number', '1', '--repeat', '1',
+          '--json', path])
+    assert 'tales_expression_0' in capsys.readouterr()[0]
+    with open(path) as f:
+        data = json.load(f)
+    assert data['benchmark'] == 'compile_throughput'
+    assert [(result['case'], result['mode'])
+            for result in data['results']] == [
+        ('tales_expression_0', 'eval'), ('tales_expression_0', 'exec')]
+    for result in data['results']:
+        for phase in ('parse', 'transform', 'compile', 'total'):
+            assert result[phase] > 0
+
+
+def test_benchmarks__runtime_overhead__run__1():
+    """It measures all workloads restricted and unrestricted."""
+    data = run(size=10, number=1, repeat=1)
+    assert data['benchmark'] == 'runtime_overhead'
+    assert sorted(result['workload'] for result in data['results']) == \
+        sorted(WORKLOADS)
+    for result in data['results']:
+        assert result['slowdown'] == \
+            result['restricted'] / result['unrestricted']
+
+
+def test_benchmarks__parallel_scaling__run__1():
+    """It measures the workloads with an increasing number of threads."""
+    data = run_parallel_scaling(max_threads=3, scale=0.02)
+    assert data['benchmark'] == 'parallel_scaling'
+    assert [(result['workload'], result['threads'])
+            for result in data['results']] == [
+        ('compile', 1), ('compile', 2), ('compile', 3),
+        ('eval', 1), ('eval', 2), ('eval', 3),
+        ('exec', 1), ('exec', 2), ('exec', 3)]
+    for result in data['results']:
+        assert result['efficiency'] == result['speedup'] / result['threads']
+
+
+def test_benchmarks__globals_setup__run__1():
+    """It measures each way to create the globals of an execution."""
+    data = run_globals_setup(number=10, repeat=1)
+    assert data['benchmark'] == 'globals_setup'
+    assert [result['workload'] for result in data['results']] == [
+        'call', 'loop']
+    for result in data['results']:
+        assert result['speedup'] == result['copy'] / result['factory']
+        assert result['shared'] > 0
@@ -1,13 +1,18 @@
 from RestrictedPython import compile_restricted
 from RestrictedPython import compile_restricted_eval
 from RestrictedPython import compile_restricted_exec
+from RestrictedPython import compile_restricted_expressions
+from RestrictedPython import compile_restricted_function
 from RestrictedPython import compile_restricted_single
 from RestrictedPython import CompileResult
 from RestrictedPython._compat import IS_PY2
 from RestrictedPython._compat import IS_PY3
 from RestrictedPython._compat import IS_PY38_OR_GREATER
+from RestrictedPython.transformer import AsyncTransformer
+from RestrictedPython.transformer import RestrictingNodeTransformer
 from tests.helper import restricted_eval
 
+import ast
 import platform
 import pytest
 import types
@@ -153,6 +158,14 @@ def test_compile__compile_restricted_eval__used_names():
     assert result.used_names == {'a': True, 'b': True, 'x': True, 'func': True}
 
 
+def test_compile__compile_restricted_eval__ast():
+    """It accepts an already parsed `ast.Expression`."""
+    result = compile_restricted_eval(ast.parse('a * 6', mode='eval'))
+    assert result.errors == ()
+    assert result.used_names == {'a': True}
+    assert eval(result.code, {'a': 4}) == 24
+
+
 def test_compile__compile_restricted_csingle():
     """It compiles code as an Interactive."""
     result = compile_restricted_single('4 * 6')
@@ -229,3 +242,166 @@ def test_compile_CPython_warning(recwarn, mocker):  # pragma: no cover
         'RestrictedPython is only supported on CPython: use on other Python '
         'implementations may create security issues.'
     )
+
+
+STATS_SOURCE = """
+for a, b in c:
+    d = e.f[g]
+    h += 1
+"""
+
+
+def test_compile__compile_restricted_exec__stats__1():
+    """It collects stats of the phases and injected guards on request."""
+    result = compile_restricted_exec(STATS_SOURCE, stats=True)
+    assert result.errors == ()
+    stats = result.stats
+    assert stats.parse_time > 0
+    assert stats.transform_time > 0
+    assert stats.compile_time > 0
+    assert stats.node_count == \
+        len(list(ast.walk(ast.parse(STATS_SOURCE))))
+    assert stats.guard_counts['_getattr_'] == 1
+    assert stats.guard_counts['_getitem_'] == 1
+    assert stats.guard_counts['_inplacevar_'] == 1
+    assert stats.guard_counts['_iter_unpack_sequence_'] == 1
+    assert stats.guard_counts['_write_'] == 0
+
+
+def test_compile__compile_restricted_exec__stats__2():
+    """`stats` is the last field of `CompileResult` with a default."""
+    result = compile_restricted_exec('a = 1', stats=True)
+    code, errors, warnings, used_names = result[:4]
+    assert result == (code, errors, warnings, used_names, result.stats)
+    assert compile_restricted_exec('a = 1').stats is None
+    assert result._replace(errors=()).stats is result.stats
+    assert CompileResult(code, (), [], {}).stats is None
+    assert not hasattr(result, '__dict__')
+
+
+def test_compile__compile_restricted_function__stats__1():
+    """It collects stats for functions and for syntax errors."""
+    result = compile_restricted_function('a', 'return a[0]', 'f', stats=True)
+    assert result.stats.parse_time > 0
+    assert result.stats.guard_counts['_getitem_'] == 1
+    result = compile_restricted_function('', 'return )', 'f', stats=True)
+    assert result.errors != ()
+    assert result.stats.node_count == 0
+    assert result.stats.guard_counts == {}
+
+
+TEMPLATE_EXPRESSIONS = [
+    'a + 1',
+    '_a',
+    '[i * 2 for i in\n range(a)]',
+    'a +',
+    '(a,\n _b)',
+    'a + 1',
+    '1 / 0',
+]
+
+
+def test_compile__compile_restricted_expressions__1():
+    """It compiles the expressions into one code object of functions."""
+    result = compile_restricted_expressions(TEMPLATE_EXPRESSIONS)
+    assert result.expressions == (
+        'a + 1', '[i * 2 for i in\n range(a)]', '1 / 0')
+    assert sorted(result.used_names) == ['a', 'i', 'range']
+    functions = result.bind({'a': 3, '_getiter_': iter, 'range': range})
+    assert sorted(functions) == sorted(result.expressions)
+    assert functions['a + 1']() == 4
+    assert functions['[i * 2 for i in\n range(a)]']() == [0, 2, 4]
+    # The expressions are on consecutive lines of the code.
+    with pytest.raises(ZeroDivisionError) as err:
+        functions['1 / 0']()
+    assert err.traceback[-1].lineno + 1 == 4
+
+
+def test_compile__compile_restricted_expressions__2():
+    """It reports the errors per expression with relative line numbers."""
+    result = compile_restricted_expressions(TEMPLATE_EXPRESSIONS)
+    assert result.errors == {
+        '_a': ('Line 1: "_a" is an invalid variable name because it '
+               'starts with "_"',),
+        'a +': ("Line 1: SyntaxError: invalid syntax at statement: 'a +'",),
+        '(a,\n _b)': ('Line 2: "_b" is an invalid variable name because it '
+                      'starts with "_"',),
+    }
+
+
+def test_compile__compile_restricted_expressions__3():
+    """It returns no code if no expression compiles."""
+    result = compile_restricted_expressions(['_a'])
+    assert result.code is None
+    assert result.bind({}) == {}
+    with pytest.raises(TypeError):
+        compile_restricted_expressions(['a'], policy=None)
+
+
+def test_compile__compile_restricted_expressions__4():
+    """It rejects `yield` and `await` like `compile_restricted_eval`."""
+    expressions = [
+        '(yield 1)', '(a,\n (yield from b))', 'lambda x=(yield): x',
+        'lambda: (yield)', 'a']
+    result = compile_restricted_expressions(expressions)
+    assert result.errors == {
+        '(yield 1)': (
+            "Line 1: SyntaxError: 'yield' outside function at statement: "
+            "'(yield 1)'",),
+        '(a,\n (yield from b))': (
+            "Line 2: SyntaxError: 'yield' outside function at statement: "
+            "'(yield from b))'",),
+        'lambda x=(yield): x': (
+            "Line 1: SyntaxError: 'yield' outside function at statement: "
+            "'lambda x=(yield): x'",),
+    }
+    assert result.expressions == ('lambda: (yield)', 'a')
+    result = compile_restricted_expressions(
+        ['await a'], policy=AsyncTransformer)
+    assert result.errors == {
+        'await a': (
+            "Line 1: SyntaxError: 'await' outside function at statement: "
+            "'await a'",)}
+
+
+def test_compile__compile_restricted_expressions__5():
+    """It reports errors of `compile()` for the expression causing them."""
+    expressions = ['a', '(a,\n lambda b, b: 0)', 'a + 1', '[b, b]']
+    result = compile_restricted_expressions(expressions)
+    assert result.errors == {
+        '(a,\n lambda b, b: 0)': (
+            "Line 2: SyntaxError: duplicate argument 'b' in function "
+            "definition at statement: 'lambda b, b: 0)'",),
+    }
+    assert result.expressions == ('a', 'a + 1', '[b, b]')
+    assert sorted(result.used_names) == ['a', 'b']
+    functions = result.bind({'a': 1, 'b': 2})
+    assert functions['a + 1']() == 2
+    assert functions['[b, b]']() == [2, 2]
+
+
+def test_compile__compile_restricted_expressions__6():
+    """It reports parse errors without a line number."""
+    result = compile_restricted_expressions([1, 'a'])
+    assert list(result.errors) == [1]
+    assert result.expressions == ('a',)
+
+
+class WarningTransformer(RestrictingNodeTransformer):
+    """Policy warning about each attribute access."""
+
+    def visit_Attribute(self, node):
+        self.warn(node, 'Attribute {0!r}.'.format(node.attr))
+        return super(WarningTransformer, self).visit_Attribute(node)
+
+
+def test_compile__compile_restricted_expressions__7():
+    """It reports the warnings per expression with relative line numbers."""
+    result = compile_restricted_expressions(
+        ['a.b', 'c', '(c,\n a.d)', 'a._e'], policy=WarningTransformer)
+    assert result.warnings == {
+        'a.b': ("Line 1: Attribute 'b'.",),
+        '(c,\n a.d)': ("Line 2: Attribute 'd'.",),
+        'a._e': ("Line 1: Attribute '_e'.",),
+    }
+    assert list(result.errors) == ['a._e']
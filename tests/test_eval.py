@@ -1,6 +1,19 @@
+from RestrictedPython import GuardedBinOpTransformer
+from RestrictedPython._compat import IS_PY2
+from RestrictedPython.Eval import ExpressionCache
 from RestrictedPython.Eval import RestrictionCapableEval
 
+import itertools
 import pytest
+import sys
+import threading
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    RestrictionCapableEval.cache.clear()
+    yield
+    RestrictionCapableEval.cache.clear()
 
 
 exp = """
@@ -14,7 +27,7 @@ def test_init():
 
     assert ob.expr == "{'a':[m.pop()]}['a']         + [m[0]]"
     assert ob.used == ('m', )
-    assert ob.ucode is not None
+    assert ob.ucode is None
     assert ob.rcode is None
 
 
@@ -57,12 +70,15 @@ def test_Eval__RestrictionCapableEval__2():
 
 
 def test_Eval__RestictionCapableEval__prepUnrestrictedCode_1():
-    """It does nothing when unrestricted code is already set by init."""
+    """It does nothing when unrestricted code is already set."""
     ob = RestrictionCapableEval("a")
+    ob.prepUnrestrictedCode()
     assert ob.used == ('a',)
+    ucode = ob.ucode
     ob.expr = "b"
     ob.prepUnrestrictedCode()
     assert ob.used == ('a',)
+    assert ob.ucode is ucode
 
 
 def test_Eval__RestictionCapableEval__prepUnrestrictedCode_2():
@@ -88,6 +104,28 @@ def test_Eval__RestictionCapableEval__prepRestrictedCode_1():
     assert ob.used == ('a',)
 
 
+def test_Eval__RestictionCapableEval__prepUnrestrictedCode_3():
+    """It compiles the unrestricted code lazily from the shared parse."""
+    ob = RestrictionCapableEval("a + 1")
+    assert ob.ucode is None
+    ob.prepUnrestrictedCode()
+    assert eval(ob.ucode, {'a': 1}) == 2
+    assert ob.exp_node is not None
+    ob.prepRestrictedCode()
+    assert ob.exp_node is None
+    assert ob.eval({'a': 2}) == 3
+
+
+def test_Eval__RestictionCapableEval__prepUnrestrictedCode_4():
+    """It parses again if the shared ast was used by the restricted code."""
+    ob = RestrictionCapableEval("a.b")
+    ob.prepRestrictedCode()
+    assert ob.exp_node is None
+    ob.prepUnrestrictedCode()
+    assert 'a' in ob.ucode.co_names
+    assert '_getattr_' not in ob.ucode.co_names
+
+
 def test_Eval__RestictionCapableEval__eval_1():
     """It does not add names from the mapping to the
     global scope which are already there."""
@@ -102,3 +140,211 @@ def test_Eval__RestictionCapableEval__eval__2():
     ob = RestrictionCapableEval("[item for item in (1, 2)]")
     result = ob.eval({})
     assert result == [1, 2]
+
+
+def test_Eval__RestictionCapableEval__eval_many_1():
+    """It evaluates the expression for each mapping."""
+    ob = RestrictionCapableEval("a + b")
+    results = ob.eval_many([dict(a=1, b=2), dict(a=3, b=4, c=5)])
+    assert list(results) == [3, 7]
+
+
+def test_Eval__RestictionCapableEval__eval_many_2():
+    """It is a generator consuming the mappings lazily."""
+    ob = RestrictionCapableEval("a * 2")
+    results = ob.eval_many(dict(a=a) for a in itertools.count())
+    assert next(results) == 0
+    assert next(results) == 2
+
+
+def test_Eval__RestictionCapableEval__eval_many_3():
+    """It does not leak names from an earlier mapping."""
+    ob = RestrictionCapableEval("a")
+    ob.globals = {'__builtins__': {}}
+    results = ob.eval_many([dict(a=1), dict(b=2)])
+    assert next(results) == 1
+    with pytest.raises(NameError):
+        next(results)
+
+
+def test_Eval__RestictionCapableEval__eval_many_4():
+    """It does not add names from the mappings which are already globals."""
+    ob = RestrictionCapableEval("a + c")
+    ob.globals = {'__builtins__': None, 'c': 8}
+    assert list(ob.eval_many([dict(a=1, c=4)])) == [9]
+
+
+def test_Eval__RestictionCapableEval__eval_many_5():
+    """It returns the same results as `eval`."""
+    ob = RestrictionCapableEval("[item * n for item in (1, 2)]")
+    rows = [dict(n=n) for n in range(5)]
+    assert list(ob.eval_many(rows)) == [ob.eval(row) for row in rows]
+
+
+def test_Eval__RestictionCapableEval__cache_1():
+    """It shares the compiled code between instances of the same expression."""
+    ob1 = RestrictionCapableEval("a + b")
+    ob1.prepRestrictedCode()
+    ob2 = RestrictionCapableEval(" a + b\n")
+    assert ob2.rcode is ob1.rcode
+    assert ob2.used is ob1.used
+    assert ob2.exp_node is None
+    assert ob2(a=1, b=2) == 3
+    assert RestrictionCapableEval.cache.info() == (1, 1, 1000, 1)
+    assert RestrictionCapableEval.cache.hit_rate() == 0.5
+
+
+def test_Eval__RestictionCapableEval__cache_2():
+    """It caches the unrestricted code separately."""
+    ob1 = RestrictionCapableEval("a.b")
+    ob1.prepUnrestrictedCode()
+    ob2 = RestrictionCapableEval("a.b")
+    assert ob2.rcode is None
+    ob2.prepUnrestrictedCode()
+    assert ob2.ucode is ob1.ucode
+    ob2.prepRestrictedCode()
+    assert ob2.rcode is not ob2.ucode
+
+
+def test_Eval__RestictionCapableEval__cache_3():
+    """It keys the cache by the policy."""
+    class GuardedEval(RestrictionCapableEval):
+        policy = GuardedBinOpTransformer
+
+    ob1 = RestrictionCapableEval("a * 2")
+    ob1.prepRestrictedCode()
+    ob2 = GuardedEval("a * 2")
+    assert ob2.rcode is None
+    ob2.prepRestrictedCode()
+    assert '_binop_guard_' in ob2.rcode.co_names
+    assert '_binop_guard_' not in ob1.rcode.co_names
+
+
+def test_Eval__RestictionCapableEval__cache_4():
+    """It does not cache if the cache is disabled."""
+    class UncachedEval(RestrictionCapableEval):
+        cache = None
+
+    ob1 = UncachedEval("a")
+    ob1.prepRestrictedCode()
+    ob2 = UncachedEval("a")
+    assert ob2.rcode is None
+    assert RestrictionCapableEval.cache.info().currsize == 0
+
+
+def test_Eval__ExpressionCache__1():
+    """It drops the least recently used entries."""
+    cache = ExpressionCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.info() == (3, 1, 2, 2)
+    assert cache.hit_rate() == 0.75
+    cache.clear()
+    assert cache.info() == (0, 0, 2, 0)
+    assert cache.hit_rate() == 0.0
+
+
+def test_Eval__ExpressionCache__2():
+    """It can be used from many threads."""
+    cache = ExpressionCache(maxsize=10)
+
+    def worker():
+        for i in range(1000):
+            if cache.get(i % 20) is None:
+                cache.set(i % 20, i)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    info = cache.info()
+    assert info.hits + info.misses == 4000
+    assert info.currsize == 10
+
+
+def test_Eval__RestictionCapableEval__prepRestrictedFunction_1():
+    """It compiles a function taking the free names as parameters."""
+    ob = RestrictionCapableEval("price * qty - discount")
+    ob.prepRestrictedFunction()
+    assert ob.params == ('discount', 'price', 'qty')
+    assert ob.rfunction(1, 3, 2) == 5
+    assert ob.rfunction.__code__.co_varnames[:3] == ob.params
+
+
+def test_Eval__RestictionCapableEval__prepRestrictedFunction_2():
+    """It omits names bound inside of the expression and globals."""
+    ob = RestrictionCapableEval(
+        "[x * n for x in items] + [(lambda y: y + c)(1)]")
+    ob.globals = {'__builtins__': None, 'c': 10}
+    ob.prepRestrictedFunction()
+    assert ob.params == ('items', 'n')
+    assert ob.rfunction([1, 2], 3) == [3, 6, 11]
+
+
+def test_Eval__RestictionCapableEval__prepRestrictedFunction_3(mocker):
+    """It guards the function like the restricted code."""
+    _getattr_ = mocker.stub()
+    _getattr_.return_value = 42
+    ob = RestrictionCapableEval("a.b")
+    ob.globals = {'__builtins__': None, '_getattr_': _getattr_}
+    ob.prepRestrictedFunction()
+    assert ob.params == ('a',)
+    assert ob.rfunction('x') == 42
+    _getattr_.assert_called_once_with('x', 'b')
+
+
+def test_Eval__RestictionCapableEval__prepRestrictedFunction_4():
+    """It raises SyntaxError if the expression uses forbidden names."""
+    ob = RestrictionCapableEval("_a")
+    with pytest.raises(SyntaxError):
+        ob.prepRestrictedFunction()
+
+
+def test_Eval__RestictionCapableEval__prepRestrictedFunction_5():
+    """It shares the compiled function code between instances."""
+    ob1 = RestrictionCapableEval("a + 1")
+    ob1.prepRestrictedFunction()
+    ob2 = RestrictionCapableEval("a + 1")
+    ob2.prepRestrictedFunction()
+    assert ob2.rfunction is not ob1.rfunction
+    assert ob2.rfunction.__code__ is ob1.rfunction.__code__
+    assert ob2.rfunction(1) == 2
+
+
+@pytest.mark.skipif(IS_PY2, reason="Needs `sys.setswitchinterval`.")
+def test_Eval__RestictionCapableEval__threads_1(monkeypatch):
+    """A shared instance can be prepared and evaluated from many threads."""
+    monkeypatch.setattr(RestrictionCapableEval, 'cache', None)
+    errors = []
+
+    def worker(ob):
+        try:
+            for i in range(20):
+                assert ob.eval({'a': i}) == i * 2 + 1
+            ob.prepRestrictedFunction()
+            assert ob.rfunction(1) == 3
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    # Switch threads often to provoke races in the lazy preparation.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for repetition in range(300):
+            ob = RestrictionCapableEval('a * 2 + 1')
+            threads = [
+                threading.Thread(target=worker, args=(ob,))
+                for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
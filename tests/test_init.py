@@ -0,0 +1,49 @@
+from RestrictedPython._compat import IS_PY37_OR_GREATER
+
+import os
+import pytest
+import RestrictedPython
+import subprocess
+import sys
+
+
+@pytest.mark.skipif(
+    not IS_PY37_OR_GREATER,
+    reason="Module `__getattr__` needs Python 3.7+.")
+def test_init__1():
+    """Importing RestrictedPython does not import the lazy names' modules."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, RestrictedPython; '
+        'print(sorted(name for name in sys.modules '
+        'if name.startswith("RestrictedPython.")))'], env=env)
+    loaded = output.decode('ascii')
+    for name in ('Eval', 'Guards', 'Limits', 'Utilities'):
+        assert 'RestrictedPython.{0}'.format(name) not in loaded
+
+
+def test_init__2():
+    """The lazy names are importable from the package."""
+    from RestrictedPython import RestrictionCapableEval
+    from RestrictedPython import utility_builtins
+    from RestrictedPython.Eval import RestrictionCapableEval as Eval
+    assert RestrictionCapableEval is Eval
+    assert 'math' in utility_builtins
+    assert 'safe_builtins' in dir(RestrictedPython)
+    with pytest.raises(AttributeError):
+        RestrictedPython.missing
+    assert 'importlib' not in dir(RestrictedPython)
+
+
+def test_init__3():
+    """A star import provides the public names including the lazy ones."""
+    namespace = {}
+    exec('from RestrictedPython import *', namespace)
+    for name in ('safe_builtins', 'safe_globals', 'limited_builtins',
+                 'utility_builtins', 'RestrictionCapableEval',
+                 'compile_restricted', 'CompileResult'):
+        assert name in namespace
+    assert namespace['RestrictionCapableEval'] is \
+        RestrictedPython.RestrictionCapableEval
+    assert 'IS_PY37_OR_GREATER' not in namespace
@@ -0,0 +1,93 @@
+from RestrictedPython.__main__ import compile_scripts
+from RestrictedPython.__main__ import find_scripts
+from RestrictedPython.__main__ import main
+from RestrictedPython.__main__ import resolve_policy
+from RestrictedPython.Bundle import Bundle
+from RestrictedPython.transformer import RestrictingNodeTransformer
+
+import os
+import pytest
+
+
+@pytest.fixture
+def scripts(tmpdir):
+    tmpdir.join('add.py').write('result = a + 1')
+    tmpdir.mkdir('sub').join('double.py').write('result = 2 * a')
+    tmpdir.join('README.txt').write('no script')
+    return tmpdir
+
+
+def test_main__find_scripts__1(scripts):
+    """It finds the scripts matching the pattern with relative ids."""
+    assert [script_id for script_id, path in find_scripts(str(scripts))] == [
+        'add.py', 'sub/double.py']
+    assert [script_id for script_id, path
+            in find_scripts(str(scripts), '*.txt')] == ['README.txt']
+
+
+def test_main__compile_scripts__1(scripts):
+    """It compiles the scripts in worker processes in the given order."""
+    results = list(compile_scripts(find_scripts(str(scripts)), jobs=2))
+    assert [result[0] for result in results] == ['add.py', 'sub/double.py']
+    for script_id, source, errors, warnings, used_names, code in results:
+        assert errors == ()
+        assert used_names == ('a',)
+        assert code is not None
+
+
+def test_main__resolve_policy__1():
+    """It imports the policy class by its dotted name."""
+    assert resolve_policy(
+        'RestrictedPython.transformer.RestrictingNodeTransformer') is \
+        RestrictingNodeTransformer
+    with pytest.raises(ValueError):
+        resolve_policy('RestrictedPython.transformer.Missing')
+    with pytest.raises(ValueError):
+        resolve_policy('RestrictedPython.compile.compile_restricted')
+
+
+def test_main__main__1(scripts, capsys):
+    """It writes a bundle of the scripts of a directory."""
+    output = str(scripts.join('scripts.bundle'))
+    assert main([str(scripts), '--output', output, '--jobs', '1']) == 0
+    assert '2 scripts, 0 rejected, 0 warnings.' in capsys.readouterr()[1]
+    with Bundle(output) as bundle:
+        scope = {'a': 20}
+        exec(bundle.get('sub/double.py').code, scope)
+        assert scope['result'] == 40
+
+
+def test_main__main__2(scripts, capsys):
+    """It reports all rejected scripts and does not write the bundle."""
+    scripts.join('bad.py').write('result = _a')
+    scripts.join('sub', 'latin1.py').write(b'result = "\xe4"', mode='wb')
+    manifest = scripts.join('manifest.txt')
+    manifest.write('# scripts\nadd.py\n\nbad.py\nsub/latin1.py\n')
+    output = str(scripts.join('scripts.bundle'))
+    assert main(['--manifest', str(manifest), '-o', output]) == 1
+    err = capsys.readouterr()[1]
+    assert 'bad.py: Line 1: "_a" is an invalid variable name' in err
+    assert 'sub/latin1.py: ' in err
+    assert '3 scripts, 2 rejected, 0 warnings.' in err
+    assert not os.path.exists(output)
+    assert not [name for name in os.listdir(str(scripts))
+                if name.endswith('.tmp')]
+
+
+def test_main__main__4(scripts, capsys):
+    """It reports exceptions while compiling a script as rejection."""
+    scripts.join('deep.py').write('x = 1' + ' + 1' * 50000)
+    output = str(scripts.join('scripts.bundle'))
+    assert main([str(scripts), '--output', output, '--jobs', '1']) == 1
+    err = capsys.readouterr()[1]
+    assert 'deep.py: ' in err
+    assert '3 scripts, 1 rejected, 0 warnings.' in err
+    assert not [name for name in os.listdir(str(scripts))
+                if name.endswith(('.tmp', '.bundle'))]
+
+
+def test_main__main__3(scripts, capsys):
+    """It needs either a directory or a manifest."""
+    with pytest.raises(SystemExit):
+        main(['--output', 'scripts.bundle'])
+    assert 'Give either a directory or a manifest.' in capsys.readouterr()[1]
@@ -0,0 +1,111 @@
+from RestrictedPython.names import analyze_names
+from RestrictedPython.names import free_names
+from RestrictedPython.names import NameUsage
+
+import pytest
+
+
+SCRIPT = """
+import os.path as p
+x = context.title
+del y
+def f(a, b=default):
+    global g
+    g = a
+    del h
+    return [i for i in a if i > limit] + (lambda: b + z)()
+class C(Base):
+    attr = value
+"""
+
+
+def test_names__analyze_names__1():
+    """It reports the non-local names per code unit."""
+    units = analyze_names(SCRIPT)
+    assert [(unit.name, unit.type) for unit in units] == [
+        ('top', 'module'),
+        ('f', 'function'),
+        ('listcomp', 'function'),
+        ('lambda', 'function'),
+        ('C', 'class'),
+    ]
+    module, f, listcomp, lambda_, klass = [unit.names for unit in units]
+    assert module == {
+        'p': NameUsage('global', False, True, False),
+        'x': NameUsage('global', False, True, False),
+        'context': NameUsage('global', True, False, False),
+        'y': NameUsage('global', False, False, True),
+        'f': NameUsage('global', False, True, False),
+        'default': NameUsage('global', True, False, False),
+        'C': NameUsage('global', False, True, False),
+        'Base': NameUsage('global', True, False, False),
+    }
+    # Parameters and deleted local variables are not reported.
+    assert f == {'g': NameUsage('global', False, True, False)}
+    assert listcomp == {'limit': NameUsage('global', True, False, False)}
+    assert lambda_ == {
+        'b': NameUsage('free', True, False, False),
+        'z': NameUsage('global', True, False, False),
+    }
+    assert klass == {'value': NameUsage('global', True, False, False)}
+
+
+def test_names__analyze_names__2():
+    """It distinguishes deleting from storing a global."""
+    units = analyze_names('def f():\n    global a, b\n    del a\n    b = 1')
+    assert units[1].names == {
+        'a': NameUsage('global', False, False, True),
+        'b': NameUsage('global', False, True, False),
+    }
+
+
+def test_names__analyze_names__3():
+    """It raises a SyntaxError for invalid source."""
+    with pytest.raises(SyntaxError):
+        analyze_names('a +')
+
+
+def test_names__free_names__1():
+    """It returns the global names a script reads but does not define."""
+    assert free_names(SCRIPT) == frozenset(
+        ['context', 'default', 'limit', 'z', 'Base', 'value'])
+
+
+def test_names__free_names__2():
+    """It omits comprehension variables, unlike `used_names`."""
+    assert free_names('[x for x in (1, 2, 3)] + y', mode='eval') == \
+        frozenset(['y'])
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('x = x + 1', ['x']),
+    ('context = context.aq_parent', ['context']),
+    ('if not y:\n    y = 1', ['y']),
+    ('x += 1', ['x']),
+    ('def f():\n    return g\nf()\ng = 1', ['g']),
+    ('x = 1\ndel x\ny = x', ['x']),
+    ('for i in items:\n    c = i\nc', ['c', 'items']),
+    ('with a as b:\n    pass\nb', ['a']),
+    ('try:\n    c = 1\nexcept E as e:\n    e\nc', ['E', 'c']),
+])
+def test_names__free_names__3(source, expected):
+    """It keeps names read before or while the module binds them."""
+    assert sorted(free_names(source)) == expected
+
+
+@pytest.mark.parametrize('source', [
+    'x = 1\ny = x',
+    'x = 1\nx += 1',
+    'import os\nos.path',
+    'limit = 1\ndef f():\n    return limit',
+    'if a:\n    b = 1\nelse:\n    b = 2\nb',
+])
+def test_names__free_names__4(source):
+    """It omits names bound before they are read on every path."""
+    assert free_names(source) <= frozenset(['a'])
+
+
+def test_names__analyze_names__4():
+    """It reports augmented assignments as reading the name."""
+    units = analyze_names('def f():\n    global x\n    x += 1')
+    assert units[1].names == {'x': NameUsage('global', True, True, False)}
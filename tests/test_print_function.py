@@ -1,5 +1,7 @@
 from RestrictedPython.PrintCollector import PrintCollector
 
+import functools
+import pytest
 import RestrictedPython
 
 
@@ -357,3 +359,74 @@ def test_print_function_conditional_print():
 
     assert glb['func'](True) == '1\n'
     assert glb['func'](False) == ''
+
+
+PRINT_IN_LOOP = """
+for i in range(10):
+    print(i)
+result = printed
+"""
+
+
+def test_print_function__max_size():
+    code, errors = compiler(PRINT_IN_LOOP)[:2]
+    glb = {
+        '_print_': functools.partial(PrintCollector, max_size=9),
+        '_getattr_': None,
+        '_getiter_': lambda ob: ob,
+    }
+    with pytest.raises(ValueError) as excinfo:
+        exec(code, glb)
+    assert 'only allow 9 characters to be printed' in str(excinfo.value)
+    assert glb['_print']() == '0\n1\n2\n3\n'
+
+
+class Sink(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+
+def test_print_function__sink_file():
+    code, errors = compiler(PRINT_IN_LOOP)[:2]
+    sink = Sink()
+    glb = {
+        '_print_': functools.partial(PrintCollector, sink=sink),
+        '_getattr_': None,
+        '_getiter_': lambda ob: ob,
+    }
+    exec(code, glb)
+    assert ''.join(sink.chunks) == '0\n1\n2\n3\n4\n5\n6\n7\n8\n9\n'
+    assert glb['result'] == ''
+
+
+def test_print_function__sink_callable():
+    chunks = []
+    collector = PrintCollector(sink=chunks.append, max_size=10)
+    collector._call_print('a', 1)
+    collector._call_print('b', sep='-', end='')
+    assert ''.join(chunks) == 'a 1\nb'
+    assert collector.size == 5
+    assert collector() == ''
+
+
+def test_print_function__fast_path_matches_print():
+    collector = PrintCollector()
+    collector._call_print('a', 1, None, [2])
+    collector._call_print()
+    assert collector() == 'a 1 None [2]\n\n'
+
+
+def test_print_function__file_is_guarded(mocker):
+    """Printing to a `file` checks its `write` via `_getattr_`."""
+    _getattr_ = mocker.stub()
+    _getattr_.side_effect = getattr
+    stream = Sink()
+    collector = PrintCollector(_getattr_)
+    collector._call_print('a', 1, sep='-', file=stream)
+    _getattr_.assert_called_once_with(stream, 'write')
+    assert ''.join(stream.chunks) == 'a-1\n'
+    assert collector() == ''
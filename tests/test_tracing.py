@@ -0,0 +1,116 @@
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import tracing
+from RestrictedPython.Eval import ExpressionCache
+from RestrictedPython.Eval import RestrictionCapableEval
+from RestrictedPython.Executor import RestrictedExecutor
+from RestrictedPython.tracing import InMemoryTracer
+
+import pytest
+
+
+@pytest.fixture
+def tracer():
+    tracer = InMemoryTracer()
+    tracing.set_tracer(tracer)
+    yield tracer
+    tracing.set_tracer(None)
+
+
+def test_tracing__1():
+    """The `NullTracer` is installed by default."""
+    assert isinstance(tracing.get_tracer(), tracing.NullTracer)
+    assert not tracing.enabled
+    with tracing.span('compile') as span:
+        span.set_outcome('error')
+
+
+def test_tracing__2(monkeypatch):
+    """Without a tracer no spans are started."""
+    def start_span(self, name, attributes):
+        raise AssertionError('span started')  # pragma: no cover
+    monkeypatch.setattr(tracing.NullTracer, 'start_span', start_span)
+    executor = RestrictedExecutor()
+    assert executor.evaluate('1 + 1', {}) == 2
+    assert executor.execute('a = 1', {})['a'] == 1
+    expression = RestrictionCapableEval('a + 1')
+    expression.cache = ExpressionCache()
+    assert expression.eval({'a': 1}) == 2
+    assert tracing.span('compile') is tracing._null_span
+
+
+def test_tracing__3():
+    """Installing a tracer enables the spans."""
+    tracing.set_tracer(tracing.NullTracer())
+    try:
+        assert tracing.enabled
+    finally:
+        tracing.set_tracer(None)
+    assert not tracing.enabled
+
+
+def test_tracing__compile__1(tracer):
+    """Compiling creates a span for each phase inside a `compile` span."""
+    source = 'a = 1'
+    compile_restricted_exec(source, filename='<script>')
+    assert [span.name for span in tracer.spans] == [
+        'parse', 'transform', 'bytecode', 'compile']
+    compile_span = tracer.spans[-1]
+    for span in tracer.spans:
+        assert span.attributes == {
+            'filename': '<script>', 'mode': 'exec', 'source_size': 5}
+        assert span.outcome == 'ok'
+        assert span.duration >= 0
+    assert compile_span.parent is None
+    for span in tracer.spans[:-1]:
+        assert span.parent is compile_span
+
+
+def test_tracing__compile__2(tracer):
+    """The outcome is 'error' if the code is not allowed."""
+    compile_restricted_exec('a = _b')
+    assert [(span.name, span.outcome) for span in tracer.spans] == [
+        ('parse', 'ok'), ('transform', 'error'), ('compile', 'error')]
+    tracer.clear()
+    compile_restricted_exec('a = ')
+    assert [(span.name, span.outcome) for span in tracer.spans] == [
+        ('parse', 'error'), ('compile', 'error')]
+
+
+def test_tracing__compile__3(tracer):
+    """The outcome is 'exception' if compiling raises an exception."""
+    with pytest.raises(TypeError):
+        compile_restricted_exec(42)
+    span, = tracer.spans
+    assert span.name == 'compile'
+    assert span.outcome == 'exception'
+    assert span.attributes['exception'] == 'TypeError'
+    assert span.attributes['source_size'] is None
+
+
+def test_tracing__RestrictedExecutor__1(tracer):
+    """It traces the cache lookups and the execution."""
+    executor = RestrictedExecutor()
+    executor.execute('a = 1', {}, filename='<script>')
+    executor.execute('a = 1', {}, filename='<script>')
+    lookups = tracer.find('cache_lookup')
+    assert [span.outcome for span in lookups] == ['miss', 'hit']
+    assert [span.outcome for span in tracer.find('execute')] == ['ok', 'ok']
+    assert len(tracer.find('compile')) == 1
+    with pytest.raises(ZeroDivisionError):
+        executor.evaluate('1 / 0', {})
+    span = tracer.spans[-1]
+    assert span.name == 'execute'
+    assert span.outcome == 'exception'
+    assert span.attributes == {
+        'filename': '<string>', 'mode': 'eval', 'source_size': 5,
+        'exception': 'ZeroDivisionError'}
+
+
+def test_tracing__RestrictionCapableEval__1(tracer, monkeypatch):
+    """It traces the cache lookups and the evaluation."""
+    monkeypatch.setattr(RestrictionCapableEval, 'cache', ExpressionCache())
+    assert RestrictionCapableEval('a + 1').eval({'a': 1}) == 2
+    assert tracer.find('cache_lookup')[0].outcome == 'miss'
+    span, = tracer.find('execute')
+    assert span.attributes == {
+        'filename': '<string>', 'mode': 'eval', 'source_size': 5}
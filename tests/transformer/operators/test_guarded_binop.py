@@ -0,0 +1,100 @@
+from RestrictedPython import compile_restricted_eval
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython import GuardedBinOpTransformer
+from RestrictedPython.Limits import limited_binop
+
+import pytest
+
+
+def _guarded_eval(source, glb=None):
+    result = compile_restricted_eval(source, policy=GuardedBinOpTransformer)
+    assert result.errors == ()
+    glb = {} if glb is None else glb
+    glb.setdefault('_binop_guard_', limited_binop)
+    return eval(result.code, glb)
+
+
+def test_GuardedBinOpTransformer__routes_guarded_operators(mocker):
+    _binop_guard_ = mocker.stub()
+    _binop_guard_.side_effect = limited_binop
+    glb = {'_binop_guard_': _binop_guard_, 'a': 3}
+
+    assert _guarded_eval('a * 2', glb) == 6
+    _binop_guard_.assert_called_once_with('*', 3, 2)
+    _binop_guard_.reset_mock()
+
+    assert _guarded_eval('2 ** a', glb) == 8
+    _binop_guard_.assert_called_once_with('**', 2, 3)
+    _binop_guard_.reset_mock()
+
+    assert _guarded_eval('a << 1', glb) == 6
+    _binop_guard_.assert_called_once_with('<<', 3, 1)
+
+
+def test_GuardedBinOpTransformer__leaves_other_operators_alone(mocker):
+    _binop_guard_ = mocker.stub()
+    glb = {'_binop_guard_': _binop_guard_, 'a': 3}
+    assert _guarded_eval('a + 1 - 2 // 1 % 5', glb) == 2
+    _binop_guard_.assert_not_called()
+
+
+def test_GuardedBinOpTransformer__rejects_amplification():
+    with pytest.raises(ValueError):
+        _guarded_eval("'x' * 10 ** 9")
+    with pytest.raises(ValueError):
+        _guarded_eval('[0] * 10 ** 9')
+    with pytest.raises(ValueError):
+        _guarded_eval('10 ** 10 ** 8')
+
+
+def test_RestrictingNodeTransformer__does_not_guard_binops():
+    result = compile_restricted_eval('a * 2')
+    assert '_binop_guard_' not in result.code.co_names
+
+
+def _guarded_exec(source, glb):
+    result = compile_restricted_exec(source, policy=GuardedBinOpTransformer)
+    assert result.errors == ()
+    glb.setdefault('_binop_guard_', limited_binop)
+    exec(result.code, glb)
+    return glb
+
+
+def test_GuardedBinOpTransformer__routes_augmented_assignments(mocker):
+    _binop_guard_ = mocker.stub()
+    _binop_guard_.side_effect = limited_binop
+    _inplacevar_ = mocker.stub()
+    _inplacevar_.side_effect = lambda op, x, y: x + y
+    items = [1]
+    glb = _guarded_exec(
+        'a *= 2\nb **= 2\nc <<= 1\nitems *= 2\nd += 1',
+        {'_binop_guard_': _binop_guard_, '_inplacevar_': _inplacevar_,
+         'a': 3, 'b': 3, 'c': 3, 'd': 3, 'items': items})
+    assert (glb['a'], glb['b'], glb['c'], glb['d']) == (6, 9, 6, 4)
+    assert _binop_guard_.call_args_list == [
+        mocker.call('*=', 3, 2),
+        mocker.call('**=', 3, 2),
+        mocker.call('<<=', 3, 1),
+        mocker.call('*=', items, 2)]
+    # The in-place operation keeps the identity of mutable objects.
+    assert glb['items'] is items
+    assert items == [1, 1]
+    _inplacevar_.assert_called_once_with('+=', 3, 1)
+
+
+@pytest.mark.parametrize('source', [
+    "x = 'x'\nx *= 10 ** 9",
+    'x = [0]\nx *= 10 ** 9',
+    'x = 10\nx **= 10 ** 8',
+    'x = 1\nx <<= 10 ** 8',
+])
+def test_GuardedBinOpTransformer__rejects_augmented_amplification(source):
+    with pytest.raises(ValueError):
+        _guarded_exec(source, {})
+
+
+def test_GuardedBinOpTransformer__rejects_augmented_attributes():
+    result = compile_restricted_exec(
+        'a.b *= 2', policy=GuardedBinOpTransformer)
+    assert result.errors == (
+        'Line 1: Augmented assignment of attributes is not allowed.',)
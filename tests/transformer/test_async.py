@@ -1,7 +1,13 @@
+from RestrictedPython import AsyncTransformer
 from RestrictedPython import compile_restricted_exec
 from RestrictedPython._compat import IS_PY35_OR_GREATER
+from RestrictedPython.Guards import AsyncIterGuard
+from RestrictedPython.Guards import AwaitGuard
+from RestrictedPython.Guards import guarded_iter_unpack_sequence
+from RestrictedPython.Guards import guarded_unpack_sequence
 from RestrictedPython.transformer import RestrictingNodeTransformer
 
+import asyncio
 import pytest
 
 
@@ -102,3 +108,199 @@ def test_async_for():
         policy=RestrictingAsyncNodeTransformer)
     assert result.errors == ('Line 3: AsyncFor statements are not allowed.',)
     assert result.code is None
+
+
+ASYNC_SCRIPT = """
+async def fetch_all(keys):
+    results = []
+    for key in keys:
+        results.append(await fetch(key))
+    async for key, value in rows():
+        results.append(key + value)
+    async with connection() as (name, status):
+        results.append(name + status)
+    results.extend([row async for row in letters()])
+    return results
+
+async def main():
+    return await fetch_all(['a', 'b'])
+"""
+
+
+# The host helpers, in a string as this module has to import on Python 2.
+HOST_HELPERS = """
+async def fetch(key):
+    return key.upper()
+
+async def rows():
+    for row in [('c', 'd')]:
+        yield row
+
+async def letters():
+    yield 'e'
+
+class connection(object):
+    exits = []
+
+    async def __aenter__(self):
+        return ('f', 'g')
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self.exits.append(exc_type)
+        return exc_type is KeyError
+"""
+
+
+def _async_globals(guard):
+    helpers = {}
+    exec(HOST_HELPERS, helpers)
+    return {
+        '__builtins__': {'BaseException': BaseException},
+        '_await_': guard,
+        '_getaiter_': AsyncIterGuard(
+            functions=[helpers['rows'], helpers['letters']]),
+        '_getattr_': getattr,
+        '_getiter_': iter,
+        '_iter_unpack_sequence_': guarded_iter_unpack_sequence,
+        '_unpack_sequence_': guarded_unpack_sequence,
+        'fetch': helpers['fetch'],
+        'rows': helpers['rows'],
+        'letters': helpers['letters'],
+        'connection': helpers['connection'],
+    }
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def _await_guard(glb):
+    connection = glb['connection']
+    return AwaitGuard(
+        functions=[glb['fetch'], connection.__aenter__, connection.__aexit__],
+        filenames=['<script>'])
+
+
+def test_AsyncTransformer__1():
+    """It allows async code with the awaitables allowed by `_await_`."""
+    result = compile_restricted_exec(
+        ASYNC_SCRIPT, '<script>', policy=AsyncTransformer)
+    assert result.errors == ()
+    glb = _async_globals(None)
+    glb['_await_'] = _await_guard(glb)
+    exec(result.code, glb)
+    assert _run(glb['main']()) == ['A', 'B', 'cd', 'fg', 'e']
+
+
+def test_AsyncTransformer__2():
+    """It rejects awaitables not allowed by `_await_`."""
+    result = compile_restricted_exec(
+        ASYNC_SCRIPT, '<script>', policy=AsyncTransformer)
+    glb = _async_globals(AwaitGuard(filenames=['<script>']))
+    exec(result.code, glb)
+    with pytest.raises(TypeError) as err:
+        _run(glb['main']())
+    assert str(err.value) == "Awaiting 'coroutine' is not allowed."
+
+
+def test_AsyncTransformer__3():
+    """It keeps the restrictions inside of async code."""
+    result = compile_restricted_exec(
+        'async def _f():\n    await x._y\n'
+        'async def g():\n    return [a async for a, b in x]\n',
+        policy=AsyncTransformer)
+    assert result.errors == (
+        'Line 1: "_f" is an invalid variable name because it starts with "_"',
+        'Line 2: "_y" is an invalid attribute name because it starts with "_".',  # NOQA: E501
+        'Line 4: Tuple unpacking in asynchronous comprehensions is not '
+        'allowed.',
+    )
+
+
+ASYNC_WITH_SCRIPT = """
+async def main(error):
+    async with connection() as (name, status), connection():
+        if error:
+            raise error
+        return name + status
+"""
+
+
+def test_AsyncTransformer__4():
+    """It guards the awaits of `__aenter__` and `__aexit__`."""
+    result = compile_restricted_exec(
+        ASYNC_WITH_SCRIPT, '<script>', policy=AsyncTransformer)
+    assert result.errors == ()
+    glb = _async_globals(AwaitGuard(filenames=['<script>']))
+    exec(result.code, glb)
+    with pytest.raises(TypeError) as err:
+        _run(glb['main'](None))
+    assert str(err.value) == "Awaiting 'coroutine' is not allowed."
+    connection = glb['connection']
+    glb['_await_'] = AwaitGuard(
+        functions=[connection.__aenter__], filenames=['<script>'])
+    with pytest.raises(TypeError):
+        _run(glb['main'](None))
+
+
+def test_AsyncTransformer__5():
+    """It runs `async with` like Python, exceptions reach `__aexit__`."""
+    result = compile_restricted_exec(
+        ASYNC_WITH_SCRIPT, '<script>', policy=AsyncTransformer)
+    glb = _async_globals(None)
+    glb['_await_'] = _await_guard(glb)
+    exec(result.code, glb)
+    exits = glb['connection'].exits
+    assert _run(glb['main'](None)) == 'fg'
+    assert exits == [None, None]
+    del exits[:]
+    # The exception is suppressed by the inner `__aexit__`.
+    assert _run(glb['main'](KeyError)) is None
+    assert exits == [KeyError, None]
+    del exits[:]
+    with pytest.raises(ValueError):
+        _run(glb['main'](ValueError))
+    assert exits == [ValueError, ValueError]
+
+
+def test_AsyncTransformer__6():
+    """`AsyncIterGuard` rejects asynchronous iterables not allowed."""
+    result = compile_restricted_exec(
+        'async def main():\n    return [row async for row in rows()]\n',
+        '<script>', policy=AsyncTransformer)
+    glb = _async_globals(AwaitGuard())
+    glb['_getaiter_'] = AsyncIterGuard(functions=[glb['letters']])
+    exec(result.code, glb)
+    with pytest.raises(TypeError) as err:
+        _run(glb['main']())
+    assert str(err.value) == (
+        "Iterating 'async_generator' asynchronously is not allowed.")
+    glb['_getaiter_'] = AsyncIterGuard(types=[type(glb['rows']())])
+    assert _run(glb['main']()) == [('c', 'd')]
+
+
+def test_AsyncTransformer__7():
+    """`AwaitGuard` allows awaitables of the given types."""
+    result = compile_restricted_exec(
+        'async def main(future):\n'
+        '    async for row in rows():\n'
+        '        future.set_result([x for x in row])\n'
+        '    return await future\n',
+        '<script>', policy=AsyncTransformer)
+    assert result.errors == ()
+    glb = _async_globals(AwaitGuard())
+    exec(result.code, glb)
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(TypeError) as err:
+            loop.run_until_complete(glb['main'](loop.create_future()))
+        assert str(err.value) == "Awaiting 'Future' is not allowed."
+        glb['_await_'] = AwaitGuard(types=[asyncio.Future])
+        assert loop.run_until_complete(
+            glb['main'](loop.create_future())) == ['c', 'd']
+    finally:
+        loop.close()
@@ -0,0 +1,69 @@
+from RestrictedPython import CheckpointTransformer
+from RestrictedPython import compile_restricted_exec
+from RestrictedPython.transformer import CHECKPOINT_FUNCTION_NAME
+
+import pytest
+
+
+def _checkpointed(source, glb):
+    result = compile_restricted_exec(source, policy=CheckpointTransformer)
+    assert result.errors == ()
+    glb.setdefault('_getiter_', iter)
+    exec(result.code, glb)
+    return glb.pop(CHECKPOINT_FUNCTION_NAME)()
+
+
+LOOPS = """\
+total = 0
+for i in items:
+    if i == 2:
+        continue
+    total = total + i
+while total < 10:
+    total = total + 1
+"""
+
+
+def test_CheckpointTransformer__1():
+    """It yields at the start and at the start of each loop iteration."""
+    glb = {'items': [1, 2, 3]}
+    generator = _checkpointed(LOOPS, glb)
+    assert 'total' not in glb
+    # 1 at the start, 3 in the for loop, 6 in the while loop
+    assert len(list(generator)) == 10
+    assert glb['total'] == 10
+    assert 'i' in glb
+
+
+NESTED = """\
+def double(values):
+    return [value * 2 for value in values]
+
+class Doubler:
+    pass
+
+for x in [1]:
+    try:
+        for y in [2]:
+            result = double([x, y])
+    except ValueError as error:
+        pass
+"""
+
+
+def test_CheckpointTransformer__2():
+    """It does not change nested functions and binds globals."""
+    glb = {'__metaclass__': type, '__name__': 'restricted'}
+    assert len(list(_checkpointed(NESTED, glb))) == 3
+    assert glb['result'] == [2, 4]
+    assert sorted(name for name in glb if not name.startswith('_')) == [
+        'Doubler', 'double', 'result', 'x', 'y']
+
+
+@pytest.mark.parametrize('source', ['return 1', 'yield 1'])
+def test_CheckpointTransformer__3(source):
+    """It rejects `return` and `yield` outside of functions."""
+    result = compile_restricted_exec(source, policy=CheckpointTransformer)
+    assert result.errors == (
+        'Line 1: "{0}" outside function is not allowed.'.format(
+            source.split()[0]),)